@@ -0,0 +1,267 @@
+from collections import OrderedDict
+import numpy as np
+
+# Output filter and grid coupling as a linear plant per phase: inverter voltage and grid source voltage in; inductor
+# currents, capacitor voltage and the voltage at the point of common coupling (PCC) out. The continuous model is
+# discretized exactly for inputs held between samples (zero-order hold through the matrix exponential), once per
+# time step bin, and a window is advanced for all phases at once.
+
+PADE_13 = [64764752532480000.0, 32382376266240000.0, 7771770303897600.0, 1187353796428800.0, 129060195264000.0,
+           10559470521600.0, 670442572800.0, 33522128640.0, 1323241920.0, 40840800.0, 960960.0, 16380.0, 182.0, 1.0]
+
+def expm(A):
+    # Matrix exponential: degree-13 Pade approximant with scaling and squaring (Higham 2005)
+    A = np.asarray(A, dtype=float)
+    norm = np.max(np.sum(np.abs(A), axis=0)) if A.size else 0.0
+    s = max(0, int(np.ceil(np.log2(norm / 5.371920351148152)))) if norm > 0 else 0
+    A = A / 2 ** s
+    b = PADE_13
+    I = np.eye(len(A))
+    A2 = A @ A
+    A4 = A2 @ A2
+    A6 = A4 @ A2
+    U = A @ (A6 @ (b[13] * A6 + b[11] * A4 + b[9] * A2) + b[7] * A6 + b[5] * A4 + b[3] * A2 + b[1] * I)
+    V = A6 @ (b[12] * A6 + b[10] * A4 + b[8] * A2) + b[6] * A6 + b[4] * A4 + b[2] * A2 + b[0] * I
+    E = np.linalg.solve(V - U, V + U)
+    for _ in range(s):
+        E = E @ E
+    return E
+
+def zoh(A, B, dt):
+    # Exact discretization for inputs held over dt: exp([[A, B], [0, 0]] dt) = [[Ad, Bd], [0, I]]
+    n, m = B.shape
+    M = np.zeros((n + m, n + m))
+    M[:n, :n] = A * dt
+    M[:n, n:] = B * dt
+    E = expm(M)
+    return E[:n, :n], E[:n, n:]
+
+class DiscretizationCache:
+    # Discretized plants for variable time steps. dt is quantized on a logarithmic grid with relative spacing
+    # resolution, the plant of each bin is memoized with least-recently-used eviction, and the offset of dt from the
+    # bin is applied as a third-order correction. A step of any size then costs a lookup and a few small products
+    # instead of a matrix exponential, accurate to about (resolution * |A| dt)^4 / 24.
+    def __init__(self, build, resolution=1e-2, max_entries=512):
+        self.build = build  # dt -> (A, B, Ad, Bd)
+        self.resolution = resolution
+        self.max_entries = max_entries
+        self.clear()
+    
+    def clear(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.last = (None, None)  # Last dt and its plant: uniform steps repeat it exactly
+    
+    def bin(self, dt):
+        key = int(round(np.log(dt) / np.log1p(self.resolution)))
+        return key, float(np.exp(key * np.log1p(self.resolution)))
+    
+    def lookup(self, dt):
+        # Ad, Bd for exactly dt
+        if dt == self.last[0]:
+            self.hits += 1
+            return self.last[1]
+        key, dt_bin = self.bin(dt)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            self.entries[key] = self.build(dt_bin)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        A, B, Ad, Bd = self.entries[key]
+        # exp(A (dt_bin + delta)) = Ad exp(A delta); the input term gains Ad * integral of exp(A s) B over delta
+        delta = dt - dt_bin
+        X = A * delta
+        X2 = X @ X
+        I = np.eye(len(A))
+        self.last = (dt, (Ad @ (I + X + X2 / 2 + X2 @ X / 6), Bd + delta * Ad @ ((I + X / 2 + X2 / 6) @ B)))
+        return self.last[1]
+    
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def statistics(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries),
+                'hit_rate': self.hit_rate()}
+
+class GridFilter:
+    # One phase from the inverter terminals to the grid source: inverter-side L1, capacitor C with series damping
+    # resistor R_d, grid-side L2, then the grid impedance R_g + L_g. Subclasses drop elements (C = 0: L filter,
+    # L2 = 0: LC filter, whose grid side is the grid inductance alone).
+    L1 = 2e-3   # Inverter-side inductance (H)
+    R1 = 0.05   # Ohm
+    C = 10e-6   # Filter capacitance (F)
+    R_d = 2.0   # Passive damping in series with C (Ohm)
+    L2 = 0.5e-3  # Grid-side inductance (H)
+    R2 = 0.02   # Ohm
+    block = 64  # Steps per block of the window recurrence
+    outputs = ['inverter_current', 'capacitor_voltage', 'grid_current', 'pcc_voltage']
+    
+    def __init__(self, R_g=0.1, L_g=1e-3):
+        self.R_g = R_g  # Grid resistance (Ohm)
+        self.L_g = L_g  # Grid inductance (H)
+        self.discrete = DiscretizationCache(self.discretize_exact)
+        self.reset()
+    
+    def reset(self):
+        self.x = None  # States (states, phases) at time t
+        self.t = None
+        self.history = None
+    
+    def update_grid_impedance(self, R_g, L_g):
+        self.R_g = R_g
+        self.L_g = L_g
+        self.discrete.clear()
+        self.reset()  # The states change meaning when the filter reduces to a single inductor
+    
+    def matrices(self):
+        # Continuous plant dx/dt = A x + B u, y = C x + D u with u = [v_inverter, v_grid] and y as in outputs
+        L2 = self.L2 + self.L_g
+        R2 = self.R2 + self.R_g
+        if self.C == 0 or L2 == 0:
+            # Series inductors (a capacitor directly across a stiff grid carries no state): x = [i]
+            L, R = self.L1 + L2, self.R1 + R2
+            A = np.array([[-R / L]])
+            B = np.array([[1 / L, -1 / L]])
+            k = self.L_g / L  # Share of the inductor voltage across the grid inductance
+            pcc = ([self.R_g - k * R], [k, 1 - k])
+            C = np.array([[1.0], pcc[0], [1.0], pcc[0]])
+            D = np.array([[0.0, 0.0], pcc[1], [0.0, 0.0], pcc[1]])
+            return A, B, C, D
+        # x = [i_inverter, v_C, i_grid]; the capacitor branch voltage is v_C + R_d (i_inverter - i_grid)
+        L1, R1, C_f, R_d = self.L1, self.R1, self.C, self.R_d
+        A = np.array([
+            [-(R1 + R_d) / L1, -1 / L1, R_d / L1],
+            [1 / C_f, 0.0, -1 / C_f],
+            [R_d / L2, 1 / L2, -(R2 + R_d) / L2]
+        ])
+        B = np.array([[1 / L1, 0.0], [0.0, 0.0], [0.0, -1 / L2]])
+        k = self.L_g / L2
+        C = np.array([
+            [1.0, 0.0, 0.0],
+            [R_d, 1.0, -R_d],
+            [0.0, 0.0, 1.0],
+            [k * R_d, k, self.R_g - k * (R2 + R_d)]
+        ])
+        D = np.array([[0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [0.0, 1 - k]])
+        return A, B, C, D
+    
+    def discretize_exact(self, dt):
+        A, B, C, D = self.matrices()
+        return (A, B) + zoh(A, B, dt)
+    
+    def propagate(self, Ad, Bd, x0, U):
+        # x_(k+1) = Ad x_k + Bd u_k for all phases; U (steps, inputs, phases) -> states after each step (steps, states, phases).
+        # The forced response of every block of K steps is one product with the block Toeplitz matrix T of the impulse
+        # response Ad^(i-j) Bd; only the block initial states are chained step by step.
+        n, m = Bd.shape
+        steps, _, phases = U.shape
+        K = min(self.block, steps)
+        powers = np.empty((K + 1, n, n))
+        powers[0] = np.eye(n)
+        for k in range(K):
+            powers[k + 1] = Ad @ powers[k]
+        lag = np.subtract.outer(np.arange(K), np.arange(K))
+        T = np.where((lag >= 0)[..., np.newaxis, np.newaxis], (powers[:K] @ Bd)[np.maximum(lag, 0)], 0.0)
+        T = T.transpose(0, 2, 1, 3).reshape(K * n, K * m)
+        blocks = -(-steps // K)
+        padded = np.zeros((blocks * K, m, phases))
+        padded[:steps] = U
+        forced = (T @ padded.reshape(blocks, K * m, phases)).reshape(blocks, K, n, phases)
+        starts = np.empty((blocks, n, phases))
+        x = x0
+        for b in range(blocks):
+            starts[b] = x
+            x = powers[K] @ x + forced[b, -1]
+        X = np.einsum('kij,bjp->bkip', powers[1:], starts) + forced
+        return X.reshape(blocks * K, n, phases)[:steps]
+    
+    def series_impedance(self):
+        # R (Ohm), L (H) from the inverter terminals to the grid source at low frequency
+        return self.R1 + self.R2 + self.R_g, self.L1 + self.L2 + self.L_g
+    
+    def simulate(self, time, v_inverter, v_grid):
+        # Advances the plant through the window with both voltages (phases, samples) held between samples and returns
+        # the outputs (phases, samples). Windows may overlap the previous one; only the new part is simulated and the
+        # overlap is taken from the history. v_inverter may also be a controller (sample, states (states, phases),
+        # outputs (outputs, phases), dt) -> inverter voltages (phases,), which closes the loop sample by sample.
+        controller = v_inverter if callable(v_inverter) else None
+        if controller:
+            v_grid = np.atleast_2d(v_grid)
+            v_inverter = np.zeros(v_grid.shape)  # Filled in by the controller
+        else:
+            v_inverter = np.atleast_2d(v_inverter)
+            v_grid = np.broadcast_to(v_grid, v_inverter.shape)
+        phases = len(v_inverter)
+        A, B, C, D = self.matrices()
+        if self.x is None or self.x.shape[1] != phases or (self.history is not None and time[0] < self.history['time'][0]):
+            self.x = np.zeros((len(A), phases))
+            self.t = time[0]
+            self.history = None
+        self.t = max(self.t, time[0])  # Gap between windows: the states are held
+        k = np.searchsorted(time, self.t, side='right')  # First sample after t
+        if controller and self.history is not None:
+            v_inverter[:, :k] = [np.interp(time[:k], self.history['time'], row) for row in self.history['inverter_voltage']]
+        held = np.einsum('oi,ip->op', C, self.x)[..., np.newaxis] + np.einsum('oi,ipk->opk', D, np.stack((v_inverter, v_grid))[:, :, :k])  # Samples up to t
+        X = np.empty((len(time) - k, len(A), phases))
+        if k < len(time) and controller:
+            # The controller sees the outputs at the start of each step and holds its voltage over the step
+            x, t = self.x, self.t
+            for j in range(k, len(time)):
+                dt = float(time[j] - t)
+                Ad, Bd = self.discrete.lookup(dt)
+                y = C @ x + D[:, 1:] @ v_grid[np.newaxis, :, j - 1]
+                v_inverter[:, j - 1] = controller(j - 1, x, y, dt)
+                x = X[j - k] = Ad @ x + Bd @ np.stack((v_inverter[:, j - 1], v_grid[:, j - 1]))
+                t = time[j]
+            v_inverter[:, -1] = v_inverter[:, -2]  # Applied from the next window on
+            self.x = x
+            self.t = time[-1]
+        elif k < len(time):
+            # First step from t, then the uniform grid of the window
+            U = np.stack((v_inverter, v_grid))  # (inputs, phases, samples)
+            Ad, Bd = self.discrete.lookup(float(time[k] - self.t))
+            X[0] = Ad @ self.x + Bd @ U[:, :, k - 1]
+            if k + 1 < len(time):
+                Ad, Bd = self.discrete.lookup(float((time[-1] - time[k]) / (len(time) - 1 - k)))
+                X[1:] = self.propagate(Ad, Bd, X[0], np.moveaxis(U[:, :, k:-1], -1, 0))
+            self.x = X[-1]
+            self.t = time[-1]
+        
+        U = np.stack((v_inverter, v_grid))
+        Y = np.einsum('oi,kip->opk', C, X) + np.einsum('oi,ipk->opk', D, U[:, :, k:])  # (outputs, phases, new samples)
+        record = {'time': time, 'grid_voltage': v_grid, 'inverter_voltage': v_inverter}
+        for o, name in enumerate(self.outputs):
+            values = np.empty((phases, len(time)))
+            values[:, k:] = Y[o]
+            if self.history is not None:
+                values[:, :k] = [np.interp(time[:k], self.history['time'], row) for row in self.history[name]]
+            else:
+                values[:, :k] = held[o]
+            record[name] = values
+        record['impedance_voltage'] = record['pcc_voltage'] - v_grid  # Drop across the grid impedance
+        self.history = record
+        return record
+
+class LFilter(GridFilter):
+    C = 0.0
+    L1 = 3e-3
+
+class LCFilter(GridFilter):
+    L2 = 0.0
+    R2 = 0.0
+
+class LCLFilter(GridFilter):
+    pass
+
+FILTER_TYPES = {
+    "L": LFilter,
+    "LC": LCFilter,
+    "LCL": LCLFilter
+}
\ No newline at end of file
@@ -2,6 +2,8 @@ from PyQt5.QtWidgets import QWidget, QVBoxLayout, QGroupBox, QSlider, QDoubleSpi
 from PyQt5.QtCore import pyqtSignal, Qt
 from PyQt5.QtGui import QFont
 import csv
+from Pulsweitenmodulation import PWM_TECHNIQUES
+from Phasenregelkreis import PLL_TYPES
 import os
 
 class ControlPanel(QWidget):
@@ -13,10 +15,14 @@ class ControlPanel(QWidget):
     multilevel_changed = pyqtSignal(str)
     pwm_changed = pyqtSignal(str)
     design_changed = pyqtSignal(str)
+    filter_changed = pyqtSignal(str)
     mppt_changed = pyqtSignal(str)
     control_changed = pyqtSignal(str)
+    pll_changed = pyqtSignal(str)
     islanding_changed = pyqtSignal(bool)
+    harmonics_changed = pyqtSignal(bool)
     dc_source_changed = pyqtSignal(str)
+    profile_changed = pyqtSignal(str)
     launch_tds = pyqtSignal()
     launch_fsa = pyqtSignal()
     launch_grid = pyqtSignal()
@@ -93,6 +99,16 @@ class ControlPanel(QWidget):
         self.load_current_spin.setSingleStep(0.1)
         self.load_current_spin.setFixedHeight(40)
 
+        # Recorded profile playback (irradiance/temperature/load traces)
+        self.profile_label = QLabel("Profile: None")
+        profile_layout = QHBoxLayout()
+        self.load_profile_button = QPushButton("Load Profile")
+        self.clear_profile_button = QPushButton("Clear")
+        self.load_profile_button.clicked.connect(self.load_profile)
+        self.clear_profile_button.clicked.connect(self.clear_profile)
+        profile_layout.addWidget(self.load_profile_button)
+        profile_layout.addWidget(self.clear_profile_button)
+
         dc_source_layout.addWidget(self.dc_voltage_label)
         dc_source_layout.addWidget(self.dc_voltage_spin)
         dc_source_layout.addWidget(self.irradiance_label)
@@ -103,6 +119,8 @@ class ControlPanel(QWidget):
         dc_source_layout.addWidget(self.soc_spin)
         dc_source_layout.addWidget(self.load_current_label)
         dc_source_layout.addWidget(self.load_current_spin)
+        dc_source_layout.addWidget(self.profile_label)
+        dc_source_layout.addLayout(profile_layout)
 
         # Phase Topology
         self.phase_label = QLabel("Phase Topology:")
@@ -121,8 +139,8 @@ class ControlPanel(QWidget):
         # PWM Technique
         self.pwm_label = QLabel("PWM Technique:")
         self.pwm_combo = QComboBox()
-        self.pwm_combo.addItems(["Multicarrier", "Space Vector"])
-        self.pwm_combo.setCurrentText("Multicarrier")
+        self.pwm_combo.addItems(PWM_TECHNIQUES)
+        self.pwm_combo.setCurrentText("Phase Disposition")
         self.pwm_combo.currentTextChanged.connect(self.emit_pwm)
 
         # Design
@@ -132,10 +150,17 @@ class ControlPanel(QWidget):
         self.design_combo.setCurrentText("Transformerless")
         self.design_combo.currentTextChanged.connect(self.emit_design)
 
+        # Output Filter
+        self.filter_label = QLabel("Output Filter:")
+        self.filter_combo = QComboBox()
+        self.filter_combo.addItems(["None", "L", "LC", "LCL"])
+        self.filter_combo.setCurrentText("None")
+        self.filter_combo.currentTextChanged.connect(self.emit_filter)
+
         # MPPT Algorithm
         self.mppt_label = QLabel("MPPT Algorithm:")
         self.mppt_combo = QComboBox()
-        self.mppt_combo.addItems(["None", "Perturb & Observe", "Incremental Conductance", "Constant Voltage", "Constant Current", "Ripple Correlation Control"])
+        self.mppt_combo.addItems(["None", "Perturb & Observe", "Incremental Conductance", "Constant Voltage", "Constant Current", "Ripple Correlation Control", "Global Scan", "Particle Swarm", "Hybrid Scan+PSO"])
         self.mppt_combo.setCurrentText("None")
         self.mppt_combo.currentTextChanged.connect(self.emit_mppt)
 
@@ -146,6 +171,19 @@ class ControlPanel(QWidget):
         self.control_combo.setCurrentText("PI")
         self.control_combo.currentTextChanged.connect(self.emit_control)
 
+        # Phase-Locked Loop
+        self.pll_label = QLabel("PLL:")
+        self.pll_combo = QComboBox()
+        self.pll_combo.addItems(PLL_TYPES)
+        self.pll_combo.setCurrentText("SOGI-PLL")
+        self.pll_combo.currentTextChanged.connect(self.emit_pll)
+
+        # Harmonic Compensation (PR control)
+        self.harmonics_label = QLabel("Harmonic Compensation:")
+        self.harmonics_check = QCheckBox("3rd/5th/7th/11th")
+        self.harmonics_check.setChecked(False)
+        self.harmonics_check.stateChanged.connect(self.emit_harmonics)
+
         # Islanding Detection
         self.islanding_label = QLabel("Islanding Detection:")
         self.islanding_check = QCheckBox("Enable")
@@ -217,10 +255,16 @@ class ControlPanel(QWidget):
         params_layout.addWidget(self.pwm_combo)
         params_layout.addWidget(self.design_label)
         params_layout.addWidget(self.design_combo)
+        params_layout.addWidget(self.filter_label)
+        params_layout.addWidget(self.filter_combo)
         params_layout.addWidget(self.mppt_label)
         params_layout.addWidget(self.mppt_combo)
         params_layout.addWidget(self.control_label)
         params_layout.addWidget(self.control_combo)
+        params_layout.addWidget(self.pll_label)
+        params_layout.addWidget(self.pll_combo)
+        params_layout.addWidget(self.harmonics_label)
+        params_layout.addWidget(self.harmonics_check)
         params_layout.addWidget(self.islanding_label)
         params_layout.addWidget(self.islanding_check)
         params_layout.addWidget(self.frequency_label)
@@ -308,8 +352,21 @@ class ControlPanel(QWidget):
         self.soc_spin.setVisible(source_type in ["Battery", "Hybrid"])
         self.load_current_label.setVisible(source_type in ["Fuel Cell", "Hybrid"])
         self.load_current_spin.setVisible(source_type in ["Fuel Cell", "Hybrid"])
+        self.profile_label.setVisible(source_type != "Fixed")
+        self.load_profile_button.setVisible(source_type != "Fixed")
+        self.clear_profile_button.setVisible(source_type != "Fixed")
         self.emit_parameters()
 
+    def load_profile(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Profile", os.path.expanduser("~"), "Profiles (*.csv *.parquet);;All Files (*)")
+        if path:
+            self.profile_label.setText(f"Profile: {os.path.basename(path)}")
+            self.profile_changed.emit(path)
+
+    def clear_profile(self):
+        self.profile_label.setText("Profile: None")
+        self.profile_changed.emit("")
+
     def update_mod_index(self):
         value = self.mod_index_slider.value() / 100
         self.mod_index_value.setText(f"{value:.2f}")
@@ -340,12 +397,21 @@ class ControlPanel(QWidget):
     def emit_design(self):
         self.design_changed.emit(self.design_combo.currentText())
 
+    def emit_filter(self):
+        self.filter_changed.emit(self.filter_combo.currentText())
+
     def emit_mppt(self):
         self.mppt_changed.emit(self.mppt_combo.currentText())
 
     def emit_control(self):
         self.control_changed.emit(self.control_combo.currentText())
 
+    def emit_pll(self):
+        self.pll_changed.emit(self.pll_combo.currentText())
+
+    def emit_harmonics(self):
+        self.harmonics_changed.emit(self.harmonics_check.isChecked())
+
     def emit_islanding(self):
         self.islanding_changed.emit(self.islanding_check.isChecked())
 
@@ -376,12 +442,21 @@ class ControlPanel(QWidget):
     def get_design(self):
         return self.design_combo.currentText()
 
+    def get_output_filter(self):
+        return self.filter_combo.currentText()
+
     def get_mppt(self):
         return self.mppt_combo.currentText()
 
     def get_control(self):
         return self.control_combo.currentText()
 
+    def get_pll(self):
+        return self.pll_combo.currentText()
+
+    def is_harmonic_compensation_enabled(self):
+        return self.harmonics_check.isChecked()
+
     def is_islanding_enabled(self):
         return self.islanding_check.isChecked()
 
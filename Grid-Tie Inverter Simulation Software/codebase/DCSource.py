@@ -1,4 +1,6 @@
 import numpy as np
+from Numerik import axis_weights, bilinear, rc_response
+from PVModel import shared_pv_model
 
 class DCSource:
     def __init__(self):
@@ -11,106 +13,288 @@ class DCSource:
         pass
 
 class PVPanel(DCSource):
-    def __init__(self):
+    def __init__(self, pv_model=None):
         super().__init__()
-        self.V_oc_STC = 500  # Open-circuit voltage at STC (V)
-        self.I_sc_STC = 10   # Short-circuit current at STC (A)
-        self.T_STC = 25      # Standard test condition temperature (°C)
-        self.G_STC = 1000    # Standard test condition irradiance (W/m²)
-        self.alpha = 0.0005  # Current temperature coefficient (1/°C)
-        self.beta = -0.003   # Voltage temperature coefficient (1/°C)
-        self.k = 0.05        # Empirical loss factor
+        self.pv_model = pv_model if pv_model is not None else shared_pv_model
+        self.current = 0
+        self.power = 0
+        self.operating_point = None  # (irradiance, temperature, voltage) of the cached current/power
     
     def update(self, params, time_step, current_time):
         irradiance = params.get('irradiance', 1000)  # W/m²
         temperature = params.get('temperature', 25)  # °C
         
-        # Adjust I_sc and V_oc for irradiance and temperature
-        I_sc = self.I_sc_STC * (irradiance / self.G_STC) * (1 + self.alpha * (temperature - self.T_STC))
-        V_oc = self.V_oc_STC * (1 + self.beta * (temperature - self.T_STC))
-        
-        # Simplified PV model: I = I_sc * (1 - (V/V_oc)^2)
-        V = self.voltage
-        I = I_sc * (1 - (V / V_oc) ** 2)
-        V_new = V  # Initial guess
-        for _ in range(5):  # Simple iteration to find operating voltage
-            I = I_sc * (1 - (V_new / V_oc) ** 2)
-            P = V_new * I
-            V_new = V + self.k * (P - V * I)  # Adjust voltage towards MPP
-        self.voltage = np.clip(V_new, 100, 800)
+        # Operating point from the cached I-V surface, only looked up again when the conditions change
+        operating_point = (irradiance, temperature, self.voltage)
+        if operating_point != self.operating_point:
+            self.current = self.pv_model.current(self.voltage, irradiance, temperature)
+            self.power = self.voltage * self.current
+            self.operating_point = operating_point
+        self.voltage = np.clip(self.voltage, 100, 800)
         return self.voltage
     
     def reset(self):
         self.voltage = 400
+        self.current = 0
+        self.power = 0
+        self.operating_point = None
+
+# Open-circuit voltage of one NMC cell over SOC, scaled by the number of series cells
+OCV_SOC = np.linspace(0, 1, 11)
+OCV_CELL = np.array([3.00, 3.45, 3.55, 3.62, 3.68, 3.74, 3.82, 3.90, 3.98, 4.08, 4.20])
 
 class Battery(DCSource):
+    # Thevenin equivalent circuit: OCV(SOC) - R0 * I - one RC pair, with coulomb counting.
+    # Positive current discharges. simulate() also runs batches of packs: SOC (packs,), current (packs, samples).
     def __init__(self):
         super().__init__()
         self.V_nom = 400     # Nominal voltage (V)
+        self.cells_series = 108  # 108 x 3.7 V = 400 V
         self.SOC = 0.8       # State of Charge (0 to 1)
+        self.SOC_min = 0.1   # Discharge cut-off
+        self.SOC_max = 0.95  # Charge cut-off
+        self.max_c_rate = 1.0  # Current limit (C)
         self.C_nom = 100     # Nominal capacity (Ah)
+        self.R0 = 0.16       # Series resistance (Ohm)
+        self.R1 = 0.08       # Polarization resistance (Ohm)
+        self.C1 = 375.0      # Polarization capacitance (F), tau = 30 s
+        self.charge_efficiency = 0.98  # Coulombic efficiency while charging
         self.discharge_rate = 0.1  # C-rate (fraction of capacity per hour)
+        self.SOC_setting = self.SOC  # Last SOC received from the control panel
+        self.V_rc = 0.0      # RC pair voltage (V)
+        self.current = 0.0
+        self.loss = 0.0      # Resistive loss (W)
+        self.last_time = None
+    
+    def open_circuit_voltage(self, SOC):
+        return self.cells_series * np.interp(SOC, OCV_SOC, OCV_CELL)
+    
+    def simulate(self, current, time_step, SOC=None, V_rc=None):
+        # Vectorized window integration; returns per-sample SOC, RC voltage, terminal voltage and loss
+        current = np.asarray(current, dtype=float)
+        SOC = np.asarray(self.SOC if SOC is None else SOC, dtype=float)
+        V_rc = np.broadcast_to(np.asarray(self.V_rc if V_rc is None else V_rc, dtype=float), SOC.shape)
+        
+        charge = np.where(current < 0, self.charge_efficiency * current, current) * time_step
+        SOC_t = np.clip(SOC[..., np.newaxis] - np.cumsum(charge, axis=-1) / (3600 * self.C_nom), 0.0, 1.0)
+        a = np.exp(-time_step / (self.R1 * self.C1))
+        V_rc_t = rc_response(current, a, self.R1 * (1 - a), V_rc)
+        voltage = self.open_circuit_voltage(SOC_t) - self.R0 * current - V_rc_t
+        loss = self.R0 * current ** 2 + V_rc_t ** 2 / self.R1
+        return {'SOC': SOC_t, 'V_rc': V_rc_t, 'voltage': voltage, 'loss': loss}
     
     def update(self, params, time_step, current_time):
-        SOC = params.get('SOC', self.SOC)  # State of Charge from control panel
-        self.SOC = np.clip(SOC, 0.1, 1.0)
+        # The panel SOC only re-initializes the state when it is changed, so discharge accumulates
+        SOC = params.get('SOC', self.SOC_setting)
+        if SOC != self.SOC_setting:
+            self.SOC_setting = SOC
+            self.SOC = float(np.clip(SOC, 0.0, 1.0))
+            self.V_rc = 0.0
         
-        # Simple battery model: Voltage depends on SOC
-        V_min = 0.9 * self.V_nom
-        V_max = 1.1 * self.V_nom
-        self.voltage = V_min + (V_max - V_min) * self.SOC
+        current = params.get('battery_current', self.discharge_rate * self.C_nom)  # A, positive = discharge
+        if self.SOC <= self.SOC_min and current > 0:
+            current = 0.0  # BMS cut-off
         
-        # Simulate discharge
-        discharge_current = self.discharge_rate * self.C_nom
-        self.SOC -= (discharge_current * time_step / 3600) / self.C_nom
-        self.SOC = np.clip(self.SOC, 0.1, 1.0)
+        # Integrate the whole interval since the previous call, one sample per time step
+        elapsed = current_time - self.last_time if self.last_time is not None and current_time > self.last_time else time_step
+        self.last_time = current_time
+        samples = max(1, int(round(elapsed / time_step)))
+        result = self.simulate(np.full(samples, current), elapsed / samples)
+        self.SOC = float(result['SOC'][-1])
+        self.V_rc = float(result['V_rc'][-1])
+        self.current = current
+        self.loss = float(result['loss'][-1])
         
-        self.voltage = np.clip(self.voltage, 100, 800)
+        self.voltage = np.clip(result['voltage'][-1], 100, 800)
         return self.voltage
     
     def reset(self):
         self.voltage = 400
-        self.SOC = 0.8
+        self.SOC = self.SOC_setting
+        self.V_rc = 0.0
+        self.current = 0.0
+        self.loss = 0.0
+        self.last_time = None
+
+GAS_CONSTANT = 8.314  # J/(mol K)
+FARADAY = 96485.0     # C/mol
 
 class FuelCell(DCSource):
+    # PEM stack polarization curve: Nernst voltage minus activation (Butler-Volmer with internal current),
+    # ohmic (temperature-dependent membrane resistance) and mass-transport losses.
+    # Per-tick queries read a (temperature, current) table; polarization_curve() evaluates the exact model.
     def __init__(self):
         super().__init__()
         self.V_nom = 400     # Nominal voltage (V)
         self.I_max = 20      # Maximum current (A)
-        self.efficiency = 0.6  # Fuel cell efficiency
+        self.cells = 280     # Cells in series
+        self.area = 50.0     # Active area (cm²)
+        self.T_stack = 70.0  # Stack temperature (°C)
+        self.p_H2, self.p_O2 = 1.0, 0.21  # Partial pressures (atm)
+        self.alpha = 0.5     # Charge transfer coefficient
+        self.i_0 = 1e-5      # Exchange current density at 80 °C (A/cm²)
+        self.E_act = 66e3    # Activation energy of i_0 (J/mol)
+        self.i_n = 2e-3      # Internal/crossover current density (A/cm²)
+        self.r_ohm = 0.15    # Area-specific resistance at 80 °C (Ohm cm²)
+        self.i_L = 1.4       # Limiting current density (A/cm²)
+        self.B = 0.05        # Mass-transport coefficient (V)
+        self.efficiency = 0.6  # Stack efficiency (LHV), updated every call
+        self.temperature_axis = np.linspace(20, 90, 15)
+        self.current_axis = np.linspace(0, self.I_max, 201)
+        self.table = None
+    
+    def polarization_curve(self, current, temperature=None):
+        # Exact stack voltage, vectorized over any broadcastable current/temperature arrays
+        T = np.asarray(self.T_stack if temperature is None else temperature, dtype=float) + 273.15
+        i = np.clip(np.asarray(current, dtype=float) / self.area, 0, 0.999 * self.i_L)
+        RT_F = GAS_CONSTANT * T / FARADAY
+        E = 1.229 - 0.85e-3 * (T - 298.15) + RT_F / 2 * np.log(self.p_H2 * np.sqrt(self.p_O2))
+        i_0 = self.i_0 * np.exp(-self.E_act / GAS_CONSTANT * (1 / T - 1 / 353.15))
+        V_act = RT_F / (2 * self.alpha) * np.arcsinh((i + self.i_n) / (2 * i_0))
+        r_ohm = self.r_ohm * np.exp(1268 * (1 / T - 1 / 353.15))  # Membrane conductivity rises with temperature
+        V_conc = -self.B * np.log(1 - i / self.i_L)
+        return self.cells * (E - V_act - i * r_ohm - V_conc)
+    
+    def build_table(self):
+        self.table = self.polarization_curve(self.current_axis, self.temperature_axis[:, np.newaxis])
+    
+    def stack_voltage(self, current, temperature=None):
+        # Table lookup, bilinear in (temperature, current); works on scalars and arrays
+        if self.table is None:
+            self.build_table()
+        T = np.asarray(self.T_stack if temperature is None else temperature, dtype=float)
+        I = np.asarray(current, dtype=float)
+        # Both axes are evenly spaced
+        V = bilinear(self.table, axis_weights(self.temperature_axis, T, uniform=True) + axis_weights(self.current_axis, I, uniform=True))
+        return V if V.ndim else float(V)
+    
+    def sweep(self, currents=None, temperatures=None):
+        # Polarization and power curves for whole current sweeps: arrays of shape (temperatures, currents)
+        currents = self.current_axis if currents is None else np.asarray(currents, dtype=float)
+        temperatures = np.atleast_1d(self.T_stack if temperatures is None else np.asarray(temperatures, dtype=float))
+        V = self.stack_voltage(currents[np.newaxis, :], temperatures[:, np.newaxis])
+        return {'current': currents, 'temperature': temperatures, 'voltage': V, 'power': V * currents}
     
     def update(self, params, time_step, current_time):
         load_current = params.get('load_current', 10)  # A
         load_current = np.clip(load_current, 0, self.I_max)
+        temperature = params.get('stack_temperature', self.T_stack)  # °C
         
-        # Simple fuel cell model: Voltage drops with current
-        V_drop = 0.05 * load_current  # Linear voltage drop
-        self.voltage = self.V_nom * self.efficiency - V_drop
+        self.voltage = self.stack_voltage(load_current, temperature)
+        self.efficiency = self.voltage / (self.cells * 1.254)  # Cell voltage over the LHV voltage
         self.voltage = np.clip(self.voltage, 100, 800)
         return self.voltage
     
     def reset(self):
         self.voltage = 400
 
+DISPATCH_POLICIES = ["Rule-Based", "Optimal"]
+DISPATCH_SOURCES = ['pv', 'battery', 'fuel_cell', 'unserved']
+
+class HybridDispatcher:
+    # Splits the DC bus load between PV, battery and fuel cell (W, battery positive = discharge).
+    # "Rule-Based": PV first, battery within its limits, fuel cell for the rest.
+    # "Optimal": separable QP, min sum(c*P + q/2*P²) s.t. box limits and power balance, solved exactly on
+    # the piecewise-linear dual (one marginal price for all sources). The last active segment is tried first.
+    def __init__(self, policy="Optimal", tolerance=0.01):
+        self.policy = policy
+        self.tolerance = tolerance  # Relative input change that triggers a re-solve
+        self.SOC_target = 0.6
+        self.SOC_weight = 1.0       # Battery price shift per unit SOC below/above target
+        self.linear_cost = {'pv': -1.0, 'battery': 0.05, 'fuel_cell': 0.3, 'unserved': 10.0}  # per W
+        self.quadratic_cost = {'pv': 1e-6, 'battery': 1e-4, 'fuel_cell': 1e-4, 'unserved': 1e-6}
+        self.input_scale = (100.0, 100.0, 0.01, 100.0, 100.0, 100.0)  # Floors for the relative change test
+        self.reset()
+    
+    def reset(self):
+        self.last_inputs = None
+        self.solution = None
+        self.segment = 0
+        self.solves = 0
+        self.reuses = 0
+    
+    def dispatch(self, P_load, P_pv_available, SOC, P_fc_max, P_discharge_max, P_charge_max):
+        inputs = (P_load, P_pv_available, SOC, P_fc_max, P_discharge_max, P_charge_max)
+        if self.last_inputs is not None and all(
+                abs(new - old) <= self.tolerance * max(abs(old), floor)
+                for new, old, floor in zip(inputs, self.last_inputs, self.input_scale)):
+            self.reuses += 1
+            return self.solution
+        
+        lower = {'pv': 0.0, 'battery': -P_charge_max, 'fuel_cell': 0.0, 'unserved': 0.0}
+        upper = {'pv': P_pv_available, 'battery': P_discharge_max, 'fuel_cell': P_fc_max, 'unserved': max(P_load, 0.0)}
+        if self.policy == "Rule-Based":
+            self.solution = self._solve_rules(P_load, lower, upper)
+        else:
+            cost = dict(self.linear_cost)
+            cost['battery'] += self.SOC_weight * (self.SOC_target - SOC)
+            self.solution = self._solve_qp(P_load, cost, lower, upper)
+        self.last_inputs = inputs
+        self.solves += 1
+        return self.solution
+    
+    def _solve_rules(self, P_load, lower, upper):
+        pv = min(upper['pv'], max(P_load, 0.0) - lower['battery'])  # Surplus beyond load + charging is curtailed
+        residual = P_load - pv
+        battery = min(max(residual, lower['battery']), upper['battery'])
+        fuel_cell = min(max(residual - battery, 0.0), upper['fuel_cell'])
+        return {'pv': pv, 'battery': battery, 'fuel_cell': fuel_cell, 'unserved': max(residual - battery - fuel_cell, 0.0)}
+    
+    def _solve_qp(self, P_load, cost, lower, upper):
+        q = self.quadratic_cost
+        
+        def allocation(price):
+            return {k: min(max((price - cost[k]) / q[k], lower[k]), upper[k]) for k in DISPATCH_SOURCES}
+        
+        # Total output is piecewise linear in the price with kinks where a source hits a limit
+        prices = sorted({cost[k] + q[k] * lower[k] for k in DISPATCH_SOURCES} | {cost[k] + q[k] * upper[k] for k in DISPATCH_SOURCES})
+        totals = [sum(allocation(price).values()) for price in prices]
+        if P_load <= totals[0]:
+            return allocation(prices[0])
+        if P_load >= totals[-1]:
+            return allocation(prices[-1])
+        k = self.segment if self.segment < len(prices) - 1 and totals[self.segment] <= P_load <= totals[self.segment + 1] else \
+            next(j for j in range(len(prices) - 1) if totals[j] <= P_load <= totals[j + 1])
+        self.segment = k
+        span = totals[k + 1] - totals[k]
+        price = prices[k] + (P_load - totals[k]) / span * (prices[k + 1] - prices[k]) if span > 0 else prices[k]
+        return allocation(price)
+
 class HybridSource(DCSource):
-    def __init__(self):
+    # Battery-tied DC bus: the dispatcher sets the battery and fuel cell currents, the bus follows the battery
+    def __init__(self, policy="Optimal"):
         super().__init__()
         self.pv = PVPanel()
         self.battery = Battery()
         self.fuel_cell = FuelCell()
-        self.weights = {'pv': 0.5, 'battery': 0.3, 'fuel_cell': 0.2}
+        self.dispatcher = HybridDispatcher(policy)
+        self.P_load = 3000.0  # Default DC bus load (W)
+        self.dispatch = {k: 0.0 for k in DISPATCH_SOURCES}
     
     def update(self, params, time_step, current_time):
-        pv_voltage = self.pv.update(params, time_step, current_time)
-        battery_voltage = self.battery.update(params, time_step, current_time)
-        fuel_cell_voltage = self.fuel_cell.update(params, time_step, current_time)
+        irradiance = params.get('irradiance', 1000)
+        temperature = params.get('temperature', 25)
+        self.pv.update(params, time_step, current_time)
+        # PV runs on its own MPPT converter, so its available power is the MPP power
+        P_pv_available = max(self.pv.pv_model.mpp(irradiance, temperature)[2], 0.0) if irradiance > 0 else 0.0
+        
+        battery = self.battery
+        V_bus = battery.voltage
+        I_battery_max = battery.max_c_rate * battery.C_nom
+        P_discharge_max = I_battery_max * V_bus if battery.SOC > battery.SOC_min else 0.0
+        P_charge_max = I_battery_max * V_bus if battery.SOC < battery.SOC_max else 0.0
+        P_fc_max = self.fuel_cell.stack_voltage(self.fuel_cell.I_max) * self.fuel_cell.I_max
+        
+        self.dispatch = self.dispatcher.dispatch(params.get('load_power', self.P_load), P_pv_available, battery.SOC,
+                                                 P_fc_max, P_discharge_max, P_charge_max)
+        
+        # Fuel cell current for the dispatched power: fixed point of I = P / V(I) on the polarization table
+        fc_current = 0.0
+        for _ in range(3):
+            fc_current = min(self.dispatch['fuel_cell'] / self.fuel_cell.stack_voltage(fc_current), self.fuel_cell.I_max)
+        self.fuel_cell.update(dict(params, load_current=fc_current), time_step, current_time)
         
-        # Weighted average of voltages
-        self.voltage = (
-            self.weights['pv'] * pv_voltage +
-            self.weights['battery'] * battery_voltage +
-            self.weights['fuel_cell'] * fuel_cell_voltage
-        )
+        self.voltage = battery.update(dict(params, battery_current=self.dispatch['battery'] / V_bus), time_step, current_time)
         self.voltage = np.clip(self.voltage, 100, 800)
         return self.voltage
     
@@ -118,4 +302,6 @@ class HybridSource(DCSource):
         self.pv.reset()
         self.battery.reset()
         self.fuel_cell.reset()
+        self.dispatcher.reset()
+        self.dispatch = {k: 0.0 for k in DISPATCH_SOURCES}
         self.voltage = 400
\ No newline at end of file
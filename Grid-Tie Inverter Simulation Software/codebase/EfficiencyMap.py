@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Halbleiterverluste import ElectroThermalModel, efficiency_map
+from MehrstufigeWechselrichter import MultilevelInverter, MULTILEVEL_TYPES, level_table
+from Numerik import axis_weights, bilinear
+from TransformatorlosUndTransformatorbasiert import DESIGN_TYPES
+
+# Precomputed inverter efficiency over (topology, design, dc_voltage, output power). The semiconductor maps come
+# from the electro-thermal loss model, one process per (topology, dc_voltage); the design stage multiplies its own
+# efficiency in. Tables are stored on disk under a hash of every parameter that affects them.
+
+# Bumped whenever the map computation changes in a way the parameters don't show, so old cache files are not reused
+MAP_FORMAT_VERSION = 2
+
+# Weighted efficiency standards: fraction of rated power -> weight
+EU_WEIGHTS = {0.05: 0.03, 0.10: 0.06, 0.20: 0.13, 0.30: 0.10, 0.50: 0.48, 1.00: 0.20}
+CEC_WEIGHTS = {0.10: 0.04, 0.20: 0.05, 0.30: 0.12, 0.50: 0.21, 0.75: 0.53, 1.00: 0.05}
+WEIGHTED_EFFICIENCY = {"EU": EU_WEIGHTS, "CEC": CEC_WEIGHTS}
+
+def _hash_update(digest, value):
+    # Feeds parameters, arrays and (nested) model objects into the hash in a stable order
+    if isinstance(value, np.ndarray):
+        digest.update(str(value.dtype).encode() + str(value.shape).encode() + value.tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(str(key).encode())
+            _hash_update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _hash_update(digest, item)
+    elif hasattr(value, '__dict__'):
+        digest.update(type(value).__name__.encode())
+        _hash_update(digest, vars(value))
+    else:
+        digest.update(json.dumps(value).encode())
+
+def _topology_structure(name):
+    # Level structure the maps are computed on ("None" = two-level bridge)
+    inverter = MultilevelInverter if name == "None" else MULTILEVEL_TYPES[name]
+    level_count = 2 if name == "None" else inverter.level_count
+    return {'name': name, 'level_count': level_count, 'cell_ratios': inverter.cell_ratios, 'peak': inverter.peak,
+            'level_pu': level_table(level_count, inverter.cell_ratios, inverter.peak)}
+
+def _map_job(args):
+    topology, dc_voltage, powers, kwargs = args
+    return efficiency_map(topology, powers, [dc_voltage], **kwargs)['efficiency'][0]
+
+class EfficiencyMapTable:
+    def __init__(self, topologies=None, designs=None, rated_power=10000.0, power_axis=None, dc_voltage_axis=None, phases=3,
+                 frequency=50, power_factor=1.0, V_grid=230, samples=10000, pwm_technique="Phase Disposition", switching_frequency=10000,
+                 model=None, cache_dir=None, workers=None):
+        self.topologies = list(MULTILEVEL_TYPES) if topologies is None else list(topologies)
+        self.designs = list(DESIGN_TYPES) if designs is None else list(designs)
+        self.rated_power = rated_power  # W
+        if power_axis is None:
+            # Regular grid plus the exact weighting points of both standards
+            fractions = np.concatenate((np.linspace(0.05, 1.0, 20), list(EU_WEIGHTS), list(CEC_WEIGHTS)))
+            power_axis = np.unique(np.round(fractions, 6)) * rated_power
+        self.power_axis = np.asarray(power_axis, dtype=float)
+        self.dc_voltage_axis = np.linspace(350, 800, 10) if dc_voltage_axis is None else np.asarray(dc_voltage_axis, dtype=float)
+        self.map_kwargs = {'frequency': frequency, 'phases': phases, 'power_factor': power_factor, 'V_grid': V_grid, 'samples': samples,
+                           'pwm_technique': pwm_technique, 'switching_frequency': switching_frequency}
+        self.model = model if model is not None else ElectroThermalModel()
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(os.path.expanduser('~'), '.inverter_simulation', 'efficiency_maps')
+        self.workers = workers
+        self.table = None  # (topologies, designs, dc_voltages, powers)
+    
+    def parameter_hash(self):
+        digest = hashlib.sha1()
+        # Static parameters only: the model's junction temperatures change with every simulated window
+        _hash_update(digest, {
+            'version': MAP_FORMAT_VERSION,
+            'topologies': [_topology_structure(name) for name in self.topologies],
+            'designs': [(name, DESIGN_TYPES[name].efficiency) for name in self.designs],
+            'power_axis': self.power_axis,
+            'dc_voltage_axis': self.dc_voltage_axis,
+            'map': self.map_kwargs,
+            'model': self.model.parameters()
+        })
+        return digest.hexdigest()[:16]
+    
+    def cache_path(self):
+        return os.path.join(self.cache_dir, f"efficiency_map_{self.parameter_hash()}.npz")
+    
+    def compute(self):
+        # Semiconductor maps in parallel, then the design stages on top
+        jobs = [(topology, float(dc_voltage), self.power_axis, dict(self.map_kwargs, model=self.model))
+                for topology in self.topologies for dc_voltage in self.dc_voltage_axis]
+        with ProcessPoolExecutor(max_workers=self.workers or os.cpu_count()) as pool:
+            results = list(pool.map(_map_job, jobs))
+        semiconductor = np.array(results).reshape(len(self.topologies), len(self.dc_voltage_axis), len(self.power_axis))
+        design_efficiency = np.array([DESIGN_TYPES[name].efficiency for name in self.designs])
+        self.table = semiconductor[:, np.newaxis] * design_efficiency[np.newaxis, :, np.newaxis, np.newaxis]
+        return self
+    
+    def build(self):
+        # Loads the table for these parameters from the disk cache, computing and storing it on a miss
+        path = self.cache_path()
+        if os.path.exists(path):
+            self.table = np.load(path)['efficiency']
+            return self
+        self.compute()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.save(path)
+        except OSError:
+            pass  # Read-only location: keep the table in memory
+        return self
+    
+    def save(self, path):
+        if self.table is None:
+            self.compute()
+        np.savez(path, efficiency=self.table, power_axis=self.power_axis, dc_voltage_axis=self.dc_voltage_axis,
+                 topologies=np.array(self.topologies), designs=np.array(self.designs))
+    
+    def efficiency(self, power, dc_voltage, topology, design):
+        # Bilinear in (dc_voltage, power) for scalars or whole arrays
+        if self.table is None:
+            self.build()
+        table = self.table[self.topologies.index(topology), self.designs.index(design)]
+        eta = bilinear(table, axis_weights(self.dc_voltage_axis, dc_voltage) + axis_weights(self.power_axis, power))
+        return eta if eta.ndim else float(eta)
+    
+    def weighted_efficiency(self, topology, design, standard="EU", dc_voltage=None):
+        # EU: at the nominal (mid-range) dc voltage. CEC: averaged over minimum, nominal and maximum dc voltage.
+        weights = WEIGHTED_EFFICIENCY[standard]
+        if dc_voltage is None:
+            V_min, V_max = self.dc_voltage_axis[0], self.dc_voltage_axis[-1]
+            dc_voltage = [(V_min + V_max) / 2] if standard == "EU" else [V_min, (V_min + V_max) / 2, V_max]
+        fractions = np.array(list(weights))
+        eta = self.efficiency(fractions[np.newaxis, :] * self.rated_power, np.atleast_1d(dc_voltage)[:, np.newaxis], topology, design)
+        return float(np.mean(eta @ np.array(list(weights.values()))))
+    
+    def weighted_efficiencies(self, standard="EU", dc_voltage=None):
+        return {(topology, design): self.weighted_efficiency(topology, design, standard, dc_voltage)
+                for topology in self.topologies for design in self.designs}
+
+if __name__ == '__main__':
+    for attempt in ["computed", "cached"]:
+        start = time.perf_counter()
+        maps = EfficiencyMapTable().build()
+        print(f"Efficiency maps {attempt} in {time.perf_counter() - start:.2f} s ({maps.cache_path()})")
+    eu, cec = maps.weighted_efficiencies("EU"), maps.weighted_efficiencies("CEC")
+    print(f"{'Topology':<22} {'Design':<18} {'EU (%)':>7} {'CEC (%)':>8}")
+    for topology, design in eu:
+        print(f"{topology:<22} {design:<18} {eu[topology, design] * 100:>7.2f} {cec[topology, design] * 100:>8.2f}")
\ No newline at end of file
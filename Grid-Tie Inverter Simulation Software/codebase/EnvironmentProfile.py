@@ -0,0 +1,119 @@
+import csv
+import os
+import numpy as np
+
+# Recorded irradiance/temperature/load traces played back against simulation time.
+# A profile file is parsed once into a .npy cache next to it; later loads memory-map that cache,
+# so day-long 1 s traces are only paged in where the simulation actually samples them.
+
+PROFILE_COLUMNS = ['irradiance', 'temperature', 'load_current', 'SOC']
+COLUMN_ALIASES = {
+    'time': 'time', 'timestamp': 'time', 't': 'time',
+    'irradiance': 'irradiance', 'ghi': 'irradiance', 'poa': 'irradiance', 'g': 'irradiance',
+    'temperature': 'temperature', 'temp': 'temperature', 'module_temperature': 'temperature',
+    'load_current': 'load_current', 'load': 'load_current',
+    'soc': 'SOC'
+}
+
+def _column_name(name):
+    key = name.strip().lower().split(' (')[0]  # Drop unit suffixes like "Irradiance (W/m²)"
+    return COLUMN_ALIASES.get(key, key)
+
+def _seconds(column):
+    # Numeric seconds, or timestamps converted to seconds since the first row
+    column = np.asarray(column)
+    if not np.issubdtype(column.dtype, np.datetime64):
+        try:
+            return column.astype(float)
+        except ValueError:
+            column = column.astype('datetime64[ms]')
+    return (column - column[0]) / np.timedelta64(1, 's')
+
+def _read_csv(path):
+    with open(path, newline='') as f:
+        header = next(csv.reader(f))
+    raw = np.loadtxt(path, delimiter=',', skiprows=1, dtype=str, ndmin=2)
+    return [_column_name(name) for name in header], [raw[:, k] for k in range(len(header))]
+
+def _read_parquet(path):
+    import pyarrow.parquet as pq  # Optional dependency, only needed for Parquet profiles
+    table = pq.read_table(path, memory_map=True)
+    return [_column_name(name) for name in table.column_names], [table.column(k).to_numpy() for k in range(table.num_columns)]
+
+def load_profile_data(path):
+    # Structured array with a 'time' field (s) plus one float field per trace, memory-mapped when cached
+    cache = path + '.npy'
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        return np.load(cache, mmap_mode='r')
+    
+    names, columns = _read_parquet(path) if path.lower().endswith(('.parquet', '.pq')) else _read_csv(path)
+    time_index = names.index('time') if 'time' in names else 0
+    fields = ['time'] + [name for k, name in enumerate(names) if k != time_index]
+    data = np.empty(len(columns[0]), dtype=[(name, float) for name in fields])
+    data['time'] = _seconds(columns[time_index])
+    for k, name in enumerate(names):
+        if k != time_index:
+            data[name] = np.asarray(columns[k], dtype=float)
+    data = data[np.argsort(data['time'], kind='stable')]
+    
+    try:
+        np.save(cache, data)
+        return np.load(cache, mmap_mode='r')
+    except OSError:
+        return data  # Read-only location: keep the parsed profile in memory
+
+class EnvironmentProfile:
+    def __init__(self, path, speed=1.0, offset=0.0, loop=False):
+        self.path = path
+        self.data = load_profile_data(path)
+        self.time = self.data['time']
+        self.columns = [name for name in self.data.dtype.names if name != 'time']
+        self.speed = speed    # Profile seconds played per simulated second
+        self.offset = offset  # Profile time at simulation time zero (s)
+        self.loop = loop
+        self.start = float(self.time[0])
+        self.duration = float(self.time[-1]) - self.start
+        self.index = 0  # Interval used by the previous sample
+    
+    def profile_time(self, current_time):
+        t = self.offset + self.speed * np.asarray(current_time, dtype=float)
+        if self.loop and self.duration > 0:
+            t = self.start + (t - self.start) % self.duration
+        return t
+    
+    def _interval(self, t):
+        # Playback moves forward, so the previous or next interval is almost always the right one
+        time, i = self.time, self.index
+        n = len(time)
+        if n < 2:
+            return 0
+        for k in (i, i + 1):
+            if k < n - 1 and time[k] <= t < time[k + 1]:
+                self.index = k
+                return k
+        self.index = int(min(max(np.searchsorted(time, t, side='right') - 1, 0), n - 2))
+        return self.index
+    
+    def sample(self, current_time):
+        # Conditions at one simulation time, linearly interpolated and held at the ends
+        t = float(self.profile_time(current_time))
+        k = self._interval(t)
+        if len(self.time) < 2:
+            return {name: float(self.data[name][0]) for name in self.columns}
+        t0, t1 = float(self.time[k]), float(self.time[k + 1])
+        frac = min(max((t - t0) / (t1 - t0), 0.0), 1.0) if t1 > t0 else 0.0
+        row0, row1 = self.data[k], self.data[k + 1]
+        return {name: (1 - frac) * float(row0[name]) + frac * float(row1[name]) for name in self.columns}
+    
+    def sample_many(self, times):
+        # Vectorized lookup for a whole array of simulation times, touching only the rows it needs
+        t = self.profile_time(times)
+        if len(self.time) < 2:
+            return {name: np.full(np.shape(t), float(self.data[name][0])) for name in self.columns}
+        k = np.clip(np.searchsorted(self.time, t, side='right') - 1, 0, len(self.time) - 2)
+        rows = np.unique(np.concatenate((k.ravel(), k.ravel() + 1)))
+        local = np.searchsorted(rows, k)
+        block = self.data[rows]  # Only these rows are paged in from the memory map
+        t0, t1 = block['time'][local], block['time'][local + 1]
+        frac = np.clip((t - t0) / np.where(t1 > t0, t1 - t0, 1.0), 0.0, 1.0)
+        return {name: (1 - frac) * block[name][local] + frac * block[name][local + 1] for name in self.columns}
\ No newline at end of file
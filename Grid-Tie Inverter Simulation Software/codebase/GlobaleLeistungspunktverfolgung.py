@@ -0,0 +1,248 @@
+import numpy as np
+from MaximaleLeistungspunktverfolgung import MPPTAlgorithm
+from PVModel import PVArray
+
+# Global MPPT for partially shaded arrays: the P-V curve has one peak per bypass-diode pattern,
+# so the trackers search the whole voltage range and only then fine-tune with a local P&O step.
+
+class EvaluationCache:
+    # (current, power) per probed voltage, valid while the operating conditions stay the same
+    def __init__(self, resolution=0.5):
+        self.resolution = resolution  # Voltage bin (V); probes closer than this share an entry
+        self.conditions = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def lookup(self, conditions, voltage, evaluate):
+        if conditions != self.conditions:
+            self.conditions = conditions
+            self.entries = {}
+        key = round(voltage / self.resolution)
+        if key in self.entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.entries[key] = evaluate(voltage)
+        return self.entries[key]
+    
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class GlobalMPPTAlgorithm(MPPTAlgorithm):
+    def __init__(self, pv_model=None, power_change=0.1, rescan_period=10.0):
+        super().__init__(pv_model)
+        self.cache = EvaluationCache()
+        self.power_change = power_change    # Relative power change that restarts the global search
+        self.rescan_period = rescan_period  # Periodic global search (s)
+        self.settle_reversals = 2           # Local-step reversals (tracker settled on a peak) before a power change is judged
+        self.step_change = 0.01             # Relative power change per call that counts as a step in the conditions
+        self.uniform_band = (0.75, 0.88)    # V/V_oc of the MPP under uniform irradiance
+        self.reversals = 0
+        self.perturbation_step = 2.0        # Local P&O step between searches (V)
+        self.direction = 1
+        self.prev_power = 0
+        self.reference_power = None  # Power at the end of the last global search
+        self.last_search = None
+    
+    def probe(self, state, voltage):
+        irradiance = state.get('irradiance', 1000)
+        temperature = state.get('temperature', 25)
+        conditions = (np.asarray(irradiance, dtype=float).tobytes(), np.asarray(temperature, dtype=float).tobytes())
+        return self.cache.lookup(conditions, voltage, lambda V: self.measure(state, V))
+    
+    def search_range(self, state):
+        I_sc, V_oc = self.pv_model.limits(state.get('irradiance', 1000), state.get('temperature', 25))
+        return 100.0, float(np.clip(0.98 * V_oc, 100.0, 800.0))
+    
+    def needs_search(self, state, voltage, power, current_time):
+        # Periodic search, or a power change with a partial-shading signature: once the local step has settled on
+        # a peak again, the operating point sits away from the uniform-irradiance MPP voltage. Ramps and uniform
+        # steps only move the reference and are followed by the local step.
+        if self.last_search is None or current_time - self.last_search >= self.rescan_period:
+            return True
+        if self.stepped(power):
+            self.reversals = 0
+        if (self.reference_power is None or self.reversals < self.settle_reversals or
+                abs(power - self.reference_power) <= self.power_change * max(self.reference_power, 1e-9)):
+            return False
+        V_oc = self.pv_model.limits(state.get('irradiance', 1000), state.get('temperature', 25))[1]
+        if self.uniform_band[0] <= voltage / max(V_oc, 1e-9) <= self.uniform_band[1]:
+            self.reference_power = power
+            return False
+        return True
+    
+    def stepped(self, power):
+        # Power jump between two calls larger than a local step causes: the conditions changed, the tracker has to settle again
+        return abs(power - self.prev_power) > self.step_change * max(power, 1e-9)
+    
+    def local_step(self, voltage, power):
+        # Same rule as PerturbAndObserve, with a finer step around the global peak
+        if power <= self.prev_power:
+            self.direction *= -1
+            self.reversals += 0 if self.stepped(power) else 1
+        self.prev_power = power
+        return voltage + self.direction * self.perturbation_step
+    
+    def finish_search(self, voltage, power, current_time):
+        self.reference_power = power
+        self.prev_power = power
+        self.last_search = current_time
+        self.reversals = 0
+        return voltage
+
+class GlobalScanMPPT(GlobalMPPTAlgorithm):
+    # Periodic P-V scan: one probe per call across the range, then jump to the best point and track locally
+    def __init__(self, pv_model=None, scan_points=40, power_change=0.1, rescan_period=10.0):
+        super().__init__(pv_model, power_change, rescan_period)
+        self.scan_points = scan_points
+        self.queue = []
+        self.best = None
+    
+    def update(self, state, time_step, current_time):
+        voltage = state['voltage']
+        current, power = self.probe(state, voltage)
+        
+        if self.queue or self.best is not None:
+            if self.best is None or power > self.best[1]:
+                self.best = (voltage, power)
+            if self.queue:
+                return self.queue.pop(0)
+            best_voltage, best_power = self.best
+            self.best = None
+            return self.finish_search(best_voltage, best_power, current_time)
+        
+        if self.needs_search(state, voltage, power, current_time):
+            V_min, V_max = self.search_range(state)
+            self.queue = list(np.linspace(V_min, V_max, self.scan_points))
+            self.best = (voltage, power)
+            return self.queue.pop(0)
+        return np.clip(self.local_step(voltage, power), 100, 800)
+
+class ParticleSwarmMPPT(GlobalMPPTAlgorithm):
+    # Particle swarm over the voltage range; particles are probed one per call, the swarm moves once all are measured
+    def __init__(self, pv_model=None, particles=6, max_iterations=10, power_change=0.1, rescan_period=10.0, seed=0):
+        super().__init__(pv_model, power_change, rescan_period)
+        self.particles = particles
+        self.max_iterations = max_iterations
+        self.w, self.c1, self.c2 = 0.4, 1.2, 1.6  # Inertia, cognitive and social weights
+        self.rng = np.random.default_rng(seed)
+        self.positions = None
+        self.index = 0
+    
+    def initial_positions(self, state):
+        V_min, V_max = self.search_range(state)
+        return np.linspace(V_min, V_max, self.particles + 2)[1:-1]
+    
+    def start_search(self, state):
+        self.V_range = self.search_range(state)
+        self.positions = self.initial_positions(state)
+        self.velocities = np.zeros(self.particles)
+        self.fitness = np.zeros(self.particles)
+        self.personal_best = self.positions.copy()
+        self.personal_best_power = np.full(self.particles, -np.inf)
+        self.iteration = 0
+        self.index = 0
+        return self.positions[0]
+    
+    def update(self, state, time_step, current_time):
+        voltage = state['voltage']
+        current, power = self.probe(state, voltage)
+        
+        if self.positions is None:
+            if self.needs_search(state, voltage, power, current_time):
+                return self.start_search(state)
+            return np.clip(self.local_step(voltage, power), 100, 800)
+        
+        self.fitness[self.index] = power
+        self.index += 1
+        if self.index < self.particles:
+            return self.positions[self.index]
+        
+        # All particles measured: update bests and move the swarm
+        improved = self.fitness > self.personal_best_power
+        self.personal_best[improved] = self.positions[improved]
+        self.personal_best_power[improved] = self.fitness[improved]
+        k = int(np.argmax(self.personal_best_power))
+        global_best, global_best_power = self.personal_best[k], self.personal_best_power[k]
+        r1, r2 = self.rng.random(self.particles), self.rng.random(self.particles)
+        self.velocities = (self.w * self.velocities + self.c1 * r1 * (self.personal_best - self.positions) +
+                           self.c2 * r2 * (global_best - self.positions))
+        self.positions = np.clip(self.positions + self.velocities, *self.V_range)
+        self.iteration += 1
+        self.index = 0
+        
+        if self.iteration >= self.max_iterations or np.max(np.abs(self.positions - global_best)) < 1.0:
+            self.positions = None
+            return self.finish_search(global_best, global_best_power, current_time)
+        return self.positions[0]
+
+class HybridScanPSOMPPT(ParticleSwarmMPPT):
+    # Coarse scan of the P-V curve seeds the swarm at the most promising points (hybrid search).
+    # Seeds are re-probed from the evaluation cache, so the swarm starts without extra model calls.
+    def __init__(self, pv_model=None, particles=4, max_iterations=6, scan_points=12, power_change=0.1, rescan_period=10.0, seed=0):
+        super().__init__(pv_model, particles, max_iterations, power_change, rescan_period, seed)
+        self.scan_points = scan_points
+        self.scan = None
+        self.seeds = None
+    
+    def start_search(self, state):
+        V_min, V_max = self.search_range(state)
+        self.scan_voltages = np.linspace(V_min, V_max, self.scan_points)
+        self.scan = []
+        return self.scan_voltages[0]
+    
+    def update(self, state, time_step, current_time):
+        if self.scan is None:
+            return super().update(state, time_step, current_time)
+        self.scan.append(self.probe(state, state['voltage'])[1])
+        if len(self.scan) < self.scan_points:
+            return self.scan_voltages[len(self.scan)]
+        self.seeds = np.sort(self.scan_voltages[np.argsort(self.scan)[-self.particles:]])
+        self.scan = None
+        return super().start_search(state)
+    
+    def initial_positions(self, state):
+        return self.seeds
+
+GLOBAL_MPPT_TYPES = {
+    "Global Scan": GlobalScanMPPT,
+    "Particle Swarm": ParticleSwarmMPPT,
+    "Hybrid Scan+PSO": HybridScanPSOMPPT
+}
+
+def shaded_array_benchmark(mppt_types=None, duration=30.0, time_step=0.02, initial_voltage=400.0):
+    # Tracks a 13-module string through three shading patterns; returns energy ratio and cache statistics
+    from MaximaleLeistungspunktverfolgung import PerturbAndObserve
+    mppt_types = dict({"Perturb & Observe": PerturbAndObserve}, **(GLOBAL_MPPT_TYPES if mppt_types is None else mppt_types))
+    patterns = [np.full((1, 13), 1000.0), np.full((1, 13), 1000.0), np.full((1, 13), 1000.0)]
+    patterns[1][0, :4] = 300  # Global peak at low voltage
+    patterns[2][0, :9] = 400  # Global peak at high voltage
+    t = np.arange(0, duration, time_step)
+    pattern_index = np.minimum((t / (duration / len(patterns))).astype(int), len(patterns) - 1)
+    
+    results = []
+    for name, mppt_type in mppt_types.items():
+        array = PVArray()
+        mppt = mppt_type(array)
+        state = {'voltage': initial_voltage, 'temperature': 25}
+        energy, energy_mpp = 0.0, 0.0
+        for n in range(len(t)):
+            state['irradiance'] = patterns[pattern_index[n]]
+            state['voltage'] = float(np.clip(mppt.update(state, time_step, float(t[n])), 100, 800))
+            energy += max(array.power(state['voltage']), 0.0) * time_step
+            energy_mpp += array.mpp()[2] * time_step
+        cache = getattr(mppt, 'cache', None)
+        results.append({
+            'mppt': name,
+            'tracking_efficiency': energy / energy_mpp,
+            'cache_hit_rate': cache.hit_rate() if cache else np.nan,
+            'probes': cache.misses if cache else len(t)
+        })
+    return results
+
+if __name__ == '__main__':
+    print(f"{'MPPT':<20} {'Eff (%)':>8} {'Cache hits (%)':>15} {'Model evals':>12}")
+    for r in shaded_array_benchmark():
+        print(f"{r['mppt']:<20} {r['tracking_efficiency'] * 100:>8.2f} {r['cache_hit_rate'] * 100:>15.1f} {r['probes']:>12}")
\ No newline at end of file
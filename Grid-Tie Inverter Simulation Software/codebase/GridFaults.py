@@ -0,0 +1,30 @@
+import numpy as np
+
+# Fault types offered by GridSimulationWindow; "Unbalanced" is a sag of phase a only
+FAULT_TYPES = ["Normal", "Sag", "Swell", "Harmonics", "Freq Shift", "Unbalanced"]
+THREE_PHASE_ANGLES = [0, -2 * np.pi / 3, 2 * np.pi / 3]  # 0°, -120°, 120°
+
+def fault_frequency(frequency, fault_mode):
+    # Fundamental frequency seen on the grid during a fault
+    return frequency + 2 if fault_mode == "Freq Shift" else frequency
+
+def grid_fault_voltage(t, frequency, fault_mode="Normal", V_nom=230 * np.sqrt(2), phase_angles=None):
+    # Headless version of the GridSimulationWindow fault waveforms.
+    # Returns a 1-D array for single-phase or a (phases, samples) array when phase_angles is given.
+    t = np.asarray(t, dtype=float)
+    angles = np.zeros(1) if phase_angles is None else np.asarray(phase_angles, dtype=float)
+    freq = fault_frequency(frequency, fault_mode)
+    arg = 2 * np.pi * freq * t[np.newaxis, :] + angles[:, np.newaxis]
+    voltage = V_nom * np.sin(arg)
+    
+    if fault_mode == "Sag":
+        voltage *= 0.8
+    elif fault_mode == "Swell":
+        voltage *= 1.2
+    elif fault_mode == "Harmonics":
+        voltage += 0.05 * V_nom * np.sin(5 * arg) + 0.05 * V_nom * np.sin(7 * arg)
+    elif fault_mode == "Unbalanced":
+        # Single-line sag: only phase a drops to 70 %
+        voltage[0] *= 0.7
+    
+    return voltage[0] if phase_angles is None else voltage
\ No newline at end of file
@@ -3,6 +3,7 @@ from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPus
 from PyQt5.QtCore import QTimer, Qt
 from PyQt5.QtGui import QFont
 import numpy as np
+from GridFaults import FAULT_TYPES, fault_frequency, grid_fault_voltage
 
 class GridSimulationWindow(QMainWindow):
     def __init__(self, inverter_simulation):
@@ -63,7 +64,7 @@ class GridSimulationWindow(QMainWindow):
         
         self.fault_label = QLabel("Fault Type:")
         self.fault_combo = QComboBox()
-        self.fault_combo.addItems(["Normal", "Sag", "Swell", "Harmonics", "Freq Shift"])
+        self.fault_combo.addItems(FAULT_TYPES)
         self.fault_combo.currentTextChanged.connect(self.set_fault)
         
         self.weak_grid_button = QPushButton("Toggle Weak Grid")
@@ -91,36 +92,33 @@ class GridSimulationWindow(QMainWindow):
         self.weak_grid = not self.weak_grid
         self.R = 1.0 if self.weak_grid else 0.1
         self.L = 0.01 if self.weak_grid else 0.001
+        self.inverter_simulation.update_grid_impedance(self.R, self.L)
     
     def generate_grid_voltage(self):
         t = np.linspace(self.current_time, self.current_time + self.time_window, self.samples)
-        V_nom = 230 * np.sqrt(2)
-        freq = self.frequency
-        voltage = V_nom * np.sin(2 * np.pi * freq * t)
-        
+        fault_mode = self.fault_mode if self.fault_timer > 0 else "Normal"
+        freq = fault_frequency(self.frequency, fault_mode)
+        voltage = grid_fault_voltage(t, self.frequency, fault_mode)
         if self.fault_timer > 0:
-            if self.fault_mode == "Sag":
-                voltage *= 0.8
-            elif self.fault_mode == "Swell":
-                voltage *= 1.2
-            elif self.fault_mode == "Harmonics":
-                voltage += 0.05 * V_nom * np.sin(2 * np.pi * 5 * freq * t) + 0.05 * V_nom * np.sin(2 * np.pi * 7 * freq * t)
-            elif self.fault_mode == "Freq Shift":
-                freq += 2
-                voltage = V_nom * np.sin(2 * np.pi * freq * t)
             self.fault_timer -= self.time_step
         
-        # Apply impedance
-        I_load = 10  # Simplified load current
-        V_drop = self.R * I_load + self.L * 2 * np.pi * freq * I_load
-        voltage -= V_drop
+        # Source voltage for the inverter's filter plant, which holds the grid impedance
+        self.inverter_simulation.grid_voltage = voltage.copy()
+        
+        # Apply impedance: drop from the simulated grid current, or a simplified load without an output filter
+        drop = self.inverter_simulation.grid_impedance_voltage()
+        if drop is not None and len(drop) == len(voltage):
+            voltage += drop
+        else:
+            I_load = 10  # Simplified load current
+            V_drop = self.R * I_load + self.L * 2 * np.pi * freq * I_load
+            voltage -= V_drop
         
         return voltage
     
     def update_grid(self):
         voltage = self.generate_grid_voltage()
         self.voltage_curve.setData(np.linspace(0, self.time_window, self.samples), voltage)
-        self.inverter_simulation.grid_voltage = voltage
         self.current_time += self.time_window / 2
     
     def reset(self):
@@ -130,4 +128,5 @@ class GridSimulationWindow(QMainWindow):
         self.weak_grid = False
         self.R = 0.1
         self.L = 0.001
+        self.inverter_simulation.update_grid_impedance(self.R, self.L)
         self.fault_combo.setCurrentText("Normal")
\ No newline at end of file
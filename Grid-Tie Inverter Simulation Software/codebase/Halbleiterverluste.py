@@ -0,0 +1,271 @@
+import time
+import numpy as np
+from MehrstufigeWechselrichter import MultilevelInverter, MULTILEVEL_TYPES
+from Numerik import axis_weights, bilinear, rc_response
+from Wechselrichtertopologie import SinglePhaseTopology, ThreePhaseTopology
+
+# Electro-thermal loss model of the inverter semiconductors: conduction and switching losses from datasheet
+# tables, evaluated on the level changes of the PWM voltage, with Foster/Cauer thermal networks for the
+# junction temperatures that feed back into the tables. Everything works on whole windows (..., phases, samples).
+
+# Default device: 1200 V / 100 A IGBT module with anti-parallel diode, tables over (junction temperature, current)
+DEVICE_CURRENT_AXIS = np.array([0, 10, 25, 50, 75, 100, 150, 200], dtype=float)  # A
+DEVICE_TEMPERATURE_AXIS = np.array([25, 125, 150], dtype=float)  # °C
+DEVICE_V_CE = np.array([[0, 0.95, 1.20, 1.50, 1.70, 1.85, 2.20, 2.50],
+                        [0, 0.85, 1.20, 1.60, 1.90, 2.10, 2.55, 2.95],
+                        [0, 0.83, 1.20, 1.65, 1.95, 2.20, 2.65, 3.10]])  # V
+DEVICE_V_F = np.array([[0, 1.00, 1.30, 1.60, 1.80, 1.95, 2.20, 2.40],
+                       [0, 0.85, 1.15, 1.50, 1.75, 1.90, 2.20, 2.45],
+                       [0, 0.82, 1.12, 1.48, 1.72, 1.90, 2.20, 2.47]])  # V
+DEVICE_E_ON = np.array([[0, 0.6, 1.4, 3.0, 4.8, 6.8, 11.0, 16.0],
+                        [0, 1.0, 2.2, 4.5, 7.0, 9.8, 15.5, 22.0],
+                        [0, 1.1, 2.4, 4.9, 7.6, 10.6, 16.7, 23.8]]) * 1e-3  # J at V_ref
+DEVICE_E_OFF = np.array([[0, 0.9, 1.9, 3.6, 5.3, 7.0, 10.3, 13.5],
+                         [0, 1.3, 2.7, 5.0, 7.3, 9.5, 13.8, 18.0],
+                         [0, 1.4, 2.9, 5.3, 7.7, 10.1, 14.6, 19.1]]) * 1e-3  # J at V_ref
+DEVICE_E_RR = np.array([[0, 0.8, 1.4, 2.2, 2.8, 3.2, 3.8, 4.2],
+                        [0, 1.6, 2.8, 4.3, 5.3, 6.0, 7.0, 7.6],
+                        [0, 1.8, 3.1, 4.7, 5.8, 6.6, 7.7, 8.4]]) * 1e-3  # J at V_ref
+
+def cauer_to_foster(resistance, capacitance):
+    # Junction impedance of a Cauer ladder (node k -> k+1 through R_k, C_k to ambient, last R_k to ambient)
+    # as Foster terms R_k / (1 + s tau_k), from the eigenvalues of the symmetrized conductance matrix
+    R = np.asarray(resistance, dtype=float)
+    C = np.asarray(capacitance, dtype=float)
+    n = len(R)
+    G = np.zeros((n, n))
+    for k in range(n):
+        g = 1 / R[k]
+        G[k, k] += g
+        if k + 1 < n:
+            G[k + 1, k + 1] += g
+            G[k, k + 1] -= g
+            G[k + 1, k] -= g
+    scale = 1 / np.sqrt(C)
+    rates, vectors = np.linalg.eigh(scale[:, np.newaxis] * G * scale[np.newaxis, :])
+    return vectors[0] ** 2 / (C[0] * rates), 1 / rates
+
+class ThermalNetwork:
+    # Foster network, Z_th(t) = sum R_k (1 - exp(-t / tau_k)); each term is an exact first-order ZOH recurrence
+    def __init__(self, resistance, tau):
+        self.R = np.asarray(resistance, dtype=float)  # K/W
+        self.tau = np.asarray(tau, dtype=float)       # s
+        self.resistance = float(np.sum(self.R))       # Steady-state thermal resistance (K/W)
+    
+    @classmethod
+    def from_cauer(cls, resistance, capacitance):
+        return cls(*cauer_to_foster(resistance, capacitance))
+    
+    def response(self, power, time_step, state=None):
+        # Temperature rise for losses (..., samples) and the term states at the last sample
+        power = np.asarray(power, dtype=float)
+        if state is None:
+            state = np.zeros(power.shape[:-1] + (len(self.R),))
+        a = np.exp(-time_step / self.tau)[:, np.newaxis]
+        terms = rc_response(power[..., np.newaxis, :], a, (1 - a) * self.R[:, np.newaxis], state)
+        return np.sum(terms, axis=-2), terms[..., -1]
+
+class PowerDevice:
+    # One switch position: IGBT plus anti-parallel diode, datasheet tables and junction-to-case Foster networks
+    def __init__(self):
+        self.name = "1200 V / 100 A IGBT"
+        self.current_axis = DEVICE_CURRENT_AXIS
+        self.temperature_axis = DEVICE_TEMPERATURE_AXIS
+        self.V_ce = DEVICE_V_CE    # IGBT on-state voltage (V)
+        self.V_f = DEVICE_V_F      # Diode forward voltage (V)
+        self.E_on = DEVICE_E_ON    # IGBT turn-on energy (J)
+        self.E_off = DEVICE_E_OFF  # IGBT turn-off energy (J)
+        self.E_rr = DEVICE_E_RR    # Diode reverse-recovery energy (J)
+        self.V_ref = 600.0         # Test voltage of the switching energies (V)
+        self.K_v_switch = 1.3      # Switching energy ~ (V / V_ref)^K_v
+        self.K_v_diode = 0.6
+        self.switch_network = ThermalNetwork([0.02, 0.08, 0.12, 0.05], [5e-4, 5e-3, 0.05, 0.2])
+        self.diode_network = ThermalNetwork([0.04, 0.15, 0.20, 0.09], [5e-4, 5e-3, 0.05, 0.2])
+    
+    def lookup(self, table, temperature, current):
+        # Bilinear in (junction temperature, current) for broadcastable arrays
+        return bilinear(table, axis_weights(self.temperature_axis, temperature) + axis_weights(self.current_axis, np.abs(current)))
+    
+    def switching_energy(self, table, temperature, current, voltage, K_v):
+        return self.lookup(table, temperature, current) * (np.abs(voltage) / self.V_ref) ** K_v
+
+class ElectroThermalModel:
+    def __init__(self, device=None, ambient_temperature=40.0, heatsink=None):
+        self.device = device if device is not None else PowerDevice()
+        self.ambient_temperature = ambient_temperature  # °C
+        # Heatsink shared by all devices, given as a Cauer ladder (case-to-sink, sink, sink-to-air)
+        self.heatsink = heatsink if heatsink is not None else ThermalNetwork.from_cauer([0.02, 0.06, 0.12], [50.0, 800.0, 2500.0])
+        self.reset()
+    
+    def parameters(self):
+        # Static description of the model, without the junction temperatures and network states of the last window
+        return {'device': self.device, 'ambient_temperature': self.ambient_temperature, 'heatsink': self.heatsink}
+    
+    def reset(self):
+        self.T_switch = None  # Junction temperatures at the end of the last window (°C), per phase
+        self.T_diode = None
+        self.switch_state = None
+        self.diode_state = None
+        self.heatsink_state = None
+    
+    def losses(self, voltage, current, time_step, T_switch, T_diode, conduction_devices=1, level_step=None):
+        # Instantaneous switch and diode losses of each phase (..., phases, samples) at the given junction temperatures.
+        # conduction_devices: devices in series in the current path; level_step: voltage of one commutation (V),
+        # so a jump over several levels counts several commutations. None treats every change as one commutation.
+        v, i = np.broadcast_arrays(np.asarray(voltage, dtype=float), np.asarray(current, dtype=float))
+        device = self.device
+        T_s = np.asarray(T_switch, dtype=float)[..., np.newaxis]
+        T_d = np.asarray(T_diode, dtype=float)[..., np.newaxis]
+        
+        # Switches carry the current while the leg delivers power, the diodes while it freewheels
+        p = v * i
+        switch_share = np.where(p > 0, 1.0, np.where(p < 0, 0.0, 0.5))
+        magnitude = np.abs(i)
+        conduction_switch = conduction_devices * switch_share * magnitude * device.lookup(device.V_ce, T_s, magnitude)
+        conduction_diode = conduction_devices * (1 - switch_share) * magnitude * device.lookup(device.V_f, T_d, magnitude)
+        
+        # Every level change commutates the current between a switch and a diode. A step in the direction of the
+        # current turns a switch on (diode recovers), a step against it turns a switch off.
+        step = np.diff(v, axis=-1)
+        i_event = i[..., 1:]
+        if level_step:
+            commutations = np.round(np.abs(step) / level_step)
+            V_event = level_step
+        else:
+            commutations = (step != 0).astype(float)
+            V_event = step
+        turn_on = np.sign(step) == np.sign(i_event)
+        E_on = device.switching_energy(device.E_on, T_s, i_event, V_event, device.K_v_switch)
+        E_off = device.switching_energy(device.E_off, T_s, i_event, V_event, device.K_v_switch)
+        E_rr = device.switching_energy(device.E_rr, T_d, i_event, V_event, device.K_v_diode)
+        switching_switch = np.zeros_like(v)
+        switching_diode = np.zeros_like(v)
+        switching_switch[..., 1:] = commutations * np.where(turn_on, E_on, E_off) / time_step
+        switching_diode[..., 1:] = commutations * np.where(turn_on, E_rr, 0.0) / time_step
+        
+        return {
+            'conduction_switch': conduction_switch,
+            'conduction_diode': conduction_diode,
+            'switching_switch': switching_switch,
+            'switching_diode': switching_diode,
+            'switch': conduction_switch + switching_switch,
+            'diode': conduction_diode + switching_diode,
+            'switching_events': np.sum(commutations, axis=-1)
+        }
+    
+    def simulate(self, voltage, current, time_step, conduction_devices=1, level_step=None):
+        # One simulation window. Junction temperatures at the end of the previous window set the loss tables,
+        # the thermal networks carry their states from window to window.
+        v, i = np.broadcast_arrays(np.asarray(voltage, dtype=float), np.asarray(current, dtype=float))
+        shape = v.shape[:-1]
+        if self.T_switch is None or np.shape(self.T_switch) != shape:
+            self.reset()
+            self.T_switch = np.full(shape, self.ambient_temperature)
+            self.T_diode = np.full(shape, self.ambient_temperature)
+        losses = self.losses(v, i, time_step, self.T_switch, self.T_diode, conduction_devices, level_step)
+        
+        rise_switch, self.switch_state = self.device.switch_network.response(losses['switch'] / conduction_devices, time_step, self.switch_state)
+        rise_diode, self.diode_state = self.device.diode_network.response(losses['diode'] / conduction_devices, time_step, self.diode_state)
+        total = np.sum(losses['switch'] + losses['diode'], axis=-2)
+        rise_heatsink, self.heatsink_state = self.heatsink.response(total, time_step, self.heatsink_state)
+        T_heatsink = self.ambient_temperature + rise_heatsink
+        T_switch = T_heatsink[..., np.newaxis, :] + rise_switch
+        T_diode = T_heatsink[..., np.newaxis, :] + rise_diode
+        self.T_switch = T_switch[..., -1]
+        self.T_diode = T_diode[..., -1]
+        
+        losses.update({'T_switch': T_switch, 'T_diode': T_diode, 'T_heatsink': T_heatsink, 'total': total})
+        return losses
+    
+    def steady_state(self, voltage, current, time_step, conduction_devices=1, level_step=None, iterations=20, tolerance=0.05):
+        # Periodic operation over one fundamental period: mean losses at the mean junction temperatures they cause,
+        # found by fixed-point iteration (converges in a few steps unless the device runs away thermally)
+        v, i = np.broadcast_arrays(np.asarray(voltage, dtype=float), np.asarray(current, dtype=float))
+        T_switch = np.full(v.shape[:-1], self.ambient_temperature)
+        T_diode = T_switch.copy()
+        for iteration in range(iterations):
+            losses = self.losses(v, i, time_step, T_switch, T_diode, conduction_devices, level_step)
+            P_switch = np.mean(losses['switch'], axis=-1)
+            P_diode = np.mean(losses['diode'], axis=-1)
+            T_heatsink = self.ambient_temperature + self.heatsink.resistance * np.sum(P_switch + P_diode, axis=-1, keepdims=True)
+            T_switch_new = T_heatsink + self.device.switch_network.resistance * P_switch / conduction_devices
+            T_diode_new = T_heatsink + self.device.diode_network.resistance * P_diode / conduction_devices
+            change = max(np.max(np.abs(T_switch_new - T_switch)), np.max(np.abs(T_diode_new - T_diode)))
+            T_switch, T_diode = T_switch_new, T_diode_new
+            if change < tolerance:
+                break
+        
+        return {
+            'conduction_loss': np.sum(np.mean(losses['conduction_switch'] + losses['conduction_diode'], axis=-1), axis=-1),
+            'switching_loss': np.sum(np.mean(losses['switching_switch'] + losses['switching_diode'], axis=-1), axis=-1),
+            'total_loss': np.sum(P_switch + P_diode, axis=-1),
+            'switching_events': np.sum(losses['switching_events'], axis=-1),
+            'T_switch': T_switch,
+            'T_diode': T_diode,
+            'T_heatsink': T_heatsink[..., 0],
+            'iterations': iteration + 1
+        }
+
+def topology_waveforms(topology_name, dc_voltage, frequency=50, phases=3, samples=10000, pwm_technique="Phase Disposition", V_grid=230,
+                       switching_frequency=10000):
+    # One fundamental period of the multilevel PWM voltage (phases, samples) at the grid voltage.
+    # Sampled from the switching events, so the grid only has to resolve the narrowest pulses of interest.
+    # "None" is the two-level bridge, as in InverterSimulation.
+    period = 1 / frequency
+    time_step = period / samples
+    if topology_name == "None":
+        inverter = MultilevelInverter(dc_voltage, frequency, 1.0, period, time_step, levels=2)
+    else:
+        inverter = MULTILEVEL_TYPES[topology_name](dc_voltage, frequency, 1.0, period, time_step)
+    inverter.switching_frequency = switching_frequency
+    phase_topology = (ThreePhaseTopology if phases == 3 else SinglePhaseTopology)(dc_voltage, frequency, 1.0, period, time_step)
+    inverter.generate_waveforms(0.0, phase_topology, pwm_technique)
+    levels = inverter.events.levels
+    # Modulation index for the grid peak on the topology's own output range (linear range 2/sqrt(3) with SVPWM)
+    linear_limit = 2 / np.sqrt(3) if pwm_technique == "Space Vector" and phases == 3 else 1.0
+    inverter.update_parameters(dc_voltage, frequency, min(linear_limit, np.sqrt(2) * V_grid / levels[-1]))
+    data = inverter.generate_waveforms(0.0, phase_topology, pwm_technique)
+    voltage = np.array(data['voltage'])
+    level_step = np.min(np.diff(levels))
+    return data['time'], voltage, data['time'][1] - data['time'][0], inverter.levels - 1, level_step
+
+def efficiency_map(topology_name, powers=None, dc_voltages=None, frequency=50, phases=3, power_factor=1.0, V_grid=230,
+                   samples=10000, pwm_technique="Phase Disposition", switching_frequency=10000, model=None):
+    # Steady-state semiconductor efficiency over (dc_voltage, power); all powers are evaluated in one batch
+    model = model if model is not None else ElectroThermalModel()
+    powers = np.linspace(500, 10000, 20) if powers is None else np.asarray(powers, dtype=float)
+    dc_voltages = np.linspace(350, 800, 10) if dc_voltages is None else np.asarray(dc_voltages, dtype=float)
+    phase_angles = np.array([0, -2 * np.pi / 3, 2 * np.pi / 3])[:phases]
+    I_peak = np.sqrt(2) * powers / (phases * V_grid * power_factor)
+    
+    result = {name: np.zeros((len(dc_voltages), len(powers))) for name in
+              ['efficiency', 'total_loss', 'conduction_loss', 'switching_loss', 'switching_events', 'T_switch', 'T_diode']}
+    for k, dc_voltage in enumerate(dc_voltages):
+        t, voltage, time_step, conduction_devices, level_step = topology_waveforms(topology_name, dc_voltage, frequency, phases, samples,
+                                                                                   pwm_technique, V_grid, switching_frequency)
+        angle = 2 * np.pi * frequency * t + phase_angles[:, np.newaxis] - np.arccos(power_factor)
+        current = I_peak[:, np.newaxis, np.newaxis] * np.sin(angle)
+        point = model.steady_state(voltage, current, time_step, conduction_devices, level_step)
+        result['efficiency'][k] = powers / (powers + point['total_loss'])
+        for name in ['total_loss', 'conduction_loss', 'switching_loss', 'switching_events']:
+            result[name][k] = point[name]
+        result['T_switch'][k] = np.max(point['T_switch'], axis=-1)
+        result['T_diode'][k] = np.max(point['T_diode'], axis=-1)
+    result.update({'power': powers, 'dc_voltage': dc_voltages})
+    return result
+
+def efficiency_maps(topologies=None, **kwargs):
+    topologies = list(MULTILEVEL_TYPES) if topologies is None else topologies
+    return {name: efficiency_map(name, **kwargs) for name in topologies}
+
+if __name__ == '__main__':
+    powers = np.array([1000, 2500, 5000, 7500, 10000])
+    dc_voltages = np.array([400, 600, 800])
+    print(f"{'Topology':<22} {'V_dc':>5} " + " ".join(f"{p / 1000:>6.1f}kW" for p in powers) + f" {'Tj max':>7} {'ms':>5}")
+    for name in MULTILEVEL_TYPES:
+        start = time.perf_counter()
+        result = efficiency_map(name, powers, dc_voltages)
+        elapsed = (time.perf_counter() - start) * 1e3
+        for k, dc_voltage in enumerate(dc_voltages):
+            print(f"{name:<22} {dc_voltage:>5.0f} " + " ".join(f"{e * 100:>7.2f}%" for e in result['efficiency'][k]) +
+                  f" {np.max(result['T_switch'][k]):>6.1f}C {elapsed:>5.0f}")
\ No newline at end of file
@@ -3,9 +3,13 @@ from MehrstufigeWechselrichter import NPCInverter, FlyingCapacitorInverter, Casc
 from TransformatorlosUndTransformatorbasiert import TransformerlessDesign, TransformerBasedDesign
 from MaximaleLeistungspunktverfolgung import PerturbAndObserve, IncrementalConductance, ConstantVoltage, ConstantCurrent
 from Welligkeitskorrelationssteuerung import RippleCorrelationControl
-from Phasenregelkreis import PLL
+from GlobaleLeistungspunktverfolgung import GLOBAL_MPPT_TYPES
+from Phasenregelkreis import PLL, PLL_TYPES
 from IslandingDetection import IslandingDetector
 from DCSource import DCSource, PVPanel, Battery, FuelCell, HybridSource
+from EnvironmentProfile import EnvironmentProfile
+from Ausgangsfilter import FILTER_TYPES, LFilter
+from Stromregelung import DQCurrentController, PredictiveCurrentController, ProportionalResonantController
 import numpy as np
 
 class InverterSimulation:
@@ -19,13 +23,27 @@ class InverterSimulation:
         self.samples = int(self.time_window / self.time_step)
         self.phase_topology = SinglePhaseTopology(self.dc_voltage, self.frequency, self.mod_index, self.time_window, self.time_step)
         self.multilevel_topology = None
-        self.pwm_technique = "Multicarrier"
+        self.pwm_technique = "Phase Disposition"
+        self.switching_frequency = 10000  # PWM carrier frequency (Hz)
         self.design = TransformerlessDesign()
+        self.output_filter = None  # State-space output filter and grid impedance, None: ideal coupling
+        self.grid_impedance = (0.1, 1e-3)  # R (Ohm), L (H)
+        self.grid_voltage = None  # Grid source voltage behind the impedance, set by the grid window
+        self.filter_results = None
+        self.switching_record = None  # Switching events of the last window, joined with the next for the harmonic analysis
+        self.control_plant = LFilter(*self.grid_impedance)  # Averaged inverter into the grid when no output filter is set
+        self.current_controller = DQCurrentController()  # Three-phase PI in the dq frame
+        self.predictive_controller = PredictiveCurrentController()  # Finite-control-set MPC
+        self.resonant_controller = ProportionalResonantController(0.5, 20)  # PR current control in the stationary frame
+        self.harmonic_compensation = False  # 3rd/5th/7th/11th harmonic resonators in the PR controller
+        self.current_reference = (10.0, 0.0)  # i_d (active), i_q (reactive) in A
+        self.voltage_headroom = 0.9  # Share of the inverter's peak voltage the steady-state current reference may use
         self.mppt = None
         self.control = "PI"
         self.islanding_enabled = True
         self.dc_source = DCSource()  # Default DC source
         self.dc_source_type = "Fixed"
+        self.profile = None  # Recorded irradiance/temperature/load playback, overrides the panel values
         self.mppt_state = {'voltage': self.dc_voltage, 'power': 0, 'current': 0}
         self.control_state = {
             'integral_error_i': 0,
@@ -34,9 +52,11 @@ class InverterSimulation:
             'prev_error_v': 0,
             'sliding_surface': 0,
             'prev_sliding_surface': 0,
-            'mpc_horizon': 10
+            'mpc_horizon': 4
         }
+        self.pll_type = "SOGI-PLL"
         self.pll = PLL(self.frequency)
+        self.pll_record = None  # Sample times and PLL angles of the last window
         self.islanding_detector = IslandingDetector(self.frequency)
     
     def update_simulation_parameters(self, params):
@@ -44,6 +64,7 @@ class InverterSimulation:
         self.mod_index = params['mod_index']
         if self.dc_source_type == "Fixed":
             self.dc_voltage = params['dc_voltage']
+            self.dc_source.voltage = self.dc_voltage
         self.mppt_state['voltage'] = self.dc_voltage
         self.phase_topology.update_parameters(self.dc_voltage, self.frequency, self.mod_index)
         if self.multilevel_topology:
@@ -65,6 +86,10 @@ class InverterSimulation:
             self.dc_source = HybridSource()
         self.dc_voltage = self.dc_source.voltage
     
+    def load_profile(self, path, speed=1.0, offset=0.0, loop=False):
+        self.profile = EnvironmentProfile(path, speed, offset, loop) if path else None
+        self.current_time = 0
+    
     def update_phase_topology(self, topology_name):
         self.phase_topology = SinglePhaseTopology(self.dc_voltage, self.frequency, self.mod_index, self.time_window, self.time_step) if topology_name == "Single-Phase" else ThreePhaseTopology(self.dc_voltage, self.frequency, self.mod_index, self.time_window, self.time_step)
         self.current_time = 0
@@ -84,16 +109,39 @@ class InverterSimulation:
             self.multilevel_topology = ReducedSwitchCountInverter(self.dc_voltage, self.frequency, self.mod_index, self.time_window, self.time_step)
         elif topology_name == "Hybrid CHB+NPC":
             self.multilevel_topology = HybridCHBPlusNPCInverter(self.dc_voltage, self.frequency, self.mod_index, self.time_window, self.time_step)
+        if self.multilevel_topology:
+            self.multilevel_topology.switching_frequency = self.switching_frequency
         self.current_time = 0
     
     def update_pwm_technique(self, pwm_technique):
         self.pwm_technique = pwm_technique
         self.current_time = 0
     
+    def update_switching_frequency(self, switching_frequency):
+        self.switching_frequency = switching_frequency
+        if self.multilevel_topology:
+            self.multilevel_topology.switching_frequency = switching_frequency
+    
     def update_design(self, design_name):
         self.design = TransformerlessDesign() if design_name == "Transformerless" else TransformerBasedDesign()
         self.current_time = 0
     
+    def update_output_filter(self, filter_name):
+        self.output_filter = FILTER_TYPES[filter_name](*self.grid_impedance) if filter_name in FILTER_TYPES else None
+        self.filter_results = None
+        self.current_time = 0
+    
+    def update_grid_impedance(self, R, L):
+        self.grid_impedance = (R, L)
+        self.control_plant.update_grid_impedance(R, L)
+        if self.output_filter:
+            self.output_filter.update_grid_impedance(R, L)
+    
+    def grid_impedance_voltage(self):
+        # Voltage across the grid impedance in the last window (phase a). None when no plant model ran in that
+        # window: open-loop control without an output filter, or islanded.
+        return self.filter_results['impedance_voltage'][0] if self.filter_results is not None else None
+    
     def update_mppt(self, mppt_name):
         if mppt_name == "None":
             self.mppt = None
@@ -107,20 +155,34 @@ class InverterSimulation:
             self.mppt = ConstantCurrent()
         elif mppt_name == "Ripple Correlation Control":
             self.mppt = RippleCorrelationControl()
+        elif mppt_name in GLOBAL_MPPT_TYPES:
+            self.mppt = GLOBAL_MPPT_TYPES[mppt_name]()
+        self.current_time = 0
+    
+    def update_pll(self, pll_name):
+        self.pll_type = pll_name
+        self.pll = PLL_TYPES[pll_name](self.frequency)
+        self.pll_record = None
         self.current_time = 0
     
     def update_control(self, control_name):
         self.control = control_name
+        self.filter_results = None
         self.current_time = 0
     
+    def update_harmonic_compensation(self, enabled):
+        self.harmonic_compensation = enabled
+        self.resonant_controller.harmonics = enabled
+    
     def update_islanding_detection(self, enabled):
         self.islanding_enabled = enabled
         self.current_time = 0
     
-    def apply_control(self, data, phase_angle):
+    def apply_control(self, data, theta):
         V_grid = 230 * np.sqrt(2)
         I_ref = 10
         phases = [0, 2*np.pi/3, 4*np.pi/3] if len(data['voltage']) == 3 else [0]
+        phase_angle = theta - data['time'] * 2 * np.pi * self.frequency  # PLL angle relative to the nominal grid
         output = {'time': data['time'], 'voltage': [], 'current': []}
         
         for i in range(len(data['voltage'])):
@@ -141,14 +203,6 @@ class InverterSimulation:
                     V_out[j] = data['voltage'][i][j] + Kp_v * error_v + Ki_v * self.control_state['integral_error_v']
                     I_out[j] = data['current'][i][j] + Kp_i * error_i + Ki_i * self.control_state['integral_error_i']
                 
-                elif self.control == "PR":
-                    Kp_v, Kr_v, w0 = 0.5, 50, 2*np.pi*self.frequency
-                    Kp_i, Kr_i = 0.2, 20
-                    resonant_v = Kr_v * np.sin(data['time'][j] * 2 * np.pi * self.frequency + phase_angle + phases[i]) * error_v
-                    resonant_i = Kr_i * np.sin(data['time'][j] * 2 * np.pi * self.frequency + phase_angle + phases[i]) * error_i
-                    V_out[j] = data['voltage'][i][j] + Kp_v * error_v + resonant_v
-                    I_out[j] = data['current'][i][j] + Kp_i * error_i + resonant_i
-                
                 elif self.control == "Sliding Mode":
                     lambda_v, lambda_i = 100, 50
                     K_v, K_i = 10, 5
@@ -158,24 +212,119 @@ class InverterSimulation:
                     I_out[j] = data['current'][i][j] + K_i * np.sign(s_i)
                     self.control_state['prev_error_v'] = error_v
                     self.control_state['prev_error_i'] = error_i
-                
-                elif self.control == "MPC":
-                    R = 0.1
-                    L = 0.01
-                    V_pred = data['voltage'][i][j] + (self.time_step / L) * (V_ref[j] - data['voltage'][i][j] - R * data['current'][i][j])
-                    I_pred = data['current'][i][j] + (self.time_step / L) * (V_pred - V_ref[j])
-                    cost = (V_ref[j] - V_pred)**2 + (I_ref_i[j] - I_pred)**2
-                    V_out[j] = V_pred if cost < 2 else data['voltage'][i][j]
-                    I_out[j] = I_pred if cost < 2 else data['current'][i][j]
             
             output['voltage'].append(V_out)
             output['current'].append(I_out)
         
         return output
     
+    def apply_resonant_control(self, data, theta):
+        # PR current control of all phases in the stationary frame, closed around the output filter (or the grid impedance alone)
+        plant = self.output_filter if self.output_filter else self.control_plant
+        time = data['time']
+        phases = len(data['voltage'])
+        omega = getattr(self.pll, 'omega', 2 * np.pi * self.frequency)
+        if phases == 3:
+            peak = self.multilevel_topology.peak if self.multilevel_topology else 0.5
+            v_max = 2 / np.sqrt(3) * peak * self.dc_voltage  # With zero-sequence injection, as for the dq controller
+        else:
+            v_max = self.multilevel_topology.level_voltages()[-1] if self.multilevel_topology else self.dc_voltage  # Full bridge
+        v_grid = self.grid_source(time, phases)
+        limit = self.current_limit(plant, v_grid, v_max)
+        if limit == 0:
+            self.resonant_controller.reset()
+            return self.blocked_output(plant, time, v_grid)
+        reference = (limit * self.current_reference[0], limit * self.current_reference[1])
+        self.filter_results = self.resonant_controller.run(plant, time, theta, omega, reference, v_grid, v_max)
+        return {'time': time, 'voltage': list(self.filter_results['pcc_voltage']), 'current': list(self.filter_results['grid_current']),
+                'current_limit': limit}
+    
+    def apply_current_control(self, data, theta):
+        # Three-phase PI in the dq frame, closed around the output filter (or the grid impedance alone)
+        plant = self.output_filter if self.output_filter else self.control_plant
+        time = data['time']
+        omega = getattr(self.pll, 'omega', 2 * np.pi * self.frequency)
+        # Peak phase voltage with zero-sequence injection: 2/sqrt(3) of the leg's half range
+        peak = self.multilevel_topology.peak if self.multilevel_topology else 0.5
+        v_max = 2 / np.sqrt(3) * peak * self.dc_voltage
+        v_grid = self.grid_source(time, 3)
+        limit = self.current_limit(plant, v_grid, v_max)
+        if limit == 0:
+            self.current_controller.reset()
+            return self.blocked_output(plant, time, v_grid)
+        reference = (limit * self.current_reference[0], limit * self.current_reference[1])
+        self.filter_results = self.current_controller.run(plant, time, theta, omega, reference, v_grid, v_max)
+        return {'time': time, 'voltage': list(self.filter_results['pcc_voltage']), 'current': list(self.filter_results['grid_current']),
+                'current_limit': limit}
+    
+    def apply_predictive_control(self, data, theta):
+        # Finite-control-set MPC over the topology's levels, closed around the output filter (or the grid impedance alone)
+        plant = self.output_filter if self.output_filter else self.control_plant
+        time = data['time']
+        phases = len(data['voltage'])
+        omega = getattr(self.pll, 'omega', 2 * np.pi * self.frequency)
+        if self.multilevel_topology:
+            levels = self.multilevel_topology.level_voltages()
+        else:
+            levels = self.dc_voltage * (np.array([-0.5, 0.5]) if phases == 3 else np.array([-1.0, 0.0, 1.0]))  # Two-level legs or full bridge
+        self.predictive_controller.horizon = self.control_state['mpc_horizon']
+        switching_frequency = self.multilevel_topology.switching_frequency if self.multilevel_topology else self.switching_frequency
+        # Peak phase voltage the levels reach: circle inside the voltage hexagon, or the highest level of one leg
+        v_max = (levels[-1] - levels[0]) / np.sqrt(3) if phases == 3 else levels[-1]
+        v_grid = self.grid_source(time, phases)
+        limit = self.current_limit(plant, v_grid, v_max)
+        if limit == 0:
+            self.predictive_controller.reset()
+            return self.blocked_output(plant, time, v_grid)
+        reference = (limit * self.current_reference[0], limit * self.current_reference[1])
+        self.filter_results = self.predictive_controller.run(plant, time, theta, omega, reference, v_grid, levels,
+                                                             1 / switching_frequency)  # One decision per carrier period
+        return {'time': time, 'voltage': list(self.filter_results['pcc_voltage']), 'current': list(self.filter_results['grid_current']),
+                'current_limit': limit}
+    
+    def current_limit(self, plant, v_grid, v_max):
+        # Share of the current reference the dc link can drive. In steady state the inverter voltage is
+        # v_grid + (R + j omega L) i in the dq frame (grid on the d axis) and has to stay inside the headroom of v_max.
+        # 0 when the dc link cannot even hold the grid voltage: the inverter has to block.
+        R, L = plant.series_impedance()
+        omega = 2 * np.pi * self.frequency
+        V = np.sqrt(2 * np.mean(v_grid ** 2))  # Grid peak phase voltage
+        limit = self.voltage_headroom * v_max
+        if V >= limit:
+            return 0.0
+        i_d, i_q = self.current_reference
+        a = np.array([V, 0.0])
+        b = np.array([R * i_d - omega * L * i_q, R * i_q + omega * L * i_d])
+        bb = b @ b
+        if bb == 0:
+            return 1.0
+        ab = a @ b
+        return float(min(1.0, (-ab + np.sqrt(ab ** 2 - bb * (V ** 2 - limit ** 2))) / bb))
+    
+    def blocked_output(self, plant, time, v_grid):
+        # Gates blocked: no current, the point of common coupling sits at the grid voltage
+        plant.reset()
+        return {'time': time, 'voltage': list(v_grid), 'current': list(np.zeros_like(v_grid)), 'current_limit': 0.0}
+    
+    def grid_source(self, time, phases):
+        # Grid voltage behind the impedance (phases, samples): the grid window's voltage if it fits, else the ideal grid
+        phase_angles = np.array([0] if phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3])[:, np.newaxis]
+        v_grid = 230 * np.sqrt(2) * np.sin(2 * np.pi * self.frequency * time + phase_angles)
+        grid = self.grid_voltage
+        if grid is not None and np.shape(grid)[-1] == len(time) and (np.ndim(grid) == 2 or phases == 1):
+            v_grid = np.broadcast_to(grid, v_grid.shape)
+        return v_grid
+    
+    def apply_output_filter(self, data):
+        # Inverter voltage through the filter and grid impedance: PCC voltage and grid current instead of the ideal outputs
+        v_inverter = np.array(data['voltage'])
+        self.filter_results = self.output_filter.simulate(data['time'], v_inverter, self.grid_source(data['time'], len(v_inverter)))
+        return {'time': data['time'], 'voltage': list(self.filter_results['pcc_voltage']), 'current': list(self.filter_results['grid_current'])}
+    
     def generate_waveforms(self, grid_voltage=None):
+        self.filter_results = None  # Only the path that runs a plant model in this window sets it
         if self.islanding_enabled:
-            if self.islanding_detector.detect(grid_voltage, self.time_step):
+            if self.islanding_detector.detect(grid_voltage, self.time_step, self.current_time):
                 num_phases = 3 if isinstance(self.phase_topology, ThreePhaseTopology) else 1
                 return {
                     'time': np.linspace(self.current_time, self.current_time + self.time_window, self.samples),
@@ -183,6 +332,9 @@ class InverterSimulation:
                     'current': [np.zeros(self.samples) for _ in range(num_phases)]
                 }
         
+        if self.profile is not None:
+            self.mppt_state.update(self.profile.sample(self.current_time))
+        
         # Update DC voltage from DC source
         self.dc_voltage = self.dc_source.update({
             'irradiance': self.mppt_state.get('irradiance', 1000),
@@ -198,21 +350,73 @@ class InverterSimulation:
             if self.multilevel_topology:
                 self.multilevel_topology.update_parameters(self.dc_voltage, self.frequency, self.mod_index)
         
-        grid_voltage_sample = grid_voltage[0] if grid_voltage is not None else 230 * np.sqrt(2) * np.sin(2 * np.pi * self.frequency * self.current_time)
-        phase_angle = self.pll.update(grid_voltage_sample, self.time_step)
-        
         if self.multilevel_topology:
             data = self.multilevel_topology.generate_waveforms(self.current_time, self.phase_topology, self.pwm_technique)
         else:
             data = self.phase_topology.generate_waveforms(self.current_time)
+        theta = self.track_grid_phase(data['time'])
         
-        data = self.apply_control(data, phase_angle)
+        if self.control == "PI" and len(data['voltage']) == 3:
+            data = self.apply_current_control(data, theta)
+        elif self.control == "MPC":
+            data = self.apply_predictive_control(data, theta)
+        elif self.control == "PR":
+            data = self.apply_resonant_control(data, theta)
+        else:
+            data = self.apply_control(data, theta)
+            if self.output_filter:
+                data = self.apply_output_filter(data)
         
         data = self.design.apply_design(data, self.dc_voltage, self.frequency, self.time_step)
+        self.analyse_harmonics(data)
         
         self.current_time += self.time_window / 2
         return data
     
+    def track_grid_phase(self, time):
+        # Runs the PLL over the samples of the window it has not seen yet, with their actual spacing, on the grid
+        # source voltage (all three phases for three-phase PLLs). Returns its angle for every sample of the window;
+        # the overlap with the last window comes from the recorded angles. A window that starts earlier than the
+        # recorded one (restarted simulation) restarts the PLL as well.
+        record = self.pll_record
+        if record is not None and time[0] < record['time'][0]:
+            self.pll.reset()
+            record = None
+        start = np.searchsorted(time, record['time'][-1], side='right') if record is not None else 0
+        theta = np.empty(len(time))
+        if record is not None:
+            theta[:start] = np.interp(time[:start], record['time'], record['angle'])
+            previous = record['time'][-1]
+        else:
+            previous = time[0] - self.time_step
+        steps = np.diff(time[start:], prepend=previous).tolist()
+        v_grid = self.grid_source(time[start:], self.pll.phases).T.tolist()  # Python floats for the per-sample loop
+        for k, (v, dt) in enumerate(zip(v_grid, steps), start):
+            theta[k] = self.pll.update(v if self.pll.phases == 3 else v[0], dt)
+        theta = np.unwrap(theta)
+        self.pll_record = {'time': time, 'angle': theta}
+        return theta
+    
+    def analyse_harmonics(self, data):
+        # THD and RMS of the switched leg voltages over the whole fundamental periods of the last two windows,
+        # exact from the switching events (multilevel topologies; windows at another dc voltage are not joined)
+        events = self.multilevel_topology.events if self.multilevel_topology else None
+        if events is None:
+            self.switching_record = None
+            return
+        record = self.switching_record
+        if record is not None and np.array_equal(record.levels, events.levels) and record.t_start <= events.t_start <= record.t_end:
+            record = record.append(events)
+        else:
+            record = events
+        self.switching_record = events
+        period = 1 / self.frequency
+        periods = int((record.t_end - record.t_start) / period + 1e-9)
+        if periods > 0:
+            t0 = record.t_end - periods * period
+            data['voltage_thd'] = record.thd(self.frequency, None, t0, record.t_end)
+            data['voltage_rms'] = record.rms(t0, record.t_end)
+    
     def reset(self):
         self.current_time = 0
         self.dc_source.reset()
@@ -225,10 +429,19 @@ class InverterSimulation:
             'prev_error_v': 0,
             'sliding_surface': 0,
             'prev_sliding_surface': 0,
-            'mpc_horizon': 10
+            'mpc_horizon': 4
         }
+        self.current_controller.reset()
+        self.predictive_controller.reset()
+        self.resonant_controller.reset()
+        self.control_plant.reset()
         self.pll.reset()
+        self.pll_record = None
         self.islanding_detector.reset()
         self.phase_topology.reset()
         if self.multilevel_topology:
-            self.multilevel_topology.reset()
\ No newline at end of file
+            self.multilevel_topology.reset()
+        if self.output_filter:
+            self.output_filter.reset()
+        self.filter_results = None
+        self.switching_record = None
\ No newline at end of file
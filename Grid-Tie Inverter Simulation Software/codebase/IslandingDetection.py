@@ -1,5 +1,86 @@
 import numpy as np
 
+class FrequencyEstimator:
+    # Streaming zero-crossing frequency/RoCoF estimator. Rising crossings are interpolated linearly,
+    # state carries across windows, and overlapping samples from the half-window stride are skipped.
+    def __init__(self, frequency, averaging_periods=2, rocof_periods=5):
+        self.f_nom = frequency
+        self.averaging_periods = averaging_periods  # Periods averaged per frequency estimate
+        self.rocof_periods = rocof_periods  # Span of frequency estimates used for the RoCoF slope
+        self.reset()
+    
+    def update_parameters(self, frequency):
+        self.f_nom = frequency
+    
+    def update(self, voltage, time_step, start_time=None):
+        voltage = np.asarray(voltage, dtype=float)
+        if start_time is None:
+            start_time = self.last_time + time_step if self.last_time is not None else 0.0
+        elif self.window_start is not None and start_time < self.window_start:
+            self.reset()  # Time went backwards: simulation was reset
+        self.window_start = start_time
+        times = start_time + np.arange(len(voltage)) * time_step
+        
+        # Drop samples already seen in the previous (overlapping) window
+        if self.last_time is not None:
+            new = times > self.last_time + 0.5 * time_step
+            voltage, times = voltage[new], times[new]
+        if len(voltage) == 0:
+            return np.zeros(0), np.zeros(0)
+        
+        if self.last_time is not None:
+            x = np.concatenate(([self.last_sample], voltage))
+            t = np.concatenate(([self.last_time], times))
+        else:
+            x, t = voltage, times
+        self.last_sample, self.last_time = voltage[-1], times[-1]
+        
+        rising = np.nonzero((x[:-1] < 0) & (x[1:] >= 0))[0]
+        crossings = t[rising] + (t[rising + 1] - t[rising]) * (-x[rising] / (x[rising + 1] - x[rising]))
+        
+        # Frequency over the last averaging_periods periods at every new crossing
+        all_crossings = np.concatenate((self.crossings, crossings))
+        n = self.averaging_periods
+        if len(crossings) and len(all_crossings) > n:
+            k = min(len(crossings), len(all_crossings) - n)
+            freqs = n / (all_crossings[n:] - all_crossings[:-n])[-k:]
+            freq_times = all_crossings[-k:]
+        else:
+            freqs, freq_times = np.zeros(0), np.zeros(0)
+        self.crossings = all_crossings[-(n + 1):]
+        
+        # RoCoF as the slope over rocof_periods successive frequency estimates
+        all_freq_times = np.concatenate((self.freq_times, freq_times))
+        all_freqs = np.concatenate((self.freqs, freqs))
+        m = self.rocof_periods
+        if len(freqs) and len(all_freqs) > m:
+            k = min(len(freqs), len(all_freqs) - m)
+            rocofs = (all_freqs[m:] - all_freqs[:-m])[-k:] / (all_freq_times[m:] - all_freq_times[:-m])[-k:]
+            rocof_times = all_freq_times[-k:]
+        else:
+            rocofs, rocof_times = np.zeros(0), np.zeros(0)
+        self.freq_times, self.freqs = all_freq_times[-(m + 1):], all_freqs[-(m + 1):]
+        
+        # Hold the latest estimate between crossings to get per-sample outputs
+        frequency = self._hold(times, freq_times, freqs, self.frequency)
+        rocof = self._hold(times, rocof_times, rocofs, self.rocof)
+        self.frequency, self.rocof = frequency[-1], rocof[-1]
+        return frequency, rocof
+    
+    def _hold(self, times, event_times, values, initial):
+        idx = np.searchsorted(event_times, times, side='right') - 1
+        return np.where(idx >= 0, values[np.maximum(idx, 0)] if len(values) else initial, initial)
+    
+    def reset(self):
+        self.last_sample = None
+        self.last_time = None
+        self.window_start = None
+        self.crossings = np.zeros(0)
+        self.freq_times = np.zeros(0)
+        self.freqs = np.zeros(0)
+        self.frequency = self.f_nom
+        self.rocof = 0.0
+
 class IslandingDetector:
     def __init__(self, frequency):
         self.frequency = frequency
@@ -7,19 +88,23 @@ class IslandingDetector:
         self.f_nom = frequency
         self.V_min, self.V_max = 0.88 * self.V_nom, 1.1 * self.V_nom
         self.f_min, self.f_max = self.f_nom - 1, self.f_nom + 1
+        self.rocof_max = 1.0  # RoCoF trip threshold (Hz/s), np.inf disables
+        self.active_enabled = True  # Active frequency shift / reactive variation checks
         self.active_freq_shift = 0.5  # Hz
         self.active_q = 0.05  # Reactive power injection
         self.last_voltage = 0
         self.last_freq = self.f_nom
         self.time_since_last = 0
+        self.frequency_estimator = FrequencyEstimator(frequency)
     
     def update_parameters(self, frequency):
         self.frequency = frequency
         self.f_nom = frequency
         self.V_min, self.V_max = 0.88 * self.V_nom, 1.1 * self.V_nom
         self.f_min, self.f_max = self.f_nom - 1, self.f_nom + 1
+        self.frequency_estimator.update_parameters(frequency)
     
-    def detect(self, grid_voltage, time_step):
+    def detect(self, grid_voltage, time_step, current_time=None):
         if grid_voltage is None:
             return False
         
@@ -28,27 +113,27 @@ class IslandingDetector:
         if V_peak < self.V_min or V_peak > self.V_max:
             return True
         
-        # Estimate frequency (simplified)
-        zero_crossings = np.where(np.diff(np.sign(grid_voltage)))[0]
-        if len(zero_crossings) >= 2:
-            period = (zero_crossings[1] - zero_crossings[0]) * time_step
-            freq = 1 / (2 * period)
-        else:
-            freq = self.last_freq
+        # Streaming frequency and RoCoF estimate, state carried across windows
+        self.frequency_estimator.update(grid_voltage, time_step, current_time)
+        freq = self.frequency_estimator.frequency
         
         if freq < self.f_min or freq > self.f_max:
             return True
-        
-        # Active: Frequency shift
-        if self.time_since_last >= 0.1:  # Apply every 100ms
-            self.last_freq = freq + self.active_freq_shift * np.sign(freq - self.f_nom)
-            self.time_since_last = 0
-        
-        # Active: Reactive power variation (simulated effect)
-        Q_inject = self.active_q * V_peak
-        if abs(Q_inject - self.last_voltage) > 0.1 * self.V_nom:
+        if abs(self.frequency_estimator.rocof) > self.rocof_max:
             return True
         
+        if self.active_enabled:
+            # Active: Frequency shift
+            if self.time_since_last >= 0.1:  # Apply every 100ms
+                self.last_freq = freq + self.active_freq_shift * np.sign(freq - self.f_nom)
+                self.time_since_last = 0
+            
+            # Active: Reactive power variation (simulated effect)
+            # A stiff grid holds the voltage; a voltage jump larger than the injected share means an island
+            Q_inject = self.active_q * V_peak
+            if self.last_voltage > 0 and abs(V_peak - self.last_voltage) > Q_inject:
+                return True
+        
         self.last_voltage = V_peak
         self.last_freq = freq
         self.time_since_last += time_step
@@ -57,4 +142,5 @@ class IslandingDetector:
     def reset(self):
         self.last_voltage = 0
         self.last_freq = self.f_nom
-        self.time_since_last = 0
\ No newline at end of file
+        self.time_since_last = 0
+        self.frequency_estimator.reset()
\ No newline at end of file
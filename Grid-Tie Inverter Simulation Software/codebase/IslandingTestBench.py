@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from IslandingDetection import IslandingDetector
+
+# Headless anti-islanding bench: parallel RLC islanding events -> non-detection zone (NDZ) maps.
+# Mismatch is per unit of inverter power: dP = P_load - P_inv, dQ = Q_load - Q_inv supplied by the grid.
+
+METHODS = ["OUV/OUF", "RoCoF", "Frequency Shift", "Reactive Injection"]
+
+# Inverter-side settings of the active methods
+SFS_CHOPPING = 0.02  # Sandia frequency shift: base chopping fraction
+SFS_GAIN = 0.1  # Chopping fraction feedback per Hz of deviation
+REACTIVE_INJECTION = 0.05  # Reactive power injected against the frequency deviation (p.u.)
+
+def inverter_reactive(method, freq, f_grid):
+    # Reactive power drawn from the island by the inverter (p.u. of P_inv) at the measured frequency
+    if method == "Frequency Shift":
+        theta = np.pi / 2 * (SFS_CHOPPING + SFS_GAIN * (freq - f_grid))
+        return -np.tan(np.clip(theta, -1.5, 1.5))
+    if method == "Reactive Injection":
+        return -REACTIVE_INJECTION * np.where(freq >= f_grid, 1.0, -1.0)
+    return np.zeros_like(freq)
+
+def resonance_ratio(q, quality_factor):
+    # Solves 1/x - x = q / Qf for x = f / f0, i.e. the frequency where the RLC load absorbs q
+    s = q / quality_factor
+    return (-s + np.sqrt(s * s + 4)) / 2
+
+def island_trajectories(dP, dQ, quality_factor, method, f_grid=50, V_nom=230 * np.sqrt(2), t_island=0.1, duration=2.0, time_step=0.001):
+    # Quasi-static island response, one frequency update per grid cycle, vectorized over all events
+    dP, dQ, quality_factor = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in (dP, dQ, quality_factor)])
+    f_grid_arr = np.full(dP.shape, float(f_grid))
+    q_grid = inverter_reactive(method, f_grid_arr, f_grid)
+    # Load resonance chosen so the grid supplies dQ at f_grid
+    f0 = f_grid / resonance_ratio((q_grid + dQ) / (1 + dP), quality_factor)
+    V_island = V_nom / np.sqrt(1 + dP)
+    
+    cycles = int(np.ceil(duration * f_grid)) + 1
+    island_cycle = int(t_island * f_grid)
+    freq = np.empty(dP.shape + (cycles,))
+    freq[..., :island_cycle + 1] = f_grid
+    for k in range(island_cycle, cycles - 1):
+        q = inverter_reactive(method, freq[..., k], f_grid)
+        freq[..., k + 1] = np.clip(f0 * resonance_ratio(q, quality_factor), 0.5 * f_grid, 1.5 * f_grid)
+    
+    t = np.arange(int(duration / time_step)) * time_step
+    cycle = np.minimum((t * f_grid).astype(int), cycles - 1)
+    f_t = freq[..., cycle]
+    V_t = np.where(t < t_island, V_nom, V_island[..., np.newaxis])
+    phase = 2 * np.pi * np.cumsum(f_t, axis=-1) * time_step
+    return t, V_t * np.sin(phase)
+
+def run_detector(voltage, method, f_grid=50, time_step=0.001, time_window=0.04):
+    # Streams one event through IslandingDetector with the same half-window stride as InverterSimulation
+    detector = IslandingDetector(f_grid)
+    detector.rocof_max = detector.rocof_max if method == "RoCoF" else np.inf
+    detector.active_enabled = method in ["Frequency Shift", "Reactive Injection"]
+    window = int(time_window / time_step)
+    stride = window // 2
+    for start in range(0, len(voltage) - window + 1, stride):
+        if detector.detect(voltage[start:start + window], time_step, start * time_step):
+            return (start + window) * time_step
+    return np.nan
+
+def _run_chunk(args):
+    dP, dQ, quality_factor, method, kwargs = args
+    _, voltage = island_trajectories(dP, dQ, quality_factor, method, **kwargs)
+    time_step = kwargs.get('time_step', 0.001)
+    return np.array([run_detector(v, method, kwargs.get('f_grid', 50), time_step) for v in voltage])
+
+def run_ndz_bench(dP_values=None, dQ_values=None, quality_factors=(0.5, 1.0, 2.5), methods=METHODS, t_island=0.1, duration=2.0, time_step=0.001, workers=None, chunk_size=64):
+    dP_values = np.linspace(-0.4, 0.4, 17) if dP_values is None else np.asarray(dP_values)
+    dQ_values = np.linspace(-0.1, 0.1, 17) if dQ_values is None else np.asarray(dQ_values)
+    quality_factors = np.asarray(quality_factors, dtype=float)
+    kwargs = {'t_island': t_island, 'duration': duration, 'time_step': time_step}
+    
+    Qf, dQ, dP = np.meshgrid(quality_factors, dQ_values, dP_values, indexing='ij')
+    jobs = []
+    for method in methods:
+        for start in range(0, Qf.size, chunk_size):
+            chunk = slice(start, start + chunk_size)
+            jobs.append((dP.ravel()[chunk], dQ.ravel()[chunk], Qf.ravel()[chunk], method, kwargs))
+    
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        trip_times = np.concatenate(list(pool.map(_run_chunk, jobs)))
+    
+    trip_times = trip_times.reshape((len(methods),) + Qf.shape)
+    false_trip = trip_times < t_island
+    detection_time = np.where(false_trip, np.nan, trip_times - t_island)
+    return {
+        'methods': list(methods),
+        'quality_factors': quality_factors,
+        'dQ': dQ_values,
+        'dP': dP_values,
+        'detection_time': detection_time,  # (methods, Qf, dQ, dP), NaN = not detected
+        'non_detection': np.isnan(detection_time) & ~false_trip,
+        'false_trip': false_trip
+    }
+
+def detection_statistics(result):
+    stats = []
+    for m, method in enumerate(result['methods']):
+        for k, quality_factor in enumerate(result['quality_factors']):
+            times = result['detection_time'][m, k]
+            detected = times[~np.isnan(times)]
+            stats.append({
+                'method': method,
+                'quality_factor': quality_factor,
+                'ndz_fraction': np.mean(result['non_detection'][m, k]),
+                'false_trips': int(np.sum(result['false_trip'][m, k])),
+                'mean_time': np.mean(detected) if len(detected) else np.nan,
+                'median_time': np.median(detected) if len(detected) else np.nan,
+                'max_time': np.max(detected) if len(detected) else np.nan
+            })
+    return stats
+
+def format_ndz_map(result, method, quality_factor):
+    # ASCII NDZ map: rows dQ (top = largest), columns dP; '#' marks non-detection
+    m = result['methods'].index(method)
+    k = int(np.argmin(np.abs(result['quality_factors'] - quality_factor)))
+    lines = [f"NDZ {method}, Qf = {result['quality_factors'][k]:.2f} (rows dQ {result['dQ'][-1]:+.2f}..{result['dQ'][0]:+.2f}, cols dP {result['dP'][0]:+.2f}..{result['dP'][-1]:+.2f})"]
+    for row in result['non_detection'][m, k][::-1]:
+        lines.append(''.join('#' if nd else '.' for nd in row))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    result = run_ndz_bench()
+    print(f"{'Method':<20} {'Qf':>5} {'NDZ (%)':>8} {'False':>6} {'Mean (ms)':>10} {'Median (ms)':>12} {'Max (ms)':>9}")
+    for s in detection_statistics(result):
+        print(f"{s['method']:<20} {s['quality_factor']:>5.2f} {s['ndz_fraction'] * 100:>8.1f} {s['false_trips']:>6} {s['mean_time'] * 1e3:>10.1f} {s['median_time'] * 1e3:>12.1f} {s['max_time'] * 1e3:>9.1f}")
+    for method in result['methods']:
+        print()
+        print(format_ndz_map(result, method, 1.0))
\ No newline at end of file
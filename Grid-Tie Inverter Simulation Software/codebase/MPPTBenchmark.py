@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from MaximaleLeistungspunktverfolgung import PerturbAndObserve, IncrementalConductance, ConstantVoltage, ConstantCurrent
+from Welligkeitskorrelationssteuerung import RippleCorrelationControl
+from GlobaleLeistungspunktverfolgung import GlobalScanMPPT, ParticleSwarmMPPT, HybridScanPSOMPPT
+from PVModel import shared_pv_model
+
+# Headless MPPT benchmark on the shared PV model: EN 50530-style irradiance ramps and steps,
+# reporting dynamic tracking efficiency, settling time after every change and steady-state oscillation.
+
+MPPT_TYPES = {
+    "Perturb & Observe": PerturbAndObserve,
+    "Incremental Conductance": IncrementalConductance,
+    "Constant Voltage": ConstantVoltage,
+    "Constant Current": ConstantCurrent,
+    "Ripple Correlation Control": RippleCorrelationControl,
+    "Global Scan": GlobalScanMPPT,
+    "Particle Swarm": ParticleSwarmMPPT,
+    "Hybrid Scan+PSO": HybridScanPSOMPPT
+}
+
+def irradiance_ramp(G_low, G_high, slope, hold=10.0, time_step=0.02):
+    # EN 50530 dynamic test: hold low, ramp up at slope (W/m²/s), hold high, ramp down, hold low
+    ramp = (G_high - G_low) / slope
+    knots_t = np.cumsum([0, hold, ramp, hold, ramp, hold])
+    knots_G = [G_low, G_low, G_high, G_high, G_low, G_low]
+    t = np.arange(0, knots_t[-1], time_step)
+    return t, np.interp(t, knots_t, knots_G)
+
+def irradiance_steps(levels, hold=10.0, time_step=0.02):
+    t = np.arange(0, hold * len(levels), time_step)
+    return t, np.asarray(levels, dtype=float)[np.minimum((t / hold).astype(int), len(levels) - 1)]
+
+def standard_profiles(time_step=0.02):
+    # Reduced EN 50530 set (low-medium and medium-high ramps) plus large irradiance steps
+    profiles = {}
+    for slope in [5, 20, 50]:
+        profiles[f"Ramp 100-500 @ {slope} W/m²/s"] = irradiance_ramp(100, 500, slope, time_step=time_step)
+    for slope in [10, 50, 100]:
+        profiles[f"Ramp 300-1000 @ {slope} W/m²/s"] = irradiance_ramp(300, 1000, slope, time_step=time_step)
+    profiles["Steps 200/1000/500"] = irradiance_steps([200, 1000, 500, 1000, 200], time_step=time_step)
+    return profiles
+
+def hold_intervals(irradiance):
+    # (start, stop) sample ranges where the irradiance is constant, i.e. after each ramp or step
+    constant = np.concatenate(([False], np.diff(irradiance) == 0))
+    edges = np.diff(constant.astype(int))
+    starts = list(np.nonzero(edges == 1)[0] + 1)
+    stops = list(np.nonzero(edges == -1)[0] + 1)
+    if constant[-1]:
+        stops.append(len(irradiance))
+    return [(a, b) for a, b in zip(starts, stops) if b - a > 1]
+
+def benchmark_mppt(mppt_name, profile_name, t, irradiance, temperature=25.0, initial_voltage=400.0, settle_band=0.99, pv_model=None):
+    pv_model = pv_model if pv_model is not None else shared_pv_model
+    mppt = MPPT_TYPES[mppt_name](pv_model)
+    state = {'voltage': initial_voltage, 'power': 0, 'current': 0, 'temperature': temperature}
+    time_step = t[1] - t[0]
+    voltage = np.empty(len(t))
+    # Python floats keep the per-step loop free of numpy scalar overhead
+    irradiance_list = irradiance.tolist()
+    
+    start = time.perf_counter()
+    for n in range(len(t)):
+        state['irradiance'] = irradiance_list[n]
+        state['voltage'] = float(mppt.update(state, time_step, float(t[n])))
+        voltage[n] = state['voltage']
+    cpu_time = time.perf_counter() - start
+    
+    # Power at the commanded voltage; blocking diodes keep the array from sinking current above V_oc
+    power = np.maximum(pv_model.power(voltage, irradiance, temperature), 0.0)
+    P_mpp = pv_model.mpp(irradiance, temperature)[2]
+    ratio = power / np.maximum(P_mpp, 1e-9)
+    
+    settling, oscillation = [], []
+    for a, b in hold_intervals(irradiance):
+        outside = np.nonzero(ratio[a:b] < settle_band)[0]
+        if len(outside) == 0:
+            settling.append(0.0)
+        elif outside[-1] == b - a - 1:
+            settling.append(np.inf)
+        else:
+            settling.append((outside[-1] + 1) * time_step)
+        steady = voltage[(a + b) // 2:b]  # Second half of the hold
+        oscillation.append(np.max(steady) - np.min(steady))
+    
+    return {
+        'mppt': mppt_name,
+        'profile': profile_name,
+        'tracking_efficiency': np.sum(power) / np.sum(P_mpp),
+        'settling_time_mean': np.mean(settling),
+        'settling_time_max': np.max(settling),
+        'oscillation': np.mean(oscillation),  # Steady-state voltage peak-to-peak (V)
+        'cpu_per_step': cpu_time / len(t)
+    }
+
+def _run_job(args):
+    mppt_name, profile_name, t, irradiance, kwargs = args
+    return benchmark_mppt(mppt_name, profile_name, t, irradiance, **kwargs)
+
+def run_mppt_benchmark(mppt_names=None, profiles=None, workers=None, **kwargs):
+    mppt_names = list(MPPT_TYPES) if mppt_names is None else mppt_names
+    profiles = standard_profiles() if profiles is None else profiles
+    jobs = [(name, profile, t, irradiance, kwargs) for profile, (t, irradiance) in profiles.items() for name in mppt_names]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return list(pool.map(_run_job, jobs))
+
+if __name__ == '__main__':
+    results = run_mppt_benchmark()
+    print(f"{'MPPT':<27} {'Profile':<28} {'Eff (%)':>8} {'Settle (s)':>11} {'Max (s)':>8} {'Osc (V)':>8} {'CPU (us)':>9}")
+    for r in results:
+        print(f"{r['mppt']:<27} {r['profile']:<28} {r['tracking_efficiency'] * 100:>8.2f} {r['settling_time_mean']:>11.2f} "
+              f"{r['settling_time_max']:>8.2f} {r['oscillation']:>8.1f} {r['cpu_per_step'] * 1e6:>9.1f}")
\ No newline at end of file
@@ -65,10 +65,14 @@ class MainWindow(QMainWindow):
         self.control_panel.multilevel_changed.connect(self.update_multilevel_topology)
         self.control_panel.pwm_changed.connect(self.update_pwm_technique)
         self.control_panel.design_changed.connect(self.update_design)
+        self.control_panel.filter_changed.connect(self.update_output_filter)
         self.control_panel.mppt_changed.connect(self.update_mppt)
         self.control_panel.control_changed.connect(self.update_control)
+        self.control_panel.pll_changed.connect(self.update_pll)
+        self.control_panel.harmonics_changed.connect(self.update_harmonic_compensation)
         self.control_panel.islanding_changed.connect(self.update_islanding)
         self.control_panel.dc_source_changed.connect(self.update_dc_source)
+        self.control_panel.profile_changed.connect(self.update_profile)
         self.control_panel.start_simulation.connect(self.start_simulation)
         self.control_panel.pause_simulation.connect(self.pause_simulation)
         self.control_panel.reset_simulation.connect(self.reset_simulation)
@@ -96,8 +100,11 @@ class MainWindow(QMainWindow):
         self.update_multilevel_topology(self.control_panel.get_multilevel_topology())
         self.update_pwm_technique(self.control_panel.get_pwm())
         self.update_design(self.control_panel.get_design())
+        self.update_output_filter(self.control_panel.get_output_filter())
         self.update_mppt(self.control_panel.get_mppt())
         self.update_control(self.control_panel.get_control())
+        self.update_pll(self.control_panel.get_pll())
+        self.update_harmonic_compensation(self.control_panel.is_harmonic_compensation_enabled())
         self.update_islanding(self.control_panel.is_islanding_enabled())
         self.update_dc_source(self.control_panel.get_dc_source())
 
@@ -128,6 +135,9 @@ class MainWindow(QMainWindow):
         self.simulation.update_design(design)
         self.waveform_widget.set_design(design)
 
+    def update_output_filter(self, filter_name):
+        self.simulation.update_output_filter(filter_name)
+
     def update_mppt(self, mppt):
         self.simulation.update_mppt(mppt)
         self.waveform_widget.set_mppt(mppt)
@@ -136,6 +146,12 @@ class MainWindow(QMainWindow):
         self.simulation.update_control(control)
         self.waveform_widget.set_control(control)
 
+    def update_pll(self, pll_name):
+        self.simulation.update_pll(pll_name)
+
+    def update_harmonic_compensation(self, enabled):
+        self.simulation.update_harmonic_compensation(enabled)
+
     def update_islanding(self, enabled):
         self.simulation.update_islanding_detection(enabled)
         self.waveform_widget.set_islanding_enabled(enabled)
@@ -143,6 +159,9 @@ class MainWindow(QMainWindow):
     def update_dc_source(self, source_type):
         self.simulation.update_dc_source(source_type)
 
+    def update_profile(self, path):
+        self.simulation.load_profile(path)
+
     def update_waveforms(self):
         grid_voltage = self.grid_window.generate_grid_voltage() if self.grid_window is not None else np.zeros(self.simulation.samples)
         data = self.simulation.generate_waveforms(grid_voltage)
@@ -212,8 +231,11 @@ class MainWindow(QMainWindow):
             'multilevel_topology': self.control_panel.get_multilevel_topology(),
             'pwm_technique': self.control_panel.get_pwm(),
             'design': self.control_panel.get_design(),
+            'output_filter': self.control_panel.get_output_filter(),
             'mppt': self.control_panel.get_mppt(),
             'control': self.control_panel.get_control(),
+            'pll': self.control_panel.get_pll(),
+            'harmonic_compensation': self.control_panel.is_harmonic_compensation_enabled(),
             'islanding_enabled': self.control_panel.is_islanding_enabled(),
             'dc_source': self.control_panel.get_dc_source()
         })
@@ -1,11 +1,21 @@
 import numpy as np
+from PVModel import shared_pv_model
 
 class MPPTAlgorithm:
+    def __init__(self, pv_model=None):
+        self.pv_model = pv_model if pv_model is not None else shared_pv_model
+    
+    def measure(self, state, voltage):
+        # PV current and power at the conditions carried in the MPPT state
+        current = self.pv_model.current(voltage, state.get('irradiance', 1000), state.get('temperature', 25))
+        return current, voltage * current
+    
     def update(self, state, time_step, current_time):
         pass
 
 class PerturbAndObserve(MPPTAlgorithm):
-    def __init__(self):
+    def __init__(self, pv_model=None):
+        super().__init__(pv_model)
         self.perturbation_step = 5.0  # Voltage step (V)
         self.prev_power = 0
         self.prev_voltage = 400
@@ -13,11 +23,8 @@ class PerturbAndObserve(MPPTAlgorithm):
     
     def update(self, state, time_step, current_time):
         # PV model
-        V_oc = 500  # Open-circuit voltage
-        I_sc = 10   # Short-circuit current
         voltage = state['voltage']
-        current = I_sc * (1 - (voltage / V_oc) ** 2)
-        power = voltage * current
+        current, power = self.measure(state, voltage)
         
         # P&O logic
         if power > self.prev_power:
@@ -36,16 +43,15 @@ class PerturbAndObserve(MPPTAlgorithm):
         return voltage
 
 class IncrementalConductance(MPPTAlgorithm):
-    def __init__(self):
+    def __init__(self, pv_model=None):
+        super().__init__(pv_model)
         self.step_size = 5.0  # Voltage step
     
     def update(self, state, time_step, current_time):
         # PV model
-        V_oc = 500
-        I_sc = 10
         voltage = state['voltage']
-        current = I_sc * (1 - (voltage / V_oc) ** 2)
-        power = voltage * current
+        current, power = self.measure(state, voltage)
+        measured_voltage = voltage
         
         # Incremental conductance
         dV = voltage - state.get('prev_voltage', voltage)
@@ -63,8 +69,8 @@ class IncrementalConductance(MPPTAlgorithm):
             elif dI < 0:
                 voltage -= self.step_size
         
-        # Update state
-        state['prev_voltage'] = voltage
+        # Update state with the measured operating point, not the new reference
+        state['prev_voltage'] = measured_voltage
         state['prev_current'] = current
         # Constrain voltage
         voltage = np.clip(voltage, 100, 800)
@@ -73,20 +79,93 @@ class IncrementalConductance(MPPTAlgorithm):
 class ConstantVoltage(MPPTAlgorithm):
     def update(self, state, time_step, current_time):
         # Maintain 80% of open-circuit voltage
-        V_oc = 500
+        I_sc, V_oc = self.pv_model.limits(state.get('irradiance', 1000), state.get('temperature', 25))
         target_voltage = 0.8 * V_oc
         return np.clip(target_voltage, 100, 800)
 
 class ConstantCurrent(MPPTAlgorithm):
     def update(self, state, time_step, current_time):
         # Maintain 90% of short-circuit current
-        V_oc = 500
-        I_sc = 10
+        I_sc, V_oc = self.pv_model.limits(state.get('irradiance', 1000), state.get('temperature', 25))
         target_current = 0.9 * I_sc
         # Estimate voltage to achieve target current
         voltage = state['voltage']
-        current = I_sc * (1 - (voltage / V_oc) ** 2)
+        current, power = self.measure(state, voltage)
         if current != 0:
             voltage *= (target_current / current)
         # Constrain voltage
-        return np.clip(voltage, 100, 800)
\ No newline at end of file
+        return np.clip(voltage, 100, 800)
+
+class BatchedMPPTAlgorithm:
+    # Array-native trackers: one entry per independent string, all advanced in a single call.
+    # Irradiance/temperature are per-string arrays (or scalars); state lives in NumPy arrays.
+    def __init__(self, strings, pv_model=None, initial_voltage=400.0):
+        self.pv_model = pv_model if pv_model is not None else shared_pv_model
+        self.strings = strings
+        self.initial_voltage = initial_voltage
+        self.voltage = np.full(strings, float(initial_voltage))
+        self.current = np.zeros(strings)
+        self.power = np.zeros(strings)
+    
+    def measure(self, voltage, irradiance, temperature):
+        current = self.pv_model.current(voltage, irradiance, temperature)
+        return current, voltage * current
+    
+    def update(self, irradiance, temperature, time_step, current_time):
+        pass
+    
+    def reset(self):
+        self.voltage = np.full(self.strings, float(self.initial_voltage))
+        self.current = np.zeros(self.strings)
+        self.power = np.zeros(self.strings)
+
+class BatchedPerturbAndObserve(BatchedMPPTAlgorithm):
+    def __init__(self, strings, pv_model=None, initial_voltage=400.0):
+        super().__init__(strings, pv_model, initial_voltage)
+        self.perturbation_step = 5.0  # Voltage step (V)
+        self.prev_power = np.zeros(strings)
+        self.direction = np.ones(strings)  # 1 for increase, -1 for decrease
+    
+    def update(self, irradiance, temperature, time_step, current_time):
+        self.current, self.power = self.measure(self.voltage, irradiance, temperature)
+        # Keep direction while power rises, reverse otherwise
+        self.direction = np.where(self.power > self.prev_power, self.direction, -self.direction)
+        self.prev_power = self.power
+        self.voltage = np.clip(self.voltage + self.direction * self.perturbation_step, 100, 800)
+        return self.voltage
+    
+    def reset(self):
+        super().reset()
+        self.prev_power = np.zeros(self.strings)
+        self.direction = np.ones(self.strings)
+
+class BatchedIncrementalConductance(BatchedMPPTAlgorithm):
+    def __init__(self, strings, pv_model=None, initial_voltage=400.0):
+        super().__init__(strings, pv_model, initial_voltage)
+        self.step_size = 5.0  # Voltage step
+        self.prev_voltage = None
+        self.prev_current = None
+    
+    def update(self, irradiance, temperature, time_step, current_time):
+        voltage = self.voltage
+        self.current, self.power = self.measure(voltage, irradiance, temperature)
+        prev_voltage = voltage if self.prev_voltage is None else self.prev_voltage
+        prev_current = self.current if self.prev_current is None else self.prev_current
+        dV = voltage - prev_voltage
+        dI = self.current - prev_current
+        
+        # dI/dV + I/V > 0 left of the MPP; fall back to the sign of dI when the voltage did not move
+        moved = dV != 0
+        conductance = np.where(voltage != 0, self.current / np.where(voltage != 0, voltage, 1.0), 0.0)
+        inc_conductance = dI / np.where(moved, dV, 1.0)
+        step = np.where(moved, np.sign(inc_conductance + conductance), np.sign(dI))
+        
+        self.prev_voltage = voltage
+        self.prev_current = self.current
+        self.voltage = np.clip(voltage + step * self.step_size, 100, 800)
+        return self.voltage
+    
+    def reset(self):
+        super().reset()
+        self.prev_voltage = None
+        self.prev_current = None
\ No newline at end of file
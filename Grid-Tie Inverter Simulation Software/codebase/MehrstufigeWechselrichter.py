@@ -1,144 +1,462 @@
+from functools import lru_cache
 import numpy as np
 from Wechselrichtertopologie import SinglePhaseTopology, ThreePhaseTopology
+from Pulsweitenmodulation import SwitchingEvents, modulate, nearest_level
+
+@lru_cache(maxsize=None)
+def level_table(levels=5, cell_ratios=None, peak=0.5):
+    # Per-unit output levels (multiples of dc_voltage), ascending and read-only.
+    # Evenly spaced between -peak and +peak, or for cascaded cells every sum of -1/0/+1 times each cell voltage,
+    # with the cells scaled so the highest level is +peak (ratios (1, 1, ...) symmetric, (1, 2) or (1, 3) asymmetric CHB).
+    if cell_ratios:
+        table = np.zeros(1)
+        for ratio in cell_ratios:
+            table = np.unique(np.round((table[:, np.newaxis] + ratio * np.array([-1, 0, 1])).ravel(), 12))
+        table = table * peak / np.sum(cell_ratios)
+    else:
+        table = np.linspace(-peak, peak, levels)
+    table.setflags(write=False)
+    return table
 
 class MultilevelInverter:
-    def __init__(self, dc_voltage, frequency, mod_index, time_window, time_step):
+    # Generic N-level leg. Subclasses only set the level structure; levels/cell_ratios/peak passed to the
+    # constructor override it, e.g. MMCInverter(..., levels=31).
+    level_count = 5     # Evenly spaced output levels
+    cell_ratios = None  # Cascaded cell voltage ratios, replaces level_count when set
+    peak = 0.5          # Highest level as a fraction of dc_voltage
+    
+    def __init__(self, dc_voltage, frequency, mod_index, time_window, time_step, levels=None, cell_ratios=None, peak=None):
         self.dc_voltage = dc_voltage
         self.frequency = frequency
         self.mod_index = mod_index
         self.time_window = time_window
         self.time_step = time_step
         self.samples = int(time_window / time_step)
-        self.levels = 5  # Default 5-level
+        if levels is not None:
+            self.level_count = levels
+        if cell_ratios is not None:
+            self.cell_ratios = tuple(cell_ratios)
+        if peak is not None:
+            self.peak = peak
+        self.level_pu = level_table(self.level_count, self.cell_ratios, self.peak)
+        self.levels = len(self.level_pu)  # Number of output levels
+        self.switching_frequency = 10000  # Carrier frequency (Hz)
+        self.events = None  # Switching events of the last window
     
     def update_parameters(self, dc_voltage, frequency, mod_index):
         self.dc_voltage = dc_voltage
         self.frequency = frequency
         self.mod_index = mod_index
     
-    def generate_waveforms(self, current_time, phase_topology, pwm_technique):
-        pass
+    def level_voltages(self):
+        return self.level_pu * self.dc_voltage
     
-    def reset(self):
-        pass
-
-    def apply_pwm(self, ref, levels, pwm_technique):
-        v_out = np.zeros_like(ref)
-        if pwm_technique == "Multicarrier":
-            thresholds = np.linspace(-1, 1, len(levels)-1)
-            for i in range(len(ref)):
-                for j in range(len(thresholds)):
-                    if ref[i] > thresholds[j]:
-                        v_out[i] = levels[j+1]
-                    else:
-                        v_out[i] = levels[j]
-                        break
-        else:  # Space Vector
-            # Simplified SVPWM: Discretize to nearest level with slight offset
-            for i in range(len(ref)):
-                normalized = ref[i] * 1.1  # Adjust for SVPWM
-                v_out[i] = levels[np.argmin(np.abs(levels - normalized * self.dc_voltage/2))]
-        return v_out
-
-class NPCInverter(MultilevelInverter):
     def generate_waveforms(self, current_time, phase_topology, pwm_technique):
+        # All phases at once: voltage and current are (phases, samples) arrays
         time = np.linspace(current_time, current_time + self.time_window, self.samples)
         num_phases = 1 if isinstance(phase_topology, SinglePhaseTopology) else 3
         phase_angles = [0] if num_phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3]
+        voltage = self.apply_pwm(self.sine_reference(phase_angles), self.level_voltages(), pwm_technique, time)
+        return {'time': time, 'voltage': voltage, 'current': voltage * (self.mod_index / 230)}
+    
+    def reset(self):
+        pass
+    
+    def sine_reference(self, phase_angles):
+        # Normalized sinusoidal references as a function of time, one row per phase
+        angles = np.asarray(phase_angles, dtype=float)[:, np.newaxis]
+        return lambda t: self.mod_index * np.sin(2 * np.pi * self.frequency * np.asarray(t, dtype=float)[np.newaxis, :] + angles)
+
+    def apply_pwm(self, ref, levels, pwm_technique, time=None):
+        # ref: normalized reference, either a function of time or samples on the time grid (one row per phase).
+        # Carrier techniques switch at switching_frequency; the exact switching events are kept in self.events
+        # and the returned voltage is the switched output at the grid instants.
+        levels = np.asarray(levels, dtype=float)
+        if callable(ref):
+            reference = ref
+        else:
+            samples = np.atleast_2d(ref)
+            time = np.arange(samples.shape[-1]) * self.time_step if time is None else time
+            reference = lambda t: np.array([np.interp(t, time, row) for row in samples])
+        time = np.asarray(time, dtype=float)
+        if pwm_technique == "Nearest Level":
+            self.events = SwitchingEvents.from_samples(time, nearest_level(reference(time), levels), levels)
+        else:
+            self.events = modulate(reference, time[0], time[-1], levels, pwm_technique, self.switching_frequency)
+        v_out = self.events.sample(time)
+        return v_out[0] if not callable(ref) and np.ndim(ref) == 1 else v_out
+
+@lru_cache(maxsize=None)
+def flying_capacitor_states(cells=4):
+    # Switching-state table of a flying-capacitor leg with cells commutation cells (cells + 1 levels): for every level
+    # all on/off patterns with that many cells on, padded to the largest count. states (levels, candidates, cells),
+    # valid (levels, candidates). Flying capacitor j (between cells j and j + 1) carries (S_(j+1) - S_j) * i_o.
+    patterns = (np.arange(2 ** cells)[:, np.newaxis] >> np.arange(cells)) & 1
+    count = np.sum(patterns, axis=-1)
+    states = np.zeros((cells + 1, np.max(np.bincount(count)), cells), dtype=int)
+    valid = np.zeros(states.shape[:2], dtype=bool)
+    for level in range(cells + 1):
+        members = patterns[count == level]
+        states[level, :len(members)] = members
+        valid[level, :len(members)] = True
+    states.setflags(write=False)
+    valid.setflags(write=False)
+    return states, valid
+
+class CapacitorVoltageModel:
+    # Capacitor voltages of a multilevel leg driven by its switched output. The output is split into constant pieces
+    # at every switching event of any phase and the charge of each piece is integrated from the output current.
+    # The redundant switching state is chosen once per control period from the capacitor voltages sampled at its
+    # start; only that decision steps through the periods, everything else is vectorized over the window.
+    def __init__(self, levels=5, capacitance=1e-3, balancing=True):
+        self.levels = levels
+        self.capacitance = capacitance    # F
+        self.balancing = balancing        # False: one fixed state per level, to study the uncontrolled drift
+        self.control_frequency = 10000.0  # Balancing decisions per second (Hz)
+        self.reset()
+    
+    def reset(self):
+        self.v_c = None  # Capacitor voltages at time t
+        self.t = None
+        self.phases = None
+        self.switchings = 0
+        self.history = None
+    
+    def simulate(self, events, time, i_o, dc_voltage):
+        # Advances the capacitor voltages to the end of the window and returns the records of the pieces from the
+        # window start, with the actual leg voltages sampled on time. events: SwitchingEvents of the window,
+        # i_o(t): output current (A) per phase. Windows may overlap the previous one; only the new part is simulated.
+        phases = len(events.times)
+        if self.v_c is None or self.phases != phases or (self.history is not None and time[0] < self.history['start'][0]):
+            self.initialize(phases, dc_voltage)
+            self.t = time[0]
+            self.history = None
+        self.t = max(self.t, time[0])  # Gap between windows: the capacitors hold their voltage
+        inner = [times[(times > self.t) & (times < time[-1])] for times in events.times]
+        bounds = np.unique(np.concatenate([[self.t]] + inner + [[time[-1]]]))
+        if len(bounds) > 1:
+            a, b = bounds[:-1], bounds[1:]
+            mid = (a + b) / 2
+            level = events.level_index(mid)
+            q = (b - a) / 6 * (i_o(a) + 4 * i_o(mid) + i_o(b))  # Charge of each piece (Simpson)
+            period = np.floor(a * self.control_frequency)
+            group = np.concatenate(([0], np.cumsum(np.diff(period) != 0)))  # Control period of each piece
+            record = self.balance(level, q, group, dc_voltage)
+            record.update(start=a, end=b)
+            self.t = b[-1]
+            if self.history is not None:
+                keep = self.history['end'] > time[0]
+                record = {name: np.concatenate((self.history[name][..., keep], record[name]), axis=-1) for name in record}
+            self.history = record
+        record = dict(self.history)
+        # Leg voltages with the capacitor voltages changing linearly within each piece
+        k = np.clip(np.searchsorted(record['start'], time, side='right') - 1, 0, len(record['start']) - 1)
+        fraction = np.clip((time - record['start'][k]) / (record['end'][k] - record['start'][k]), 0, 1)
+        record['voltage'] = record['voltage_start'][:, k] + fraction * (record['voltage_end'][:, k] - record['voltage_start'][:, k])
+        return record
+
+class FlyingCapacitorModel(CapacitorVoltageModel):
+    # levels - 2 flying capacitors per phase with nominal voltages j * dc_voltage / (levels - 1). Every control period
+    # picks, per phase and level, the redundant cell pattern that brings the capacitors closest to nominal.
+    def initialize(self, phases, dc_voltage):
+        self.phases = phases
+        self.v_c = np.tile(np.arange(1, self.levels - 1) * dc_voltage / (self.levels - 1), (phases, 1))
+        self.state = np.zeros((phases, self.levels - 1), dtype=int)  # Cell pattern at time t
+    
+    def balance(self, level, q, group, dc_voltage):
+        states, valid = flying_capacitor_states(self.levels - 1)
+        coefficient = (states[..., 1:] - states[..., :-1]) / self.capacitance  # Capacitor voltage change per charge
+        phases, pieces = level.shape
+        periods = group[-1] + 1
+        # Charge per period, phase and level; all pieces of a level within one period use the same pattern
+        index = (group[np.newaxis, :] * phases + np.arange(phases)[:, np.newaxis]) * self.levels + level
+        Q = np.bincount(index.ravel(), weights=q.ravel(), minlength=periods * phases * self.levels).reshape(periods, phases, self.levels)
+        choice = np.zeros((periods, phases, self.levels), dtype=int)
+        if self.balancing:
+            penalty = np.where(valid, 0.0, np.inf)
+            error = self.v_c - np.arange(1, self.levels - 1) * dc_voltage / (self.levels - 1)
+            for p in range(periods):
+                dv = coefficient * Q[p][..., np.newaxis, np.newaxis]  # (phases, levels, candidates, capacitors)
+                c = np.argmin(np.sum((error[:, np.newaxis, np.newaxis, :] + dv) ** 2, axis=-1) + penalty, axis=-1)
+                choice[p] = c
+                error = error + np.sum(np.take_along_axis(dv, c[..., np.newaxis, np.newaxis], axis=2)[:, :, 0], axis=1)
         
-        levels = np.array([-self.dc_voltage/2, -self.dc_voltage/4, 0, self.dc_voltage/4, self.dc_voltage/2])
-        voltage = []
-        current = []
-        for angle in phase_angles:
-            ref = self.mod_index * np.sin(2 * np.pi * self.frequency * time + angle)
-            v_out = self.apply_pwm(ref, levels, pwm_technique)
-            voltage.append(v_out)
-            current.append(v_out * (self.mod_index / 230))
-        return {'time': time, 'voltage': voltage, 'current': current}
-
-class FlyingCapacitorInverter(MultilevelInverter):
-    def generate_waveforms(self, current_time, phase_topology, pwm_technique):
-        time = np.linspace(current_time, current_time + self.time_window, self.samples)
-        num_phases = 1 if isinstance(phase_topology, SinglePhaseTopology) else 3
-        phase_angles = [0] if num_phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3]
+        candidate = choice[group[np.newaxis, :], np.arange(phases)[:, np.newaxis], level]
+        S = states[level, candidate]  # (phases, pieces, cells)
+        dv = coefficient[level, candidate] * q[..., np.newaxis]
+        v_end = self.v_c[:, np.newaxis, :] + np.cumsum(dv, axis=1)
+        v_start = v_end - dv
+        self.switchings += np.count_nonzero(np.diff(np.concatenate((self.state[:, np.newaxis, :], S), axis=1), axis=1))
+        self.state = S[:, -1]
+        self.v_c = v_end[:, -1]
+        
+        def leg_voltage(v):
+            # Sum of the voltage steps of the cells that are on, referred to the dc midpoint
+            rails = np.concatenate((np.zeros(v.shape[:-1] + (1,)), v, np.full(v.shape[:-1] + (1,), dc_voltage)), axis=-1)
+            return np.sum(S * np.diff(rails, axis=-1), axis=-1) - dc_voltage / 2
         
-        levels = np.array([-self.dc_voltage/2, -self.dc_voltage/4, 0, self.dc_voltage/4, self.dc_voltage/2])
-        voltage = []
-        current = []
-        for angle in phase_angles:
-            ref = self.mod_index * np.sin(2 * np.pi * self.frequency * time + angle)
-            v_out = self.apply_pwm(ref, levels, pwm_technique)
-            voltage.append(v_out)
-            current.append(v_out * (self.mod_index / 230))
-        return {'time': time, 'voltage': voltage, 'current': current}
+        return {
+            'voltage_start': leg_voltage(v_start),
+            'voltage_end': leg_voltage(v_end),
+            'capacitor': np.moveaxis(v_start, 1, -1),  # (phases, capacitors, pieces) at the start of each piece
+            'state': np.moveaxis(S, 1, -1)
+        }
 
-class CascadedHBridgeInverter(MultilevelInverter):
+class NeutralPointModel(CapacitorVoltageModel):
+    # Diode-clamped leg: levels - 1 dc-link capacitors in series across a stiff dc source, level l connects the output
+    # to node l and the inner nodes carry the currents of the phases clamped to them. In three-phase legs moving every
+    # phase by the same number of levels keeps the line-to-line voltages (the redundant small vectors), so every control
+    # period picks the shift whose node currents bring the capacitors closest to dc_voltage / (levels - 1). The shift
+    # applies to the pieces of the period where all phases stay within the levels; the others keep their levels.
+    def initialize(self, phases, dc_voltage):
+        self.phases = phases
+        self.v_c = np.full(self.levels - 1, dc_voltage / (self.levels - 1))
+        self.node = np.zeros(phases, dtype=int)  # Node of each phase at time t
+    
+    def node_matrix(self):
+        # Capacitor voltage change per charge drawn from each node (capacitors, nodes): capacitor k discharges with the
+        # inner-node currents below it, less the common part supplied by the source (the voltages sum to dc_voltage)
+        k = np.arange(1, self.levels)[:, np.newaxis]
+        j = np.arange(self.levels)[np.newaxis, :]
+        below = ((j < k) & (j > 0) & (j < self.levels - 1)).astype(float)
+        return (below - np.mean(below, axis=0)) / self.capacitance
+    
+    def balance(self, level, q, group, dc_voltage):
+        L = self.levels
+        M = self.node_matrix()
+        self.v_c = self.v_c * dc_voltage / np.sum(self.v_c)  # The series string follows the source voltage
+        periods = group[-1] + 1
+        shifts = np.arange(1 - L, L) if self.balancing and len(level) > 1 else np.zeros(1, dtype=int)
+        # Node of every phase and piece for each shift (shifts, phases, pieces), then the capacitor voltage change
+        # per piece and its sum per control period
+        low, high = np.min(level, axis=0), np.max(level, axis=0)
+        feasible = (low + shifts[:, np.newaxis] >= 0) & (high + shifts[:, np.newaxis] < L)
+        nodes = level + np.where(feasible, shifts[:, np.newaxis], 0)[:, np.newaxis, :]
+        dv_piece = np.sum(M.T[nodes] * q[..., np.newaxis], axis=1)
+        dv = np.add.reduceat(dv_piece, np.flatnonzero(np.diff(group, prepend=-1)), axis=1).transpose(1, 0, 2)  # (periods, shifts, capacitors)
+        choice = np.full(periods, np.flatnonzero(shifts == 0)[0])
+        if len(shifts) > 1:
+            error = self.v_c - dc_voltage / (L - 1)
+            for p in range(periods):
+                c = np.argmin(np.sum((error + dv[p]) ** 2, axis=-1))
+                choice[p] = c
+                error = error + dv[p, c]
+        
+        pick = choice[group]
+        node = nodes[pick, :, np.arange(len(pick))].T  # (phases, pieces)
+        dv = dv_piece[pick, np.arange(len(pick))]      # (pieces, capacitors)
+        v_end = self.v_c + np.cumsum(dv, axis=0)
+        v_start = v_end - dv
+        self.switchings += int(np.sum(np.abs(np.diff(np.concatenate((self.node[:, np.newaxis], node), axis=1), axis=1))))
+        self.node = node[:, -1]
+        self.v_c = v_end[-1]
+        
+        def leg_voltage(v):
+            potentials = np.concatenate((np.zeros((len(v), 1)), np.cumsum(v, axis=-1)), axis=-1)  # (pieces, nodes)
+            return np.take_along_axis(potentials, node.T, axis=1).T - dc_voltage / 2
+        
+        return {
+            'voltage_start': leg_voltage(v_start),
+            'voltage_end': leg_voltage(v_end),
+            'capacitor': v_start.T,  # (capacitors, pieces) at the start of each piece
+            'shift': node[0] - level[0]
+        }
+
+class BalancedMultilevelInverter(MultilevelInverter):
+    # Leg whose levels come from capacitors that drift with the load current. capacitance (F) switches on the
+    # capacitor model, and the output then uses the actual capacitor voltages instead of ideal levels.
+    capacitor_model = None
+    
+    def __init__(self, dc_voltage, frequency, mod_index, time_window, time_step, levels=None, cell_ratios=None, peak=None,
+                 capacitance=None, output_current=20.0):
+        super().__init__(dc_voltage, frequency, mod_index, time_window, time_step, levels, cell_ratios, peak)
+        self.capacitors = self.capacitor_model(self.levels, capacitance) if capacitance else None
+        self.output_current = output_current  # Peak phase current of the capacitor model (A), in phase with the reference
+        self.capacitor_results = None
+    
     def generate_waveforms(self, current_time, phase_topology, pwm_technique):
-        time = np.linspace(current_time, current_time + self.time_window, self.samples)
-        num_phases = 1 if isinstance(phase_topology, SinglePhaseTopology) else 3
-        phase_angles = [0] if num_phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3]
+        data = super().generate_waveforms(current_time, phase_topology, pwm_technique)
+        if self.capacitors is None:
+            return data
+        time = data['time']
+        phase_angles = np.array([0] if len(data['voltage']) == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3])[:, np.newaxis]
+        i_o = lambda t: self.output_current * np.sin(2 * np.pi * self.frequency * t[np.newaxis, :] + phase_angles)
+        self.capacitors.control_frequency = self.switching_frequency
+        self.capacitor_results = self.capacitors.simulate(self.events, time, i_o, self.dc_voltage)
+        return {'time': time, 'voltage': self.capacitor_results['voltage'], 'current': i_o(time)}
+    
+    def reset(self):
+        if self.capacitors is not None:
+            self.capacitors.reset()
+
+class NPCInverter(BalancedMultilevelInverter):
+    level_count = 5
+    capacitor_model = NeutralPointModel
+
+class FlyingCapacitorInverter(BalancedMultilevelInverter):
+    level_count = 5
+    capacitor_model = FlyingCapacitorModel
+
+class CascadedHBridgeInverter(MultilevelInverter):
+    cell_ratios = (1, 1)  # Two equal H-bridge cells, +-dc_voltage
+    peak = 1.0
+
+class MMCArmModel:
+    # Arm-level MMC: per phase an upper and a lower arm of half-bridge submodules with arm inductors on a stiff dc link.
+    # Nearest-level modulation sets how many submodules each arm inserts, sort-based balancing picks which ones:
+    # the lowest capacitor voltages while the arm current charges, the highest while it discharges.
+    # Arm currents: i_upper = i_c + i_o / 2, i_lower = i_c - i_o / 2 (i_c circulating, i_o output).
+    def __init__(self, submodules=20, arm_energy=50.0, L_arm=5e-3, R_arm=0.1, time_step=2e-5, balancing="partition"):
+        self.submodules = submodules
+        self.arm_energy = arm_energy  # Stored energy per arm at nominal capacitor voltage (J)
+        self.L_arm = L_arm            # Arm inductance (H)
+        self.R_arm = R_arm            # Arm resistance (Ohm)
+        self.time_step = time_step    # Internal step of the arm model (s)
+        self.balancing = balancing    # "partition": argpartition per step, "sorted": keep each arm's voltage order across steps
+        self.K_circulating = 10.0     # Circulating current controller gain (Ohm)
+        self.K_energy = 0.05          # Leg energy controller gain (A/V)
+        self.voltage_tolerance = 0.02  # Capacitor spread, relative to the arm mean, that forces a full re-selection
+        self.reset()
+    
+    def reset(self):
+        self.v_c = None  # Submodule capacitor voltages (phases, 2, submodules)
+        self.t = None    # Time of the last internal step
+        self.history = None
+    
+    def initialize(self, phases, dc_voltage, t):
+        N = self.submodules
+        self.C = 2 * N * self.arm_energy / dc_voltage ** 2  # Submodule capacitance for the arm energy (F)
+        self.v_c = np.full((phases, 2, N), dc_voltage / N)
+        self.inserted = np.zeros((phases, 2, N), dtype=bool)
+        self.order = np.tile(np.arange(N), (phases, 2, 1))  # Submodules by ascending voltage, per arm
+        self.i_c = np.zeros(phases)
+        self.switchings = 0
+        self.t = t
+        self.history = None
+    
+    def select(self, n, charging):
+        # Inserted submodules (phases, 2, N) for n per arm. Only the change in n is inserted or bypassed (charging:
+        # insert the lowest bypassed, bypass the highest inserted; discharging the other way round); arms whose
+        # voltage spread exceeds the tolerance are re-selected from scratch.
+        N = self.submodules
+        inserted = self.inserted.copy()
+        spread = np.max(self.v_c, axis=-1) - np.min(self.v_c, axis=-1)
+        rebalance = spread > self.voltage_tolerance * np.mean(self.v_c, axis=-1)
+        inserted[rebalance] = False
+        delta = n.astype(int) - np.count_nonzero(inserted, axis=-1)
         
-        levels = np.array([-self.dc_voltage, -self.dc_voltage/2, 0, self.dc_voltage/2, self.dc_voltage])
-        voltage = []
-        current = []
-        for angle in phase_angles:
-            ref = self.mod_index * np.sin(2 * np.pi * self.frequency * time + angle)
-            v_out = self.apply_pwm(ref, levels, pwm_technique)
-            voltage.append(v_out)
-            current.append(v_out * (self.mod_index / 230))
-        return {'time': time, 'voltage': voltage, 'current': current}
+        if self.balancing == "partition":
+            for index in zip(*np.nonzero(delta)):
+                k = abs(int(delta[index]))
+                adding = delta[index] > 0
+                candidates = np.flatnonzero(~inserted[index] if adding else inserted[index])
+                key = self.v_c[index][candidates] * (1 if charging[index] == adding else -1)  # Lowest key first
+                chosen = candidates if k >= len(candidates) else candidates[np.argpartition(key, k - 1)[:k]]
+                inserted[index][chosen] = adding
+            return inserted
+        
+        # The order from the previous step is almost sorted, so the stable (merge-based) sort is close to linear
+        voltages = np.take_along_axis(self.v_c, self.order, axis=-1)
+        self.order = np.take_along_axis(self.order, np.argsort(voltages, axis=-1, kind='stable'), axis=-1)
+        key_order = np.where(charging[..., np.newaxis], self.order, self.order[..., ::-1])  # Insert-first order
+        s = np.take_along_axis(inserted, key_order, axis=-1)
+        add = ~s & (np.cumsum(~s, axis=-1) <= np.maximum(delta, 0)[..., np.newaxis])
+        remove = s & (np.cumsum(s[..., ::-1], axis=-1)[..., ::-1] <= np.maximum(-delta, 0)[..., np.newaxis])
+        np.put_along_axis(inserted, key_order, (s | add) & ~remove, axis=-1)
+        return inserted
+    
+    def run(self, t, e_ref, i_o, dc_voltage):
+        # Internal steps at the instants t with emf references e_ref and output currents i_o, both (phases, steps)
+        N, C, L, R, dt = self.submodules, self.C, self.L_arm, self.R_arm, self.time_step
+        phases, steps = e_ref.shape
+        record = {name: np.zeros((phases, steps)) for name in ['voltage', 'circulating_current']}
+        record.update({name: np.zeros((phases, 2, steps)) for name in ['arm_current', 'arm_voltage', 'inserted',
+                                                                         'capacitor_mean', 'capacitor_min', 'capacitor_max']})
+        i_c_dc = np.sum(e_ref * i_o, axis=0) / (phases * dc_voltage)  # Dc current per leg for the ac power
+        for k in range(steps):
+            v_sum = np.sum(self.v_c, axis=-1)
+            i_c_ref = i_c_dc[k] + self.K_energy * (dc_voltage - np.mean(v_sum, axis=-1))
+            v_diff = R * i_c_ref + self.K_circulating * (i_c_ref - self.i_c)
+            v_arm_ref = np.stack((dc_voltage / 2 - e_ref[:, k] - v_diff, dc_voltage / 2 + e_ref[:, k] - v_diff), axis=-1)
+            n = np.clip(np.rint(v_arm_ref / (v_sum / N)), 0, N)
+            i_arm = np.stack((self.i_c + i_o[:, k] / 2, self.i_c - i_o[:, k] / 2), axis=-1)
+            inserted = self.select(n, i_arm > 0)
+            self.switchings += np.count_nonzero(inserted != self.inserted)
+            self.inserted = inserted
+            v_arm = np.sum(self.v_c * inserted, axis=-1)
+            
+            record['voltage'][:, k] = (v_arm[:, 1] - v_arm[:, 0]) / 2
+            record['circulating_current'][:, k] = self.i_c
+            record['arm_current'][..., k] = i_arm
+            record['arm_voltage'][..., k] = v_arm
+            record['inserted'][..., k] = n
+            record['capacitor_mean'][..., k] = v_sum / N
+            record['capacitor_min'][..., k] = np.min(self.v_c, axis=-1)
+            record['capacitor_max'][..., k] = np.max(self.v_c, axis=-1)
+            
+            self.v_c += dt / C * inserted * i_arm[..., np.newaxis]
+            self.i_c += dt / L * (dc_voltage / 2 - (v_arm[:, 0] + v_arm[:, 1]) / 2 - R * self.i_c)
+        record['time'] = t
+        return record
+    
+    def simulate(self, time, e_ref, i_o, dc_voltage):
+        # Advances the arm model to the end of the window and returns its records from the window start.
+        # e_ref(t), i_o(t): emf reference (V) and output current (A) as functions of time, (phases, len(t)).
+        # Windows may overlap the previous one; only the new part is simulated.
+        phases = len(e_ref(time[:1]))
+        if self.v_c is None or self.v_c.shape[0] != phases or time[0] < self.history['time'][0]:
+            self.initialize(phases, dc_voltage, time[0] - self.time_step)
+        t = np.arange(self.t + self.time_step, time[-1] + self.time_step / 2, self.time_step)
+        record = self.run(t, e_ref(t), i_o(t), dc_voltage)
+        if len(t):
+            self.t = t[-1]
+        if self.history is not None:
+            keep = self.history['time'] >= time[0]
+            record = {name: np.concatenate((self.history[name][..., keep], record[name]), axis=-1) for name in record}
+        self.history = record
+        return record
 
 class MMCInverter(MultilevelInverter):
+    level_count = 9  # More levels for smoother output
+    
+    def __init__(self, dc_voltage, frequency, mod_index, time_window, time_step, levels=None, cell_ratios=None, peak=None,
+                 submodules=None, output_current=20.0):
+        # submodules: run the arm-level model with that many submodules per arm (submodules + 1 output levels)
+        super().__init__(dc_voltage, frequency, mod_index, time_window, time_step, submodules + 1 if submodules else levels, cell_ratios, peak)
+        self.arm_model = MMCArmModel(submodules) if submodules else None
+        self.output_current = output_current  # Peak phase current of the arm-level model (A), in phase with the emf
+        self.arm_results = None
+    
     def generate_waveforms(self, current_time, phase_topology, pwm_technique):
+        if self.arm_model is None:
+            return super().generate_waveforms(current_time, phase_topology, pwm_technique)
         time = np.linspace(current_time, current_time + self.time_window, self.samples)
         num_phases = 1 if isinstance(phase_topology, SinglePhaseTopology) else 3
-        phase_angles = [0] if num_phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3]
-        
-        # MMC: More levels for smoother output
-        levels = np.array([-self.dc_voltage/2, -self.dc_voltage*3/8, -self.dc_voltage/4, -self.dc_voltage/8, 0, 
-                          self.dc_voltage/8, self.dc_voltage/4, self.dc_voltage*3/8, self.dc_voltage/2])
-        self.levels = 9  # 9-level for MMC
-        voltage = []
-        current = []
-        for angle in phase_angles:
-            ref = self.mod_index * np.sin(2 * np.pi * self.frequency * time + angle)
-            v_out = self.apply_pwm(ref, levels, pwm_technique)
-            voltage.append(v_out)
-            current.append(v_out * (self.mod_index / 230))
-        return {'time': time, 'voltage': voltage, 'current': current}
+        phase_angles = np.array([0] if num_phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3])[:, np.newaxis]
+        omega = 2 * np.pi * self.frequency
+        e_ref = lambda t: self.mod_index * self.dc_voltage / 2 * np.sin(omega * t[np.newaxis, :] + phase_angles)
+        i_o = lambda t: self.output_current * np.sin(omega * t[np.newaxis, :] + phase_angles)
+        self.arm_results = self.arm_model.simulate(time, e_ref, i_o, self.dc_voltage)
+        # Arm-model steps held on the simulation grid
+        k = np.clip(np.searchsorted(self.arm_results['time'], time, side='right') - 1, 0, len(self.arm_results['time']) - 1)
+        return {'time': time, 'voltage': self.arm_results['voltage'][:, k], 'current': i_o(time)}
+    
+    def reset(self):
+        if self.arm_model is not None:
+            self.arm_model.reset()
 
 class ReducedSwitchCountInverter(MultilevelInverter):
-    def generate_waveforms(self, current_time, phase_topology, pwm_technique):
-        time = np.linspace(current_time, current_time + self.time_window, self.samples)
-        num_phases = 1 if isinstance(phase_topology, SinglePhaseTopology) else 3
-        phase_angles = [0] if num_phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3]
-        
-        # Fewer switches, optimized 5-level
-        levels = np.array([-self.dc_voltage/2, -self.dc_voltage/4, 0, self.dc_voltage/4, self.dc_voltage/2])
-        voltage = []
-        current = []
-        for angle in phase_angles:
-            ref = self.mod_index * np.sin(2 * np.pi * self.frequency * time + angle)
-            v_out = self.apply_pwm(ref, levels, pwm_technique)
-            voltage.append(v_out)
-            current.append(v_out * (self.mod_index / 230))
-        return {'time': time, 'voltage': voltage, 'current': current}
+    level_count = 5  # Fewer switches, optimized 5-level
 
 class HybridCHBPlusNPCInverter(MultilevelInverter):
-    def generate_waveforms(self, current_time, phase_topology, pwm_technique):
-        time = np.linspace(current_time, current_time + self.time_window, self.samples)
-        num_phases = 1 if isinstance(phase_topology, SinglePhaseTopology) else 3
-        phase_angles = [0] if num_phases == 1 else [0, -2 * np.pi / 3, 2 * np.pi / 3]
-        
-        # Hybrid: 7-level output
-        levels = np.array([-self.dc_voltage*3/4, -self.dc_voltage/2, -self.dc_voltage/4, 0, 
-                          self.dc_voltage/4, self.dc_voltage/2, self.dc_voltage*3/4])
-        self.levels = 7
-        voltage = []
-        current = []
-        for angle in phase_angles:
-            ref = self.mod_index * np.sin(2 * np.pi * self.frequency * time + angle)
-            v_out = self.apply_pwm(ref, levels, pwm_technique)
-            voltage.append(v_out)
-            current.append(v_out * (self.mod_index / 230))
-        return {'time': time, 'voltage': voltage, 'current': current}
\ No newline at end of file
+    cell_ratios = (1, 2)  # Asymmetric cells: 7-level output, +-3/4 dc_voltage
+    peak = 0.75
+
+MULTILEVEL_TYPES = {
+    "NPC": NPCInverter,
+    "Flying Capacitor": FlyingCapacitorInverter,
+    "Cascaded H-Bridge": CascadedHBridgeInverter,
+    "MMC": MMCInverter,
+    "Reduced Switch Count": ReducedSwitchCountInverter,
+    "Hybrid CHB+NPC": HybridCHBPlusNPCInverter
+}
\ No newline at end of file
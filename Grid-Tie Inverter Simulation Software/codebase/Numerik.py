@@ -0,0 +1,35 @@
+import numpy as np
+
+# Numerical kernels shared by the electrical and thermal models
+
+def axis_weights(axis, x, uniform=False):
+    # Lower index and fraction of x on a table axis, held at the ends. uniform: the axis is evenly spaced, so the
+    # position follows from one division instead of a search.
+    if uniform:
+        pos = np.clip((x - axis[0]) / (axis[1] - axis[0]), 0, len(axis) - 1)
+    else:
+        pos = np.interp(x, axis, np.arange(len(axis)))  # Fractional index
+    idx = np.minimum(pos.astype(int), len(axis) - 2)
+    return idx, pos - idx
+
+def bilinear(table, weights):
+    # Bilinear in the first two table axes; weights: axis_weights of both axes joined, (i, f, j, g).
+    # The indices broadcast, so the weights of whole arrays can be reused for several tables.
+    i, f, j, g = weights
+    return ((1 - f) * ((1 - g) * table[i, j] + g * table[i, j + 1]) +
+            f * ((1 - g) * table[i + 1, j] + g * table[i + 1, j + 1]))
+
+def rc_response(current, a, gain, v0):
+    # Exact ZOH response of an RC pair along the last axis: v[k] = a * v[k-1] + gain * i[k].
+    # Solved in closed form per chunk; chunks keep a^-k inside the double range.
+    current = np.asarray(current, dtype=float)
+    log_a = np.log(a)
+    chunk = max(1, int(30 / max(-np.min(log_a), 1e-12)))
+    v = np.empty(np.broadcast_shapes(current.shape, np.shape(v0) + (1,)))
+    state = np.asarray(v0, dtype=float)
+    for start in range(0, current.shape[-1], chunk):
+        i = current[..., start:start + chunk]
+        powers = np.exp(log_a * np.arange(1, i.shape[-1] + 1))
+        v[..., start:start + i.shape[-1]] = powers * (state[..., np.newaxis] + gain * np.cumsum(i / powers, axis=-1))
+        state = v[..., start + i.shape[-1] - 1]
+    return v
\ No newline at end of file
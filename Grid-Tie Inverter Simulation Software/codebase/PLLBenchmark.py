@@ -0,0 +1,71 @@
+import time
+import numpy as np
+from GridFaults import FAULT_TYPES, THREE_PHASE_ANGLES, fault_frequency, grid_fault_voltage
+from Phasenregelkreis import PLL_TYPES
+
+# Headless PLL benchmark: lock time, steady-state phase error and CPU cost per sample.
+
+def wrap_phase(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+def benchmark_pll(pll_name, fault_mode, frequency=50, duration=0.5, time_step=1e-4, initial_phase_deg=90.0, lock_threshold_deg=2.0, steady_fraction=0.2):
+    samples = int(duration / time_step)
+    t = np.arange(samples) * time_step
+    initial_phase = np.radians(initial_phase_deg)  # Grid phase at t = 0, the PLLs start from zero
+    pll = PLL_TYPES[pll_name](frequency)
+    if pll.phases == 3:
+        grid_voltage = grid_fault_voltage(t, frequency, fault_mode, phase_angles=np.array(THREE_PHASE_ANGLES) + initial_phase).T
+    else:
+        grid_voltage = grid_fault_voltage(t, frequency, fault_mode, phase_angles=[initial_phase])[0]
+    # Python floats keep the per-sample loop free of numpy scalar overhead
+    grid_voltage = grid_voltage.tolist()
+    
+    phase = np.empty(samples)
+    start = time.perf_counter()
+    for n in range(samples):
+        phase[n] = pll.update(grid_voltage[n], time_step)
+    cpu_time = time.perf_counter() - start
+    
+    true_phase = 2 * np.pi * fault_frequency(frequency, fault_mode) * t + initial_phase
+    error_deg = np.degrees(wrap_phase(phase - true_phase))
+    
+    # Lock time: first instant after which the error stays inside the threshold
+    outside = np.nonzero(np.abs(error_deg) > lock_threshold_deg)[0]
+    if len(outside) == 0:
+        lock_time = 0.0
+    elif outside[-1] == samples - 1:
+        lock_time = np.inf
+    else:
+        lock_time = t[outside[-1] + 1]
+    
+    steady = error_deg[int((1 - steady_fraction) * samples):]
+    return {
+        'pll': pll_name,
+        'fault': fault_mode,
+        'lock_time': lock_time,
+        'phase_error_rms': np.sqrt(np.mean(steady ** 2)),
+        'phase_error_max': np.max(np.abs(steady)),
+        'cpu_per_sample': cpu_time / samples
+    }
+
+def run_pll_benchmark(pll_names=None, fault_modes=None, **kwargs):
+    pll_names = list(PLL_TYPES) if pll_names is None else pll_names
+    fault_modes = FAULT_TYPES if fault_modes is None else fault_modes
+    return [benchmark_pll(name, fault, **kwargs) for name in pll_names for fault in fault_modes]
+
+def cheapest_pll(results, max_lock_time=0.1, max_phase_error_deg=1.0):
+    # Cheapest PLL that meets both requirements under every benchmarked fault, or None
+    candidates = {}
+    for result in results:
+        ok = result['lock_time'] <= max_lock_time and result['phase_error_max'] <= max_phase_error_deg
+        cost, all_ok = candidates.get(result['pll'], (0.0, True))
+        candidates[result['pll']] = (max(cost, result['cpu_per_sample']), all_ok and ok)
+    passing = [(cost, name) for name, (cost, ok) in candidates.items() if ok]
+    return min(passing)[1] if passing else None
+
+if __name__ == '__main__':
+    results = run_pll_benchmark()
+    print(f"{'PLL':<10} {'Fault':<11} {'Lock (ms)':>10} {'RMS err (deg)':>14} {'Max err (deg)':>14} {'CPU (us/sample)':>16}")
+    for r in results:
+        print(f"{r['pll']:<10} {r['fault']:<11} {r['lock_time'] * 1e3:>10.1f} {r['phase_error_rms']:>14.3f} {r['phase_error_max']:>14.3f} {r['cpu_per_sample'] * 1e6:>16.2f}")
+    print(f"Cheapest PLL meeting requirements: {cheapest_pll(results)}")
\ No newline at end of file
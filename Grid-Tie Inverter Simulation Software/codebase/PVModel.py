@@ -0,0 +1,311 @@
+import numpy as np
+from Numerik import axis_weights, bilinear
+
+class PVModel:
+    # Shared PV array model. The I-V surface is tabulated once over (irradiance, temperature, V/V_oc)
+    # and every query after that is a vectorized table interpolation.
+    def __init__(self, irradiance_range=(0, 1500), temperature_range=(-20, 80), table_shape=(61, 41, 161), max_voltage_ratio=1.6):
+        self.V_oc_STC = 500  # Open-circuit voltage at STC (V)
+        self.I_sc_STC = 10   # Short-circuit current at STC (A)
+        self.T_STC = 25      # Standard test condition temperature (°C)
+        self.G_STC = 1000    # Standard test condition irradiance (W/m²)
+        self.alpha = 0.0005  # Current temperature coefficient (1/°C)
+        self.beta = -0.003   # Voltage temperature coefficient (1/°C)
+        self.irradiance_axis = np.linspace(irradiance_range[0], irradiance_range[1], table_shape[0])
+        self.temperature_axis = np.linspace(temperature_range[0], temperature_range[1], table_shape[1])
+        self.ratio_axis = np.linspace(0, max_voltage_ratio, table_shape[2])  # V / V_oc, covers the 100-800 V clip range
+        self.table = None
+        self._curve_key = None  # (irradiance, temperature) of the cached single curve
+        self._curve = None
+    
+    def short_circuit_current(self, irradiance, temperature):
+        return self.I_sc_STC * (np.asarray(irradiance) / self.G_STC) * (1 + self.alpha * (np.asarray(temperature) - self.T_STC))
+    
+    def open_circuit_voltage(self, irradiance, temperature):
+        return self.V_oc_STC * (1 + self.beta * (np.asarray(temperature) - self.T_STC))
+    
+    def compute_current(self, voltage, irradiance, temperature):
+        # Exact model evaluation, used to fill the table: I = I_sc * (1 - (V/V_oc)^2)
+        I_sc = self.short_circuit_current(irradiance, temperature)
+        V_oc = self.open_circuit_voltage(irradiance, temperature)
+        return I_sc * (1 - (np.asarray(voltage) / V_oc) ** 2)
+    
+    def build_table(self):
+        G, T = np.meshgrid(self.irradiance_axis, self.temperature_axis, indexing='ij')
+        V_oc = np.broadcast_to(self.open_circuit_voltage(G, T), G.shape)
+        V = V_oc[..., np.newaxis] * self.ratio_axis
+        I = self.compute_current(V, G[..., np.newaxis], T[..., np.newaxis])
+        P = V * I
+        
+        # MPP from the sampled P-V curve, refined with a parabola through the neighbouring points
+        k = np.clip(np.argmax(P, axis=-1), 1, len(self.ratio_axis) - 2)
+        p0, p1, p2 = [np.take_along_axis(P, (k + d)[..., np.newaxis], axis=-1)[..., 0] for d in (-1, 0, 1)]
+        denom = p0 - 2 * p1 + p2
+        offset = np.where(np.abs(denom) > 1e-12, 0.5 * (p0 - p2) / np.where(denom == 0, 1, denom), 0)
+        step = self.ratio_axis[1] - self.ratio_axis[0]
+        V_mpp = V_oc * (self.ratio_axis[k] + np.clip(offset, -1, 1) * step)
+        I_mpp = self.compute_current(V_mpp, G, T)
+        self.table = {'V_oc': V_oc, 'current': I, 'V_mpp': V_mpp, 'I_mpp': I_mpp, 'P_mpp': V_mpp * I_mpp}
+        self._curve_key = None
+    
+    def _surface_weights(self, irradiance, temperature):
+        if self.table is None:
+            self.build_table()
+        return axis_weights(self.irradiance_axis, irradiance, uniform=True) + axis_weights(self.temperature_axis, temperature, uniform=True)
+    
+    def curve(self, irradiance=1000, temperature=25):
+        # Single I-V curve (V_oc, current over ratio_axis), reused while the conditions stay the same
+        key = (float(irradiance), float(temperature))
+        if key != self._curve_key:
+            weights = self._surface_weights(np.asarray(key[0]), np.asarray(key[1]))
+            self._curve = (float(bilinear(self.table['V_oc'], weights)), bilinear(self.table['current'], weights).tolist())
+            self._curve_key = key
+        return self._curve
+    
+    def current(self, voltage, irradiance=1000, temperature=25):
+        if np.isscalar(voltage) and np.isscalar(irradiance) and np.isscalar(temperature):
+            # Scalar fast path on the cached curve, plain float arithmetic
+            V_oc, I = self.curve(irradiance, temperature)
+            if V_oc <= 0:
+                return 0.0  # No irradiance, no current
+            step = self.ratio_axis[1]
+            pos = min(max(voltage / V_oc / step, 0.0), len(I) - 1.0)
+            idx = min(int(pos), len(I) - 2)
+            frac = pos - idx
+            return (1 - frac) * I[idx] + frac * I[idx + 1]
+        voltage, irradiance, temperature = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in (voltage, irradiance, temperature)])
+        weights = self._surface_weights(irradiance, temperature)
+        i_g, f_g, i_t, f_t = weights
+        V_oc = bilinear(self.table['V_oc'], weights)
+        i_u, f_u = axis_weights(self.ratio_axis, np.where(V_oc > 0, voltage, 0.0) / np.where(V_oc > 0, V_oc, 1.0), uniform=True)
+        table = self.table['current']
+        
+        def along_ratio(ig, it):
+            return (1 - f_u) * table[ig, it, i_u] + f_u * table[ig, it, i_u + 1]
+        
+        I = ((1 - f_g) * ((1 - f_t) * along_ratio(i_g, i_t) + f_t * along_ratio(i_g, i_t + 1)) +
+             f_g * ((1 - f_t) * along_ratio(i_g + 1, i_t) + f_t * along_ratio(i_g + 1, i_t + 1)))
+        return I if I.ndim else float(I)
+    
+    def power(self, voltage, irradiance=1000, temperature=25):
+        return voltage * self.current(voltage, irradiance, temperature)
+    
+    def mpp(self, irradiance=1000, temperature=25):
+        # (V_mpp, I_mpp, P_mpp) at the given conditions
+        irradiance, temperature = np.broadcast_arrays(np.asarray(irradiance, dtype=float), np.asarray(temperature, dtype=float))
+        weights = self._surface_weights(irradiance, temperature)
+        result = tuple(bilinear(self.table[name], weights) for name in ('V_mpp', 'I_mpp', 'P_mpp'))
+        return result if irradiance.ndim else tuple(float(x) for x in result)
+    
+    def limits(self, irradiance=1000, temperature=25):
+        # (I_sc, V_oc) at the given conditions
+        weights = self._surface_weights(np.asarray(irradiance, dtype=float), np.asarray(temperature, dtype=float))
+        V_oc = bilinear(self.table['V_oc'], weights)
+        I_sc = self.current(0.0 * V_oc, irradiance, temperature)
+        return (I_sc, V_oc) if np.ndim(V_oc) else (float(I_sc), float(V_oc))
+
+BOLTZMANN = 1.380649e-23  # J/K
+ELECTRON_CHARGE = 1.602176634e-19  # C
+
+def lambertw_exp(x):
+    # W(exp(x)) for real x, solved in log space (w + ln w = x) so large arguments cannot overflow
+    x = np.asarray(x, dtype=float)
+    ex = np.exp(np.minimum(x, 1.0))
+    w = np.where(x > 1, x - np.log(np.maximum(x, 1.0)), ex / (1 + ex))
+    tiny = x < -690  # W(e^x) = e^x below the double range
+    w = np.where(tiny, 1.0, w)
+    for _ in range(4):  # Halley iterations, cubic convergence
+        f = w + np.log(w) - x
+        w = np.maximum(w - f * w / (1 + w) / (1 + f / (2 * (1 + w) ** 2)), 1e-300)
+    return np.where(tiny, 0.0, w)
+
+class SingleDiodeModel(PVModel):
+    # Single-diode (optionally double-diode) string of identical modules, De Soto temperature/irradiance scaling.
+    # Defaults give 13 x 60-cell modules per string, close to the 500 V / 10 A rating used so far.
+    def __init__(self, modules_series=13, strings_parallel=1, cells=60, I_sc_module=10.0, V_oc_module=38.5,
+                 ideality=1.2, R_s=0.3, R_sh=400.0, I_02=0.0, **table_kwargs):
+        super().__init__(**table_kwargs)
+        self.modules_series = modules_series
+        self.strings_parallel = strings_parallel
+        self.cells = cells
+        self.ideality = ideality
+        self.R_s = R_s          # Series resistance per module (Ohm)
+        self.R_sh_STC = R_sh    # Shunt resistance per module at STC (Ohm)
+        self.I_02 = I_02        # Second-diode saturation current (A), 0 = single-diode
+        self.E_g_STC = 1.121    # Band gap at STC (eV)
+        self.dE_g_dT = -0.0002677
+        self.V_oc_STC = modules_series * V_oc_module
+        self.I_sc_STC = strings_parallel * I_sc_module
+        
+        # Fit photo and saturation current to I_sc / V_oc at STC
+        a = self.modified_ideality(self.T_STC)
+        I_L, I_0 = I_sc_module, 0.0
+        for _ in range(5):
+            I_0 = (I_L - V_oc_module / R_sh) / np.expm1(V_oc_module / a)
+            I_L = I_sc_module * (1 + R_s / R_sh) + I_0 * np.expm1(I_sc_module * R_s / a)
+        self.I_L_STC = I_L
+        self.I_0_STC = I_0
+    
+    def modified_ideality(self, temperature, cells=None):
+        T = np.asarray(temperature, dtype=float) + 273.15
+        return self.ideality * (self.cells if cells is None else cells) * BOLTZMANN * T / ELECTRON_CHARGE
+    
+    def diode_parameters(self, irradiance, temperature, fraction=1.0):
+        # (I_L, I_0, a, R_s, R_sh) for a fraction of the module's cells (bypass-diode substring)
+        G = np.maximum(np.asarray(irradiance, dtype=float), 1e-3)
+        T = np.asarray(temperature, dtype=float) + 273.15
+        T_ref = self.T_STC + 273.15
+        I_L = G / self.G_STC * self.I_L_STC * (1 + self.alpha * (T - T_ref))
+        E_g = self.E_g_STC * (1 + self.dE_g_dT * (T - T_ref))
+        k_eV = BOLTZMANN / ELECTRON_CHARGE
+        I_0 = self.I_0_STC * (T / T_ref) ** 3 * np.exp(self.E_g_STC / (k_eV * T_ref) - E_g / (k_eV * T))
+        a = self.modified_ideality(temperature) * fraction
+        R_sh = self.R_sh_STC * self.G_STC / G * fraction
+        return I_L, I_0, a, self.R_s * fraction, R_sh
+    
+    def module_current(self, voltage, irradiance, temperature, fraction=1.0):
+        I_L, I_0, a, R_s, R_sh = self.diode_parameters(irradiance, temperature, fraction)
+        V = np.asarray(voltage, dtype=float)
+        R_tot = R_s + R_sh
+        log_theta = np.log(R_s * R_sh * I_0 / (a * R_tot)) + R_sh * (R_s * (I_L + I_0) + V) / (a * R_tot)
+        I = (R_sh * (I_L + I_0) - V) / R_tot - a / R_s * lambertw_exp(log_theta)
+        if self.I_02 > 0:
+            I = self._newton_current(I, V, I_L, I_0, a, R_s, R_sh, irradiance, temperature, fraction)
+        return I
+    
+    def module_voltage(self, current, irradiance, temperature, fraction=1.0):
+        I_L, I_0, a, R_s, R_sh = self.diode_parameters(irradiance, temperature, fraction)
+        I = np.asarray(current, dtype=float)
+        log_psi = np.log(I_0 * R_sh / a) + R_sh * (I_L + I_0 - I) / a
+        V = (I_L + I_0 - I) * R_sh - I * R_s - a * lambertw_exp(log_psi)
+        if self.I_02 > 0:
+            V = self._newton_voltage(V, I, I_L, I_0, a, R_s, R_sh, temperature, fraction)
+        return V
+    
+    def _double_diode_residual(self, V, I, I_L, I_0, a, R_s, R_sh, temperature, fraction):
+        # Residual of the double-diode equation and its derivative w.r.t. the diode voltage V + I*R_s
+        a_2 = 2 * self.modified_ideality(temperature) * fraction
+        V_d = V + I * R_s
+        e_1 = np.exp(np.minimum(V_d / a, 700))
+        e_2 = np.exp(np.minimum(V_d / a_2, 700))
+        residual = I_L - I_0 * (e_1 - 1) - self.I_02 * (e_2 - 1) - V_d / R_sh - I
+        slope = -I_0 * e_1 / a - self.I_02 * e_2 / a_2 - 1 / R_sh
+        return residual, slope
+    
+    def _newton_current(self, I, V, I_L, I_0, a, R_s, R_sh, irradiance, temperature, fraction):
+        for _ in range(8):
+            residual, slope = self._double_diode_residual(V, I, I_L, I_0, a, R_s, R_sh, temperature, fraction)
+            I = I - residual / (slope * R_s - 1)
+        return I
+    
+    def _newton_voltage(self, V, I, I_L, I_0, a, R_s, R_sh, temperature, fraction):
+        for _ in range(8):
+            residual, slope = self._double_diode_residual(V, I, I_L, I_0, a, R_s, R_sh, temperature, fraction)
+            V = V - residual / slope
+        return V
+    
+    def short_circuit_current(self, irradiance, temperature):
+        return self.strings_parallel * self.module_current(0.0, irradiance, temperature)
+    
+    def open_circuit_voltage(self, irradiance, temperature):
+        V_oc = self.modules_series * self.module_voltage(0.0, irradiance, temperature)
+        return np.where(np.asarray(irradiance) > 0, V_oc, 0.0)
+    
+    def compute_current(self, voltage, irradiance, temperature):
+        I = self.strings_parallel * self.module_current(np.asarray(voltage) / self.modules_series, irradiance, temperature)
+        return np.where(np.asarray(irradiance) > 0, I, 0.0)
+
+class PVArray:
+    # Series/parallel array of SingleDiodeModel modules with per-module (or per-substring) irradiance and
+    # temperature and one bypass diode per substring. Curves are multi-peak under partial shading.
+    def __init__(self, modules_series=13, strings_parallel=1, bypass_diodes=3, V_bypass=0.5, module=None, curve_points=400):
+        self.module = module if module is not None else SingleDiodeModel(modules_series=1)
+        self.modules_series = modules_series
+        self.strings_parallel = strings_parallel
+        self.bypass_diodes = bypass_diodes
+        self.V_bypass = V_bypass  # Forward drop of a conducting bypass diode (V)
+        self.curve_points = curve_points
+        self.set_conditions(1000, 25)
+    
+    def set_conditions(self, irradiance, temperature):
+        # Scalars, (strings, modules) or (strings, modules, bypass_diodes) arrays
+        shape = (self.strings_parallel, self.modules_series, self.bypass_diodes)
+        G = np.asarray(irradiance, dtype=float)
+        T = np.asarray(temperature, dtype=float)
+        G = np.broadcast_to(G[..., np.newaxis] if G.ndim == 2 else G, shape)
+        T = np.broadcast_to(T[..., np.newaxis] if T.ndim == 2 else T, shape)
+        conditions = (G.tobytes(), T.tobytes())
+        if getattr(self, 'conditions', None) != conditions:
+            self.conditions = conditions
+            self.irradiance, self.temperature = G, T
+            self.curve_voltage = None
+    
+    def string_curves(self):
+        # Voltage of every distinct string over a shared current grid: (unique strings, counts, I grid, V)
+        pairs = np.stack((self.irradiance.ravel(), self.temperature.ravel()), axis=1)
+        unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+        inverse = inverse.reshape(self.strings_parallel, -1)
+        
+        I_max = 1.05 * np.max(self.module.short_circuit_current(unique_pairs[:, 0], unique_pairs[:, 1]))
+        I_grid = np.linspace(0, max(I_max, 1e-6), self.curve_points)
+        fraction = 1.0 / self.bypass_diodes
+        V_sub = self.module.module_voltage(I_grid, unique_pairs[:, [0]], unique_pairs[:, [1]], fraction)
+        V_sub = np.where(unique_pairs[:, [0]] > 0, V_sub, -self.V_bypass)
+        V_sub = np.maximum(V_sub, -self.V_bypass)  # Bypass diode clamps reverse-biased substrings
+        
+        # Substrings per (string, condition), then string voltage = counts @ substring voltages
+        counts = np.zeros((self.strings_parallel, len(unique_pairs)))
+        np.add.at(counts, (np.repeat(np.arange(self.strings_parallel), inverse.shape[1]), inverse.ravel()), 1)
+        unique_counts, string_multiplicity = np.unique(counts, axis=0, return_counts=True)
+        return unique_counts @ V_sub, string_multiplicity, I_grid
+    
+    def iv_curve(self):
+        # Array I-V curve on a voltage grid, cached until the conditions change
+        if self.curve_voltage is None:
+            V_strings, multiplicity, I_grid = self.string_curves()
+            V_grid = np.linspace(0, max(np.max(V_strings[:, 0]), 1e-6), self.curve_points)
+            I_array = np.zeros_like(V_grid)
+            for V_string, n in zip(V_strings, multiplicity):
+                # Blocking diodes: strings never sink current above their open-circuit voltage
+                I_array += n * np.interp(V_grid, V_string[::-1], I_grid[::-1])
+            self.curve_voltage, self.curve_current = V_grid, I_array
+        return self.curve_voltage, self.curve_current
+    
+    # Same query interface as PVModel, so a shaded array can stand in as any MPPT's pv_model.
+    # Conditions passed here replace the current ones (scalars or per-module arrays); None keeps them.
+    def _conditions(self, irradiance, temperature):
+        if irradiance is not None:
+            self.set_conditions(irradiance, 25 if temperature is None else temperature)
+    
+    def current(self, voltage, irradiance=None, temperature=None):
+        self._conditions(irradiance, temperature)
+        V_grid, I_grid = self.iv_curve()
+        I = np.interp(voltage, V_grid, I_grid, right=0.0)
+        return I if np.ndim(I) else float(I)
+    
+    def power(self, voltage, irradiance=None, temperature=None):
+        return voltage * self.current(voltage, irradiance, temperature)
+    
+    def limits(self, irradiance=None, temperature=None):
+        # (I_sc, V_oc) of the array
+        self._conditions(irradiance, temperature)
+        V_grid, I_grid = self.iv_curve()
+        return float(I_grid[0]), float(V_grid[-1])
+    
+    def local_maxima(self, irradiance=None, temperature=None):
+        # All peaks of the P-V curve as (V, P) pairs, highest first
+        self._conditions(irradiance, temperature)
+        V_grid, I_grid = self.iv_curve()
+        P = V_grid * I_grid
+        peaks = np.nonzero((P[1:-1] > P[:-2]) & (P[1:-1] >= P[2:]))[0] + 1
+        return sorted(((float(V_grid[k]), float(P[k])) for k in peaks), key=lambda peak: -peak[1])
+    
+    def mpp(self, irradiance=None, temperature=None):
+        # Global maximum power point (V, I, P) of the cached curve
+        self._conditions(irradiance, temperature)
+        V_grid, I_grid = self.iv_curve()
+        P = V_grid * I_grid
+        k = int(np.argmax(P))
+        return float(V_grid[k]), float(I_grid[k]), float(P[k])
+
+shared_pv_model = SingleDiodeModel()  # Default instance shared by PVPanel and the MPPT algorithms
\ No newline at end of file
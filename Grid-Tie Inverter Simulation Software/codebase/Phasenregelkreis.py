@@ -1,39 +1,227 @@
+import math
 import numpy as np
 
-class PLL(object):
+TWO_PI = 2 * math.pi
+INV_SQRT3 = 1 / math.sqrt(3)
+
+# Phase convention for the alternative PLLs: v_a = V * sin(theta), matching GridSimulationWindow.
+
+def clarke_transform(v_abc):
+    # Amplitude-invariant abc -> alpha/beta, works on (3,) or (3, samples) arrays
+    v_abc = np.asarray(v_abc, dtype=float)
+    alpha = (2 * v_abc[0] - v_abc[1] - v_abc[2]) / 3
+    beta = (v_abc[1] - v_abc[2]) / np.sqrt(3)
+    return np.array([alpha, beta])
+
+def inverse_clarke_transform(v_alphabeta):
+    v_alphabeta = np.asarray(v_alphabeta, dtype=float)
+    alpha, beta = v_alphabeta[0], v_alphabeta[1]
+    return np.array([alpha, -0.5 * alpha + np.sqrt(3) / 2 * beta, -0.5 * alpha - np.sqrt(3) / 2 * beta])
+
+def park_transform(v_alphabeta, theta):
+    # alpha/beta -> dq; d carries the amplitude and q = V * sin(theta_grid - theta) when locked
+    v_alphabeta = np.asarray(v_alphabeta, dtype=float)
+    sin_t, cos_t = np.sin(theta), np.cos(theta)
+    d = v_alphabeta[0] * sin_t - v_alphabeta[1] * cos_t
+    q = v_alphabeta[0] * cos_t + v_alphabeta[1] * sin_t
+    return np.array([d, q])
+
+def inverse_park_transform(v_dq, theta):
+    v_dq = np.asarray(v_dq, dtype=float)
+    sin_t, cos_t = np.sin(theta), np.cos(theta)
+    alpha = v_dq[0] * sin_t + v_dq[1] * cos_t
+    beta = -v_dq[0] * cos_t + v_dq[1] * sin_t
+    return np.array([alpha, beta])
+
+def abc_to_dq_matrix(theta):
+    # Clarke and Park transforms combined for a whole array of angles: (..., 2, 3) with i_dq = T @ i_abc
+    angles = np.asarray(theta, dtype=float)[..., np.newaxis] + np.array([0, -2 * np.pi / 3, 2 * np.pi / 3])
+    return 2 / 3 * np.stack((np.sin(angles), np.cos(angles)), axis=-2)
+
+def dq_to_abc_matrix(theta):
+    # Inverse transforms for a whole array of angles: (..., 3, 2) with v_abc = T @ v_dq
+    angles = np.asarray(theta, dtype=float)[..., np.newaxis] + np.array([0, -2 * np.pi / 3, 2 * np.pi / 3])
+    return np.stack((np.sin(angles), np.cos(angles)), axis=-1)
+
+class PhaseLockedLoop:
+    phases = 1  # Number of grid voltages expected by update()
+    
+    def update_parameters(self, frequency):
+        pass
+    
+    def update(self, grid_voltage, time_step):
+        pass
+    
+    def reset(self):
+        pass
+
+class PLL(PhaseLockedLoop):
+    # SOGI tuned to the loop's frequency estimate; a PI loop (20 Hz bandwidth, damping 0.707 as in SRFPLL) locks the
+    # phase to the angle of its quadrature pair and takes up frequency deviations in its integrator
     def __init__(self, frequency):
         self.frequency = frequency
         self.omega = 2 * np.pi * frequency
-        self.k = 0.5  # SOGI gain
-        self.Kp = 2.0  # PI proportional gain
-        self.Ki = 100.0  # PI integral gain
-        self.integral_error = 0
-        self.phase = 0
-        self.q = 0  # Quadrature signal
-        self.v = 0  # Inverter signal
+        self.k = np.sqrt(2)  # SOGI gain
+        self.Kp = 2 * 0.707 * 2 * np.pi * 20  # PI proportional gain
+        self.Ki = (2 * np.pi * 20) ** 2  # PI integral gain
+        self.omega_limit = 0.2 * self.omega  # Clamp on the PI frequency correction
+        self.sogi = SOGI(self.k)
+        self.reset()
     
     def update_parameters(self, frequency):
         self.frequency = frequency
         self.omega = 2 * np.pi * frequency
+        self.omega_limit = 0.2 * self.omega
     
     def update(self, grid_voltage, time_step):
-        # Handle frequency shifts
-        v_error = grid_voltage - self.v
-        self.v += time_step * (self.k * v_error * self.omega - self.q * self.omega**2)
-        self.q += time_step * self.v
+        # Advance to this sample with the last frequency estimate, then correct it. With v_a = V sin(theta) the
+        # quadrature signal is -V cos(theta).
+        self.phase = (self.phase + self.omega_pll * time_step) % TWO_PI
+        # Tuned to the frequency estimate in the integrator, prewarped so the Tustin-discretized SOGI passes it without phase shift
+        omega = self.omega + self.integral_error
+        v, qv = self.sogi.update(grid_voltage, 2 / time_step * math.tan(0.5 * omega * time_step), time_step)
+        theta = math.atan2(v, -qv) if v != 0 or qv != 0 else self.phase
+        phase_error = math.sin(theta - self.phase)
         
-        theta = np.arctan2(self.q, self.v) if self.v != 0 else self.phase
-        phase_error = np.sin(theta - self.phase)
-        
-        self.integral_error += phase_error * time_step
-        omega_adjust = self.Kp * phase_error + self.Ki * self.integral_error
-        self.phase += (self.omega + omega_adjust) * time_step
-        self.phase = self.phase % (2 * np.pi)
+        self.integral_error += self.Ki * phase_error * time_step
+        self.integral_error = min(max(self.integral_error, -self.omega_limit), self.omega_limit)
+        omega_adjust = min(max(self.Kp * phase_error + self.integral_error, -self.omega_limit), self.omega_limit)
+        self.omega_pll = self.omega + omega_adjust
         
         return self.phase
     
     def reset(self):
+        self.sogi.reset()
         self.integral_error = 0
         self.phase = 0
-        self.q = 0
-        self.v = 0
\ No newline at end of file
+        self.omega_pll = self.omega  # Frequency estimate of the loop
+
+class SOGI:
+    # Second-order generalized integrator (quadrature signal generator), Tustin-discretized.
+    # v follows the input in phase, qv lags it by 90°.
+    def __init__(self, k=np.sqrt(2)):
+        self.k = k
+        self.v = 0.0
+        self.qv = 0.0
+        self.prev_input = 0.0
+    
+    def update(self, u, omega, time_step):
+        a = 0.5 * omega * time_step
+        ka = self.k * a
+        r0 = (1 - ka) * self.v - a * self.qv + ka * (u + self.prev_input)
+        r1 = a * self.v + self.qv
+        det = 1 + ka + a * a
+        self.v = (r0 - a * r1) / det
+        self.qv = (a * r0 + (1 + ka) * r1) / det
+        self.prev_input = u
+        return self.v, self.qv
+    
+    def reset(self):
+        self.v = 0.0
+        self.qv = 0.0
+        self.prev_input = 0.0
+
+class SRFPLL(PhaseLockedLoop):
+    # Synchronous-reference-frame PLL for three-phase grids: PI loop drives v_q to zero
+    phases = 3
+    
+    def __init__(self, frequency, bandwidth=20.0, damping=0.707):
+        self.frequency = frequency
+        self.omega_nom = 2 * np.pi * frequency
+        omega_n = 2 * np.pi * bandwidth
+        self.Kp = 2 * damping * omega_n  # PI gains on the normalized q error
+        self.Ki = omega_n ** 2
+        self.omega_limit = 0.2 * self.omega_nom  # Clamp on the PI frequency correction
+        self.reset()
+    
+    def update_parameters(self, frequency):
+        self.frequency = frequency
+        self.omega_nom = 2 * np.pi * frequency
+        self.omega_limit = 0.2 * self.omega_nom
+    
+    def loop_filter(self, v_alpha, v_beta, time_step):
+        # Advance to this sample with the last frequency estimate, then correct the frequency
+        self.phase = (self.phase + self.omega * time_step) % TWO_PI
+        sin_t, cos_t = math.sin(self.phase), math.cos(self.phase)
+        v_d = v_alpha * sin_t - v_beta * cos_t
+        v_q = v_alpha * cos_t + v_beta * sin_t
+        amplitude = math.hypot(v_d, v_q)
+        phase_error = v_q / amplitude if amplitude > 1e-6 else 0.0
+        
+        self.integral_error += self.Ki * phase_error * time_step
+        self.integral_error = min(max(self.integral_error, -self.omega_limit), self.omega_limit)
+        omega_adjust = min(max(self.Kp * phase_error + self.integral_error, -self.omega_limit), self.omega_limit)
+        self.omega = self.omega_nom + omega_adjust
+        self.amplitude = v_d
+        return self.phase
+    
+    def update(self, grid_voltage, time_step):
+        v_a, v_b, v_c = grid_voltage
+        v_alpha = (2 * v_a - v_b - v_c) / 3
+        v_beta = (v_b - v_c) * INV_SQRT3
+        return self.loop_filter(v_alpha, v_beta, time_step)
+    
+    def reset(self):
+        self.integral_error = 0.0
+        self.phase = 0.0
+        self.omega = self.omega_nom
+        self.amplitude = 0.0
+
+class DSOGIPLL(SRFPLL):
+    # Dual SOGI on alpha/beta extracts the positive sequence before the SRF loop (unbalanced grids)
+    def __init__(self, frequency, bandwidth=20.0, damping=0.707, k=np.sqrt(2)):
+        self.sogi_alpha = SOGI(k)
+        self.sogi_beta = SOGI(k)
+        super().__init__(frequency, bandwidth, damping)
+    
+    def update(self, grid_voltage, time_step):
+        v_a, v_b, v_c = grid_voltage
+        v_alpha, qv_alpha = self.sogi_alpha.update((2 * v_a - v_b - v_c) / 3, self.omega, time_step)
+        v_beta, qv_beta = self.sogi_beta.update((v_b - v_c) * INV_SQRT3, self.omega, time_step)
+        # Positive-sequence calculator
+        v_alpha_pos = 0.5 * (v_alpha - qv_beta)
+        v_beta_pos = 0.5 * (qv_alpha + v_beta)
+        return self.loop_filter(v_alpha_pos, v_beta_pos, time_step)
+    
+    def reset(self):
+        super().reset()
+        self.sogi_alpha.reset()
+        self.sogi_beta.reset()
+
+class SOGIFLL(PhaseLockedLoop):
+    # Single-phase SOGI with a frequency-locked loop; phase comes straight from the quadrature pair
+    def __init__(self, frequency, k=np.sqrt(2), gamma=50.0):
+        self.frequency = frequency
+        self.omega_nom = 2 * np.pi * frequency
+        self.gamma = gamma  # Normalized FLL gain
+        self.sogi = SOGI(k)
+        self.reset()
+    
+    def update_parameters(self, frequency):
+        self.frequency = frequency
+        self.omega_nom = 2 * np.pi * frequency
+    
+    def update(self, grid_voltage, time_step):
+        v, qv = self.sogi.update(grid_voltage, self.omega, time_step)
+        energy = v * v + qv * qv
+        if energy > 1e-6:
+            # Frequency error = qv * (u - v), normalized by the squared amplitude
+            freq_error = qv * (grid_voltage - v)
+            self.omega -= self.gamma * self.sogi.k * self.omega * freq_error / energy * time_step
+            self.omega = min(max(self.omega, 0.5 * self.omega_nom), 1.5 * self.omega_nom)
+        self.amplitude = math.sqrt(energy)
+        self.phase = math.atan2(v, -qv) % TWO_PI
+        return self.phase
+    
+    def reset(self):
+        self.sogi.reset()
+        self.omega = self.omega_nom
+        self.phase = 0.0
+        self.amplitude = 0.0
+
+PLL_TYPES = {
+    "SOGI-PLL": PLL,
+    "SRF-PLL": SRFPLL,
+    "DSOGI-PLL": DSOGIPLL,
+    "SOGI-FLL": SOGIFLL
+}
\ No newline at end of file
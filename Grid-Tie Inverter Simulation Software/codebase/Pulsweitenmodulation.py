@@ -0,0 +1,235 @@
+import numpy as np
+
+# Carrier-based and space-vector PWM for multilevel legs, computed per carrier period instead of per sample.
+# The reference is sampled once per carrier period at the carrier peak (symmetric regular sampling), which puts
+# every pulse edge in closed form. The output is kept as switching events (time, level index), so edges keep full
+# floating-point resolution at any switching frequency and only the changes are stored.
+
+PWM_TECHNIQUES = ["Phase Disposition", "Phase Opposition Disposition", "Alternative Phase Opposition Disposition",
+                  "Phase Shifted", "Space Vector", "Nearest Level"]
+PWM_ALIASES = {"Multicarrier": "Phase Disposition"}  # Name used by older settings
+CARRIER_SCHEMES = {
+    "Phase Disposition": "PD",
+    "Phase Opposition Disposition": "POD",
+    "Alternative Phase Opposition Disposition": "APOD",
+    "Phase Shifted": "PS",
+    "Space Vector": "PD"
+}
+
+class SwitchingEvents:
+    # Switched leg voltages as a piecewise-constant waveform: level index of every phase at t_start, then the new
+    # index at each switching instant. Averages, RMS and Fourier coefficients are exact integrals over the constant
+    # pieces, and values on a time grid are only produced when sample()/resample() is called.
+    def __init__(self, t_start, t_end, levels, initial, times, indices):
+        self.t_start = t_start
+        self.t_end = t_end
+        self.levels = np.asarray(levels, dtype=float)
+        self.initial = np.asarray(initial, dtype=int)  # (phases,)
+        self.times = times      # Per phase: event times, strictly increasing
+        self.indices = indices  # Per phase: level index after each event
+    
+    @classmethod
+    def from_samples(cls, time, index, levels):
+        # Events at the sample instants where a sampled level sequence (phases, samples) changes
+        index = np.atleast_2d(index)
+        changes = [np.nonzero(np.diff(row))[0] + 1 for row in index]
+        return cls(time[0], time[-1], levels, index[:, 0], [time[c] for c in changes], [row[c] for row, c in zip(index, changes)])
+    
+    def level_index(self, t):
+        t = np.asarray(t, dtype=float)
+        result = np.empty((len(self.times),) + t.shape, dtype=int)
+        for p, (times, indices) in enumerate(zip(self.times, self.indices)):
+            k = np.searchsorted(times, t, side='right') - 1
+            result[p] = np.where(k >= 0, indices[np.maximum(k, 0)], self.initial[p])
+        return result
+    
+    def sample(self, t):
+        # Instantaneous leg voltage (phases, len(t))
+        return self.levels[self.level_index(t)]
+    
+    def resample(self, time_step, t0=None, t1=None):
+        # Dense grid over [t0, t1) for plotting or sample-based post-processing
+        t = np.arange(self.t_start if t0 is None else t0, self.t_end if t1 is None else t1, time_step)
+        return t, self.sample(t)
+    
+    def segments(self, p, t0=None, t1=None):
+        # Boundaries and values of the constant pieces of phase p inside [t0, t1]
+        t0 = self.t_start if t0 is None else t0
+        t1 = self.t_end if t1 is None else t1
+        times = self.times[p]
+        values = self.levels[np.concatenate(([self.initial[p]], self.indices[p])).astype(int)]
+        lo = np.searchsorted(times, t0, side='right')
+        hi = np.searchsorted(times, t1, side='left')
+        return np.concatenate(([t0], times[lo:hi], [t1])), values[lo:hi + 1]
+    
+    def integral(self, t0=None, t1=None, power=1):
+        # Exact integral of v(t)^power per phase
+        result = []
+        for p in range(len(self.times)):
+            bounds, values = self.segments(p, t0, t1)
+            result.append(np.sum(values ** power * np.diff(bounds)))
+        return np.array(result)
+    
+    def average(self, t0=None, t1=None):
+        t0 = self.t_start if t0 is None else t0
+        t1 = self.t_end if t1 is None else t1
+        return self.integral(t0, t1) / (t1 - t0)
+    
+    def rms(self, t0=None, t1=None):
+        t0 = self.t_start if t0 is None else t0
+        t1 = self.t_end if t1 is None else t1
+        return np.sqrt(self.integral(t0, t1, power=2) / (t1 - t0))
+    
+    def fourier(self, frequencies, t0=None, t1=None, block=1 << 21):
+        # Complex Fourier coefficients c(f) = 1/T * integral v(t) exp(-j 2 pi f t) dt over [t0, t1], per phase.
+        # Each constant piece is a rectangular pulse with a closed-form transform; frequencies are processed in
+        # blocks so that (frequencies x pieces) stays bounded.
+        t0 = self.t_start if t0 is None else t0
+        t1 = self.t_end if t1 is None else t1
+        omega = 2 * np.pi * np.atleast_1d(np.asarray(frequencies, dtype=float))
+        result = np.zeros((len(self.times), len(omega)), dtype=complex)
+        for p in range(len(self.times)):
+            bounds, values = self.segments(p, t0, t1)
+            step = max(1, block // len(bounds))
+            for start in range(0, len(omega), step):
+                w = omega[start:start + step, np.newaxis]
+                zero = w == 0
+                w_safe = np.where(zero, 1.0, w)
+                edges = np.exp(-1j * w_safe * (bounds[np.newaxis, :] - t0))  # Phase referred to t0
+                pieces = values * (edges[:, :-1] - edges[:, 1:]) / (1j * w_safe)
+                pieces = np.where(zero, values * np.diff(bounds), pieces)
+                result[p, start:start + step] = np.sum(pieces, axis=-1) / (t1 - t0)
+        return result
+    
+    def harmonics(self, fundamental, max_order=100, t0=None, t1=None):
+        # Amplitude of each harmonic order 0..max_order per phase (order 0 is the mean); use whole fundamental periods
+        c = self.fourier(fundamental * np.arange(max_order + 1), t0, t1)
+        amplitude = 2 * np.abs(c)
+        amplitude[:, 0] = np.abs(c[:, 0])
+        return amplitude
+    
+    def thd(self, fundamental, max_order=100, t0=None, t1=None):
+        # max_order None: every order, from the exact RMS instead of a sum over the harmonics
+        if max_order is None:
+            amplitude = self.harmonics(fundamental, 1, t0, t1)
+            distortion = self.rms(t0, t1) ** 2 - amplitude[:, 0] ** 2 - amplitude[:, 1] ** 2 / 2
+            return np.sqrt(2 * np.maximum(distortion, 0)) / amplitude[:, 1]
+        amplitude = self.harmonics(fundamental, max_order, t0, t1)
+        return np.sqrt(np.sum(amplitude[:, 2:] ** 2, axis=-1)) / amplitude[:, 1]
+    
+    def append(self, other):
+        # Joins the next window; events of the other window before this one's end (overlapping windows) are dropped.
+        # The level the other window holds at this one's end becomes an event there, so the join keeps its value.
+        times, indices = [], []
+        joined = other.level_index(self.t_end)
+        for p in range(len(self.times)):
+            keep = other.times[p] > self.t_end
+            t = np.concatenate((self.times[p], [self.t_end], other.times[p][keep]))
+            index = np.concatenate((self.indices[p], [joined[p]], other.indices[p][keep]))
+            previous = np.concatenate(([self.initial[p]], index[:-1]))
+            moved = index != previous
+            times.append(t[moved])
+            indices.append(index[moved])
+        return SwitchingEvents(self.t_start, max(self.t_end, other.t_end), self.levels, self.initial, times, indices)
+    
+    def nbytes(self):
+        return sum(times.nbytes + indices.nbytes for times, indices in zip(self.times, self.indices)) + self.initial.nbytes
+    
+    def event_count(self):
+        return np.array([len(times) for times in self.times])
+    
+    def commutations(self):
+        # Single-level transitions per phase; a jump over several levels counts once per level
+        return np.array([np.sum(np.abs(np.diff(np.concatenate(([first], indices))))) for first, indices in zip(self.initial, self.indices)])
+
+def carrier_layout(scheme, carriers):
+    # Band (lower, upper) in the normalized range [-1, 1] and phase offset (fraction of a period) of each triangle.
+    # Level-shifted schemes stack the carriers; PS spreads full-range carriers evenly over one period.
+    if scheme == "PS":
+        return np.full(carriers, -1.0), np.ones(carriers), np.arange(carriers) / carriers
+    height = 2 / carriers
+    lower = -1 + height * np.arange(carriers)
+    upper = lower + height
+    if scheme == "POD":
+        offset = np.where(lower + height / 2 < 0, 0.5, 0.0)  # Carriers below zero in opposition
+    elif scheme == "APOD":
+        offset = 0.5 * (np.arange(carriers) % 2)  # Every other carrier in opposition
+    else:
+        offset = np.zeros(carriers)
+    return lower, upper, offset
+
+def carrier_events(reference, t_start, t_end, levels, scheme="PD", switching_frequency=10000.0):
+    # reference(t) -> (phases, len(t)) normalized to [-1, 1]. Output level index = number of carriers below the reference.
+    levels = np.asarray(levels, dtype=float)
+    carriers = len(levels) - 1
+    Ts = 1 / switching_frequency
+    lower, upper, offset = carrier_layout(scheme, carriers)
+    
+    # Carrier periods touching the window, starting with the one already running at t_start
+    k = np.arange(np.floor(t_start / Ts) - 1, np.ceil(t_end / Ts) + 1)
+    starts = (k[np.newaxis, :] + offset[:, np.newaxis]) * Ts  # (carriers, periods)
+    r = np.asarray(reference(starts.ravel()), dtype=float)
+    r = r.reshape(r.shape[0], carriers, len(k))
+    duty = np.clip((r - lower[:, np.newaxis]) / (upper - lower)[:, np.newaxis], 0, 1)
+    
+    # Pulse centred in the carrier period: on at (1 - d) Ts / 2, off at (1 + d) Ts / 2. Empty pulses have no edges,
+    # and a full pulse joins its full neighbour without the off/on pair in between.
+    rise = starts + (1 - duty) * Ts / 2
+    fall = starts + (1 + duty) * Ts / 2
+    full = duty >= 1
+    keep_rise = (duty > 0) & ~(full & np.roll(full, 1, axis=-1))
+    keep_fall = (duty > 0) & ~(full & np.roll(full, -1, axis=-1))
+    keep_rise[..., 0] = duty[..., 0] > 0
+    keep_fall[..., -1] = duty[..., -1] > 0
+    
+    # All phases together: edges that were dropped stay in place with a zero step
+    phases = r.shape[0]
+    t = np.concatenate((rise.reshape(phases, -1), fall.reshape(phases, -1)), axis=-1)
+    step = np.concatenate((keep_rise.reshape(phases, -1), -keep_fall.reshape(phases, -1).astype(int)), axis=-1).astype(int)
+    order = np.argsort(t, axis=-1, kind='stable')
+    t = np.take_along_axis(t, order, axis=-1)
+    index = np.cumsum(np.take_along_axis(step, order, axis=-1), axis=-1)
+    
+    # Coincident edges of different carriers count once, at the net level after all of them
+    column = np.arange(t.shape[-1])
+    group_start = np.ones(t.shape, dtype=bool)
+    group_start[:, 1:] = t[:, 1:] != t[:, :-1]
+    group_end = np.ones(t.shape, dtype=bool)
+    group_end[:, :-1] = group_start[:, 1:]
+    first = np.maximum.accumulate(np.where(group_start, column, 0), axis=-1)
+    previous = np.where(first > 0, np.take_along_axis(index, np.maximum(first - 1, 0), axis=-1), 0)
+    changed = group_end & (index != previous)
+    
+    before = np.sum(t <= t_start, axis=-1)
+    initial = np.where(before > 0, index[np.arange(phases), np.maximum(before - 1, 0)], 0)
+    inside = changed & (t > t_start) & (t < t_end)
+    times = [row[mask] for row, mask in zip(t, inside)]
+    indices = [row[mask] for row, mask in zip(index, inside)]
+    return SwitchingEvents(t_start, t_end, levels, initial, times, indices)
+
+def min_max_injection(reference):
+    # Space-vector equivalent for two levels: shift all phases by the mid-point of the largest and smallest reference
+    return reference - (np.max(reference, axis=0) + np.min(reference, axis=0)) / 2
+
+def multilevel_injection(reference, carriers):
+    # Multilevel space-vector equivalent: min-max injection, then a second offset that centres the positions of the
+    # phases inside their carrier bands, so the nearest three vectors are used with centred active times
+    height = 2 / carriers
+    v = min_max_injection(reference)
+    position = np.mod(v + 1, height)
+    return v + height / 2 - (np.max(position, axis=0) + np.min(position, axis=0)) / 2
+
+def modulate(reference, t_start, t_end, levels, technique="Phase Disposition", switching_frequency=10000.0):
+    technique = PWM_ALIASES.get(technique, technique)
+    carriers = len(levels) - 1
+    if technique == "Space Vector":
+        phase_reference = reference
+        
+        def reference(t):
+            v = phase_reference(t)
+            return multilevel_injection(v, carriers) if len(v) == 3 else v  # Single phase: no common mode to inject
+    return carrier_events(reference, t_start, t_end, levels, CARRIER_SCHEMES[technique], switching_frequency)
+
+def nearest_level(reference, levels):
+    # Staircase modulation at fundamental frequency: nearest level to the reference
+    return np.rint((np.clip(reference, -1, 1) + 1) / 2 * (len(levels) - 1)).astype(int)
\ No newline at end of file
@@ -0,0 +1,257 @@
+import numpy as np
+from Phasenregelkreis import abc_to_dq_matrix, dq_to_abc_matrix, clarke_transform, inverse_clarke_transform
+
+# Three-phase current control in the synchronous reference frame: the grid current is rotated into dq with the PLL
+# angle, each axis has a PI controller tuned to the plant's series R-L, and the grid voltage (feed-forward) and the
+# omega*L cross coupling between the axes are compensated. All transform matrices of a window are built at once;
+# only the loop itself runs sample by sample against the output filter plant.
+
+class DQCurrentController:
+    bandwidth = 2 * np.pi * 150  # Closed-loop current bandwidth (rad/s)
+    max_step_gain = 0.5  # Limit of bandwidth * time step for the sampled loop
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        self.integral = np.zeros(2)  # Integrator outputs d, q (V)
+        self.saturated = 0  # Voltage-limited samples in the last window
+    
+    def gains(self, R, L, dt):
+        # Pole-zero cancellation of the R-L plant: first-order closed loop with the given bandwidth
+        alpha = min(self.bandwidth, self.max_step_gain / dt)
+        return alpha * L, alpha * R
+    
+    def run(self, plant, time, theta, omega, reference, v_grid, v_max):
+        # Closes the loop around the plant over the window. theta: PLL angle per sample, reference: (i_d, i_q) in A,
+        # v_grid: grid source voltage (3, samples), v_max: peak phase voltage the inverter can produce.
+        R, L = plant.series_impedance()
+        T = abc_to_dq_matrix(theta)  # (samples, 2, 3)
+        T_inverse = dq_to_abc_matrix(theta)  # (samples, 3, 2)
+        v_grid_dq = np.einsum('kdp,pk->kd', T, v_grid)
+        reference = np.asarray(reference, dtype=float)
+        output = plant.outputs.index('grid_current')
+        self.saturated = 0
+        
+        def control(k, x, y, dt):
+            i_dq = T[k] @ y[output]
+            Kp, Ki = self.gains(R, L, dt)
+            error = reference - i_dq
+            integral = self.integral + Ki * dt * error
+            v_dq = Kp * error + integral + v_grid_dq[k] + omega * L * np.array([-i_dq[1], i_dq[0]])
+            magnitude = np.hypot(v_dq[0], v_dq[1])
+            if magnitude > v_max:
+                # Anti-windup: the integrator only runs while the voltage is not limited
+                v_dq *= v_max / magnitude
+                self.saturated += 1
+            else:
+                self.integral = integral
+            return T_inverse[k] @ v_dq
+        
+        return plant.simulate(time, control, v_grid)
+
+class PredictiveCurrentController:
+    # Finite-control-set model predictive control: in every step of the horizon the inverter takes one switching state
+    # (one level per leg), and the sequence minimizing the predicted grid current error plus a penalty on voltage
+    # steps is found by sphere decoding. Three-phase problems are solved in alpha/beta, where switching states with
+    # the same phase voltages (differing only in the common mode, which drives no current) coincide. With the plant
+    # prediction the cost is ||V (U - U_unc)||^2 plus a constant, V upper triangular, so the steps are fixed from the
+    # last one backwards and partial sequences whose cost already exceeds that of the last plan shifted by one step
+    # are pruned. All surviving sequences are extended by all states of a step at once. When the horizon admits few
+    # sequences (two-level bridges, single-phase), all of them are scored with one matrix-vector product instead.
+    switching_weight = 2e-5  # Cost of a voltage step per V^2, relative to the current error in A^2
+    max_nodes = 128  # Sequences evaluated per step of the search; beyond this only the cheapest are extended
+    max_enumeration = 4096  # Sequences up to which the horizon is enumerated instead of searched
+    
+    def __init__(self, horizon=4):
+        self.horizon = horizon
+        self.reset()
+    
+    def reset(self):
+        self.previous = None  # Voltage applied in the last step (alpha/beta or single phase)
+        self.plan = None  # Optimal voltages of the last step (horizon, components)
+        self.models = {}
+        self.nodes = 0  # Sequences evaluated in the last window
+    
+    def model(self, Ad, Bd, C_i, states):
+        # Horizon prediction for one discretization: free response Gamma x + Psi v_grid, forced response G U. The
+        # phases share the plant, so it applies to alpha/beta components alike. For an enumerable horizon also every
+        # switching sequence U with V U and |V U|^2, so that |V (U - c)|^2 = |V U|^2 - 2 (V U) . (V c) + const.
+        components = states.shape[1]
+        key = (Ad.tobytes(), Bd.tobytes(), states.tobytes(), self.horizon)
+        if key not in self.models:
+            if len(self.models) >= 64:
+                self.models.clear()
+            N = self.horizon
+            powers = [np.eye(len(Ad))]
+            for _ in range(N):
+                powers.append(Ad @ powers[-1])
+            Gamma = np.array([C_i @ powers[j + 1] for j in range(N)])
+            impulse = np.array([C_i @ powers[m] @ Bd for m in range(N)])  # (N, inputs)
+            lag = np.subtract.outer(np.arange(N), np.arange(N))
+            Toeplitz = np.where((lag >= 0)[..., np.newaxis], impulse[np.maximum(lag, 0)], 0.0)
+            G = np.kron(Toeplitz[..., 0], np.eye(components))
+            S = np.kron(np.eye(N) - np.eye(N, k=-1), np.eye(components))  # Voltage steps
+            H = G.T @ G + self.switching_weight * S.T @ S
+            # Unconstrained optimum as one product: center = K @ (error, previous voltage)
+            K = np.linalg.solve(H, np.hstack((G.T, self.switching_weight * S.T[:, :components])))
+            V = np.linalg.cholesky(H).T
+            sequences = None
+            if len(states) ** N <= self.max_enumeration:
+                U = states[np.indices((len(states),) * N).reshape(N, -1).T].reshape(-1, N * components)
+                VU = U @ V.T
+                sequences = (U, VU, (VU ** 2).sum(axis=1))
+            self.models[key] = (Gamma, Toeplitz[..., 1], K, V, sequences)
+        return self.models[key]
+    
+    def search(self, V, center, states, bound, width):
+        # Sphere decoding over the switching states (states, components) of every step: the steps are fixed from the
+        # last one backwards and every partial sequence within the bound is extended by all states at once. Beyond
+        # width sequences only the cheapest are kept. Returns the best sequence (None if nothing is within the bound)
+        # and its cost.
+        components = states.shape[1]
+        sequences = np.zeros((1, 0))  # Deviations from the center of the fixed steps
+        costs = np.zeros(1)
+        for j in range(len(center) // components - 1, -1, -1):
+            rows = slice(j * components, (j + 1) * components)
+            deviation = states - center[rows]
+            residual = (deviation @ V[rows, rows].T)[np.newaxis] + (sequences @ V[rows, (j + 1) * components:].T)[:, np.newaxis]
+            cost = (costs[:, np.newaxis] + (residual ** 2).sum(axis=-1)).ravel()
+            self.nodes += len(cost)
+            keep = np.nonzero(cost <= bound)[0]
+            if len(keep) > width:
+                keep = keep[np.argpartition(cost[keep], width - 1)[:width]]
+            if len(keep) == 0:
+                return None, np.inf
+            parent, state = np.divmod(keep, len(states))
+            sequences = np.concatenate((deviation[state], sequences[parent]), axis=1)
+            costs = cost[keep]
+        best = np.argmin(costs)
+        return sequences[best] + center, costs[best]
+    
+    def run(self, plant, time, theta, omega, reference, v_grid, levels, period):
+        # Closes the loop around the plant with the control period (s), the window resampled to it. theta: PLL angle
+        # per sample, reference: (i_d, i_q) in A, v_grid: grid source voltage (phases, samples), levels: leg voltages
+        # of the topology. Returns the plant outputs at the window's samples.
+        N = self.horizon
+        phases = len(v_grid)
+        steps = max(len(time) - 1, int(np.ceil((time[-1] - time[0]) / period - 1e-9)))
+        fine = np.linspace(time[0], time[-1], steps + 1)
+        v_grid_fine = np.array([np.interp(fine, time, row) for row in v_grid])
+        levels = np.asarray(levels, dtype=float)
+        states = levels[np.indices((len(levels),) * phases).reshape(phases, -1).T]  # Every combination of leg levels
+        if phases == 3:
+            to_components, to_phases = clarke_transform, inverse_clarke_transform
+            states = np.unique(np.round(clarke_transform(states.T).T, 9), axis=0)
+        else:
+            to_components = to_phases = np.asarray
+        components = states.shape[1]
+        _, _, C, _ = plant.matrices()
+        C_i = C[plant.outputs.index('grid_current')]
+        # Reference and grid voltage beyond the window: the PLL angle carried on at omega, the grid voltage from its
+        # fundamental fitted over the window
+        extended = np.concatenate((fine, fine[-1] + (fine[1] - fine[0]) * np.arange(1, N + 2)))
+        theta = np.concatenate((np.interp(fine, time, theta), theta[-1] + omega * (extended[len(fine):] - time[-1])))
+        reference = to_components((dq_to_abc_matrix(theta)[:, :phases] @ np.asarray(reference, dtype=float)).T)
+        basis = np.column_stack((np.sin(theta), np.cos(theta)))
+        fundamental = np.linalg.lstsq(basis[:len(fine)], v_grid_fine.T, rcond=None)[0]
+        v_grid_ext = to_components(np.concatenate((v_grid_fine, (basis[len(fine):] @ fundamental).T), axis=1))
+        if self.previous is None or len(self.previous) != components:
+            self.previous = np.zeros(components)
+            self.plan = None
+        self.nodes = 0
+        
+        def control(k, x, y, dt):
+            Ad, Bd = plant.discrete.lookup(dt)
+            Gamma, Psi, K, V, sequences = self.model(Ad, Bd, C_i, states)
+            free = Gamma @ to_components(x.T).T + Psi @ v_grid_ext[:, k:k + N].T  # (N, components)
+            error = (reference[:, k + 1:k + N + 1].T - free).ravel()
+            center = K @ np.concatenate((error, self.previous))
+            if sequences is not None:
+                U, VU, norms = sequences
+                self.nodes += len(U)
+                self.plan = U[np.argmin(norms - 2 * VU @ (V @ center))].reshape(N, components)
+                self.previous = self.plan[0]
+                return to_phases(self.plan[0])
+            # Bound: the last plan shifted by one step
+            guess, bound = None, np.inf
+            if self.plan is not None and len(self.plan) == N:
+                guess = np.concatenate((self.plan[1:], self.plan[-1:])).ravel()
+                bound = np.sum((V @ (guess - center)) ** 2)
+            U, cost = self.search(V, center, states, bound * (1 + 1e-9), max(1, self.max_nodes // len(states)))
+            self.plan = (U if cost < bound else guess).reshape(N, components)
+            self.previous = self.plan[0]
+            return to_phases(self.plan[0])
+        
+        record = plant.simulate(fine, control, v_grid_fine)
+        return {name: values if name == 'time' else np.array([np.interp(time, fine, row) for row in values])
+                for name, values in dict(record, time=time).items()}
+
+class ProportionalResonantController:
+    # Current control in the stationary frame: proportional gain plus resonators
+    # G_r(s) = 2 K_r w_c s / (s^2 + 2 w_c s + (h w_0)^2) at the fundamental and, optionally, at low-order harmonics,
+    # with grid voltage feed-forward. Each resonator is discretized with the Tustin transform prewarped to its own
+    # frequency, so its peak stays exactly at h * f for any time step. The resonators form one bank of second-order
+    # sections (transposed direct form II) that steps all phases at once inside the plant loop; the section states
+    # carry over to the next window, whose overlap with this one the plant takes from its history.
+    cutoff = 2 * np.pi  # Resonator bandwidth w_c (rad/s)
+    harmonic_gains = {3: 0.5, 5: 0.5, 7: 0.3, 11: 0.2}  # Harmonic resonator gains relative to K_r
+    
+    def __init__(self, Kp, Kr, harmonics=False):
+        self.Kp = Kp  # V/A
+        self.Kr = Kr  # Gain at resonance (V/A)
+        self.harmonics = harmonics  # Harmonic compensators on/off
+        self.coefficients = {}
+        self.reset()
+    
+    def reset(self):
+        self.z = None  # Section states (2, sections, phases)
+        self.saturated = 0  # Voltage-limited samples in the last window
+    
+    def sections(self, frequency, dt):
+        # b, a (sections, 3) of the bank; resonators within 10 % of the Nyquist frequency are left out
+        key = (frequency, dt, self.harmonics)
+        if key not in self.coefficients:
+            if len(self.coefficients) >= 32:
+                self.coefficients.clear()
+            orders = {1: 1.0}
+            if self.harmonics:
+                orders.update(self.harmonic_gains)
+            b, a = [], []
+            for h, gain in orders.items():
+                w = 2 * np.pi * frequency * h
+                if w * dt / 2 >= 0.45 * np.pi:
+                    continue
+                k = w / np.tan(w * dt / 2)  # Prewarped s = k (z - 1) / (z + 1)
+                a0 = k ** 2 + 2 * self.cutoff * k + w ** 2
+                g = 2 * self.Kr * gain * self.cutoff * k / a0
+                b.append([g, 0.0, -g])
+                a.append([1.0, 2 * (w ** 2 - k ** 2) / a0, (k ** 2 - 2 * self.cutoff * k + w ** 2) / a0])
+            self.coefficients[key] = (np.array(b), np.array(a))
+        return self.coefficients[key]
+    
+    def run(self, plant, time, theta, omega, reference, v_grid, v_max):
+        # Closes the loop around the plant over the window. theta: PLL angle per sample, reference: (i_d, i_q) in A
+        # as for the dq controller, v_grid: grid source voltage (phases, samples), v_max: peak phase voltage.
+        phases = len(v_grid)
+        i_ref = np.einsum('kpd,d->pk', dq_to_abc_matrix(theta), np.asarray(reference, dtype=float))[:phases]
+        frequency = omega / (2 * np.pi)
+        output = plant.outputs.index('grid_current')
+        self.saturated = 0
+        
+        def control(k, x, y, dt):
+            b, a = self.sections(frequency, dt)
+            if self.z is None or self.z.shape != (2, len(b), phases):
+                self.z = np.zeros((2, len(b), phases))
+            z1, z2 = self.z
+            error = i_ref[:, k] - y[output]
+            resonant = b[:, :1] * error + z1  # (sections, phases)
+            v = v_grid[:, k] + self.Kp * error + resonant.sum(axis=0)
+            if np.max(np.abs(v)) > v_max:
+                # Anti-windup: the resonators only run while the voltage is not limited
+                self.saturated += 1
+                return np.clip(v, -v_max, v_max)
+            self.z = np.array([b[:, 1:2] * error - a[:, 1:2] * resonant + z2, b[:, 2:] * error - a[:, 2:] * resonant])
+            return v
+        
+        return plant.simulate(time, control, v_grid)
\ No newline at end of file
@@ -1,10 +1,14 @@
 import numpy as np
 
 class InverterDesign:
+    efficiency = 1.0  # Power conversion efficiency of the design stage
+    
     def apply_design(self, data, dc_voltage, frequency, time_step):
         pass
 
 class TransformerlessDesign(InverterDesign):
+    efficiency = 0.98  # No transformer losses
+    
     def apply_design(self, data, dc_voltage, frequency, time_step):
         # Transformerless: Higher efficiency, add small DC offset
         output = data.copy()
@@ -22,10 +26,12 @@ class TransformerlessDesign(InverterDesign):
         return output
 
 class TransformerBasedDesign(InverterDesign):
+    efficiency = 0.95  # Transformer efficiency
+    
     def apply_design(self, data, dc_voltage, frequency, time_step):
         # Transformer-Based: Galvanic isolation, slight efficiency loss
         output = data.copy()
-        efficiency = 0.95  # Transformer efficiency
+        efficiency = self.efficiency
         phase_shift = 0.01  # Small phase shift due to inductance
         for i in range(len(output['voltage'])):
             # Scale voltage due to transformer losses
@@ -44,4 +50,9 @@ class TransformerBasedDesign(InverterDesign):
             valid_voltage = np.where(np.abs(data['voltage'][i]) > 1e-6, data['voltage'][i], 1.0)
             scaling_factor = output['voltage'][i] / valid_voltage
             output['current'][i] = output['current'][i] * scaling_factor
-        return output
\ No newline at end of file
+        return output
+
+DESIGN_TYPES = {
+    "Transformerless": TransformerlessDesign,
+    "Transformer-Based": TransformerBasedDesign
+}
\ No newline at end of file
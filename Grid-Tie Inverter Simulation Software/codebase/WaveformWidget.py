@@ -7,7 +7,7 @@ class WaveformWidget(QWidget):
         super().__init__()
         self.current_topology = "Single-Phase"
         self.multilevel_topology = "None"
-        self.pwm_technique = "Multicarrier"
+        self.pwm_technique = "Phase Disposition"
         self.design = "Transformerless"
         self.mppt = "None"
         self.control = "PI"
@@ -169,4 +169,18 @@ class WaveformWidget(QWidget):
             for i in range(3):
                 self.voltage_curves[i][0].setData(data['time'], data['voltage'][i])
                 self.current_curves[i][0].setData(data['time'], data['current'][i])
-                self.plot_widgets[i].setXRange(data['time'][0], data['time'][-1], padding=0)
\ No newline at end of file
+                self.plot_widgets[i].setXRange(data['time'][0], data['time'][-1], padding=0)
+        
+        # Exact THD and RMS of the switched leg voltage from the PWM switching events (multilevel topologies),
+        # and whether the dc link limits the closed-loop current reference
+        phases = [None] if self.current_topology == "Single-Phase" else ['Phase A', 'Phase B', 'Phase C']
+        limit = data.get('current_limit', 1.0)
+        for i, (plot_widget, phase) in enumerate(zip(self.plot_widgets, phases)):
+            title = self.get_plot_title(phase)
+            if 'voltage_thd' in data and i < len(data['voltage_thd']):
+                title += f" - PWM THD {data['voltage_thd'][i] * 100:.1f} %, {data['voltage_rms'][i]:.0f} V rms"
+            if limit == 0:
+                title += " - DC link below grid peak: inverter blocked"
+            elif limit < 1:
+                title += f" - Current limited to {limit * 100:.0f} % by the DC link"
+            plot_widget.setTitle(title, color='#FFFFFF', size='14pt')
\ No newline at end of file
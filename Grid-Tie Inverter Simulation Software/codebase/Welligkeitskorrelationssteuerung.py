@@ -1,48 +1,66 @@
 import numpy as np
+from MaximaleLeistungspunktverfolgung import MPPTAlgorithm, BatchedMPPTAlgorithm
 
-class RippleCorrelationControl:
-    def __init__(self):
-        self.gain = 0.1  # Control gain for voltage adjustment
-        self.ripple_freq = 100  # Ripple frequency (Hz)
+class RippleCorrelationControl(MPPTAlgorithm):
+    def __init__(self, pv_model=None):
+        super().__init__(pv_model)
+        self.gain = 0.5  # Voltage adjustment per unit slope (V per W/V)
+        self.ripple_amplitude = 0.01  # 100 Hz ripple, fraction of the DC voltage
+        self.ripple_sign = 1
         self.prev_voltage = 400
         self.prev_power = 0
-        self.prev_time = 0
     
     def update(self, state, time_step, current_time):
-        # PV model
-        V_oc = 500  # Open-circuit voltage
-        I_sc = 10   # Short-circuit current
         voltage = state['voltage']
         
-        # Simulate ripple (1% of DC voltage at 100 Hz)
-        ripple_amplitude = 0.01 * voltage
-        ripple = ripple_amplitude * np.sin(2 * np.pi * self.ripple_freq * current_time)
-        voltage_with_ripple = voltage + ripple
+        # Ripple sampled at alternating peaks (on a clock synchronous to the grid period it would alias to a constant)
+        self.ripple_sign = -self.ripple_sign
+        voltage_with_ripple = voltage + self.ripple_sign * self.ripple_amplitude * voltage
         
         # Calculate current and power
-        current = I_sc * (1 - (voltage_with_ripple / V_oc) ** 2)
-        power = voltage_with_ripple * current
+        current, power = self.measure(state, voltage_with_ripple)
         
-        # Compute derivatives
-        dt = current_time - self.prev_time if self.prev_time != 0 else time_step
-        if dt > 0:
-            dV_dt = (voltage_with_ripple - self.prev_voltage) / dt
-            dP_dt = (power - self.prev_power) / dt
-        else:
-            dV_dt = 0
-            dP_dt = 0
-        
-        # RCC logic: Adjust voltage based on correlation
-        correlation = dP_dt * dV_dt
-        voltage_adjustment = -self.gain * correlation  # Negative because dP/dV > 0 left of MPP
+        # RCC logic: the correlation of power and voltage ripple, normalized to the ripple, is the slope dP/dV
+        dV = voltage_with_ripple - self.prev_voltage
+        dP = power - self.prev_power
+        correlation = dP * dV / max(dV * dV, 1e-9)
+        voltage_adjustment = self.gain * correlation  # dP/dV > 0 left of the MPP: raise the voltage
         new_voltage = voltage + voltage_adjustment
         
         # Update state
         self.prev_voltage = voltage_with_ripple
         self.prev_power = power
-        self.prev_time = current_time
         state['current'] = current
         state['power'] = power
         
         # Constrain voltage
-        return np.clip(new_voltage, 100, 800)
\ No newline at end of file
+        return np.clip(new_voltage, 100, 800)
+
+class BatchedRippleCorrelationControl(BatchedMPPTAlgorithm):
+    # Same correlation law as RippleCorrelationControl, one entry per string, shared clock
+    def __init__(self, strings, pv_model=None, initial_voltage=400.0):
+        super().__init__(strings, pv_model, initial_voltage)
+        self.gain = 0.5  # Voltage adjustment per unit slope (V per W/V)
+        self.ripple_amplitude = 0.01  # 100 Hz ripple, fraction of the DC voltage
+        self.ripple_sign = 1
+        self.prev_voltage = np.full(strings, 400.0)
+        self.prev_power = np.zeros(strings)
+    
+    def update(self, irradiance, temperature, time_step, current_time):
+        voltage = self.voltage
+        self.ripple_sign = -self.ripple_sign
+        voltage_with_ripple = voltage + self.ripple_sign * self.ripple_amplitude * voltage
+        self.current, self.power = self.measure(voltage_with_ripple, irradiance, temperature)
+        
+        dV = voltage_with_ripple - self.prev_voltage
+        dP = self.power - self.prev_power
+        self.prev_voltage = voltage_with_ripple
+        self.prev_power = self.power
+        self.voltage = np.clip(voltage + self.gain * dP * dV / np.maximum(dV * dV, 1e-9), 100, 800)
+        return self.voltage
+    
+    def reset(self):
+        super().reset()
+        self.ripple_sign = 1
+        self.prev_voltage = np.full(self.strings, 400.0)
+        self.prev_power = np.zeros(self.strings)
\ No newline at end of file
@@ -110,6 +110,9 @@ class TimeDomainSimulationWindow(QWidget):
         self.progress_bar.setMaximum(100)
         self.progress_bar.setValue(0)
         
+        # Discretization cache of the output filter plant
+        self.cache_label = QLabel("Discretization cache: -")
+        
         # Run and Export Buttons
         button_layout = QHBoxLayout()
         self.run_button = QPushButton("Run Simulation")
@@ -133,6 +136,7 @@ class TimeDomainSimulationWindow(QWidget):
         control_layout.addWidget(self.current_check)
         control_layout.addWidget(self.phase_combo)
         control_layout.addWidget(self.progress_bar)
+        control_layout.addWidget(self.cache_label)
         control_layout.addLayout(button_layout)
         control_layout.addStretch()
         
@@ -198,6 +202,8 @@ class TimeDomainSimulationWindow(QWidget):
         currents = [[] for _ in range(num_phases)]
         
         # Run simulation
+        output_filter = self.inverter_simulation.output_filter
+        cache_start = output_filter.discrete.statistics() if output_filter is not None else None
         current_time = 0
         prev_voltage = [0] * num_phases
         for i, dt in enumerate(time_steps):
@@ -239,6 +245,15 @@ class TimeDomainSimulationWindow(QWidget):
             self.progress_bar.setValue(int((i + 1) / num_steps * 100))
             QApplication.processEvents()
         
+        # Hit rate of this run: variable steps reuse the discretization of their dt bin
+        if output_filter is not None and output_filter is self.inverter_simulation.output_filter:
+            cache = output_filter.discrete.statistics()
+            hits, misses = cache['hits'] - cache_start['hits'], cache['misses'] - cache_start['misses']
+            self.cache_label.setText(f"Discretization cache: {hits / max(hits + misses, 1) * 100:.1f}% hits, "
+                                     f"{cache['entries']} bins, {cache['evictions']} evictions")
+        else:
+            self.cache_label.setText("Discretization cache: no output filter")
+        
         # Convert to numpy arrays
         voltages = [np.array(v) for v in voltages]
         currents = [np.array(c) for c in currents]
@@ -0,0 +1,61 @@
+import time
+import numpy as np
+import pytest
+from InverterSimulation import InverterSimulation
+from Phasenregelkreis import PLL_TYPES
+
+# Headless closed-loop checks: the current controllers take their angle from the selected PLL, so the grid current
+# has to be in phase with the grid voltage whichever PLL is selected.
+
+FILTERS = ["None", "LCL"]
+TIMER_PERIOD = 0.1  # GUI refresh (s): one window has to be computed well within it
+
+def run_closed_loop(control, pll_name, phase_topology="Three-Phase", output_filter="None", multilevel_topology="None", dc_voltage=700, windows=10):
+    sim = InverterSimulation()
+    sim.update_phase_topology(phase_topology)
+    sim.update_multilevel_topology(multilevel_topology)
+    sim.update_simulation_parameters({'frequency': 50, 'mod_index': 0.8, 'dc_voltage': dc_voltage})
+    sim.update_control(control)
+    sim.update_output_filter(output_filter)
+    sim.update_pll(pll_name)
+    for _ in range(windows):
+        data = sim.generate_waveforms(None)
+    return sim, data
+
+def power_factor(sim, data):
+    # Over the new half of the last window (one fundamental period) against the grid source voltage
+    current = np.array(data['current'])
+    voltage = sim.grid_source(data['time'], len(current))
+    new = slice(len(data['time']) // 2, None)
+    v, i = voltage[:, new], current[:, new]
+    return np.sum(v * i) / np.sqrt(np.sum(v ** 2) * np.sum(i ** 2))
+
+@pytest.mark.parametrize("output_filter", FILTERS)
+@pytest.mark.parametrize("pll_name", list(PLL_TYPES))
+def test_dq_current_control_in_phase_with_grid(pll_name, output_filter):
+    sim, data = run_closed_loop("PI", pll_name, output_filter=output_filter)
+    assert power_factor(sim, data) > 0.95
+
+@pytest.mark.parametrize("phase_topology", ["Single-Phase", "Three-Phase"])
+@pytest.mark.parametrize("output_filter", FILTERS)
+@pytest.mark.parametrize("pll_name", list(PLL_TYPES))
+def test_resonant_control_in_phase_with_grid(pll_name, output_filter, phase_topology):
+    sim, data = run_closed_loop("PR", pll_name, phase_topology=phase_topology, output_filter=output_filter)
+    assert power_factor(sim, data) > 0.95
+    # Within the reference the dc link can drive
+    current = np.array(data['current'])[:, len(data['time']) // 2:]
+    assert np.sqrt(np.mean(current ** 2)) < 1.1 * data['current_limit'] * np.hypot(*sim.current_reference) / np.sqrt(2)
+
+@pytest.mark.parametrize("pll_name", list(PLL_TYPES))
+def test_predictive_control_in_phase_with_grid(pll_name):
+    # NPC levels, so that the sphere decoder runs (two-level horizons are enumerated)
+    sim, data = run_closed_loop("MPC", pll_name, output_filter="LCL", multilevel_topology="NPC")
+    assert power_factor(sim, data) > 0.95
+
+@pytest.mark.parametrize("multilevel_topology", ["None", "NPC"])
+def test_predictive_control_window_time(multilevel_topology):
+    sim, _ = run_closed_loop("MPC", "SRF-PLL", output_filter="LCL", multilevel_topology=multilevel_topology, windows=3)
+    start = time.perf_counter()
+    for _ in range(5):
+        sim.generate_waveforms(None)
+    assert (time.perf_counter() - start) / 5 < TIMER_PERIOD / 2
\ No newline at end of file